@@ -0,0 +1,754 @@
+import re
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple, Union
+
+
+class BashSyntaxError(ValueError):
+    """Raised for scripts the parser cannot read"""
+
+
+# Longest first, so '&&' is not read as two '&'
+OPERATORS = (
+    '&>>', ';;&', '<<<', '<<-', '&&', '||', ';;', ';&', '|&', '<<', '>>', '<&', '>&', '<>', '>|', '&>', '((',
+    '|', '&', ';', '(', ')', '<', '>',
+)
+REDIRECT_OPERATORS = frozenset({'<', '>', '>>', '<<', '<<-', '<<<', '<&', '>&', '<>', '>|', '&>', '&>>'})
+CASE_TERMINATORS = frozenset({';;', ';&', ';;&'})
+METACHARACTERS = frozenset(' \t\n;&|()<>')
+IO_NUMBER_PATTERN = re.compile(r"\d+(?=[<>])")
+NAME_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+ASSIGNMENT_PATTERN = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)(?:\[[^\]]*\])?\+?=")
+# Inside ${...}: indirection, length, name, subscript and whatever follows
+PARAMETER_PATTERN = re.compile(r"(!?)(#?)([A-Za-z_][A-Za-z0-9_]*|\d+|[@*#?$!-])(?:\[([^\]]*)\])?(.*)", re.DOTALL)
+# ${name@P} and ${name@E} expand prompt and backslash escapes in a value
+EVALUATING_TRANSFORMS = frozenset({'@P', '@E'})
+BRACE_EXPANSION_PATTERN = re.compile(r"\{[^{}\s]*(?:,|\.\.)[^{}\s]*\}")
+BRACKET_EXPRESSION_PATTERN = re.compile(r"\[[^\s;&|()<>]*\]")
+# Deepest nesting of substitutions and compound commands accepted
+MAX_DEPTH = 50
+
+
+@dataclass
+class Word:
+    """One shell word
+
+    Attributes:
+        text: The word as written
+        value: The word after quote removal, or None if it depends on
+            parameter, arithmetic or command expansion
+        substitutions: Parsed command and process substitutions in the word
+        expandable: Whether unquoted glob, brace or tilde expansion applies
+    """
+    text: str
+    value: Optional[str]
+    substitutions: List['Node'] = field(default_factory=list)
+    expandable: bool = False
+
+
+@dataclass
+class Redirect:
+    """A redirection; substitutions holds those of an unquoted here-document body"""
+    operator: str
+    target: Word
+    substitutions: List['Node'] = field(default_factory=list)
+
+
+@dataclass
+class SimpleCommand:
+    assignments: List[Word]
+    words: List[Word]
+    redirects: List[Redirect]
+
+
+@dataclass
+class Pipeline:
+    commands: List['Node']
+    negated: bool = False
+
+
+@dataclass
+class CommandList:
+    """Commands joined by ';', '&', newlines, '&&' or '||'"""
+    commands: List['Node']
+
+
+@dataclass
+class Compound:
+    """Subshell, group, if, for, while, until, case, select, (( )) or [[ ]]
+
+    body holds the nested command lists; words the words evaluated by the
+    construct itself (for-loop items, case subject and patterns, [[ ]] operands).
+    """
+    kind: str
+    body: List['Node'] = field(default_factory=list)
+    words: List[Word] = field(default_factory=list)
+    redirects: List[Redirect] = field(default_factory=list)
+    # Loop variable of for and select
+    variable: Optional[str] = None
+
+
+@dataclass
+class FunctionDef:
+    name: str
+    body: 'Node'
+
+
+Node = Union[SimpleCommand, Pipeline, CommandList, Compound, FunctionDef]
+
+
+@dataclass
+class Script:
+    """A parsed script and the text it evaluates when it runs
+
+    Attributes:
+        tree: The command tree
+        arithmetic: Arithmetic expressions, from $((...)), $[...], ((...)),
+            for ((...)), array subscripts and substring offsets. Variables
+            in them are expanded and evaluated as arithmetic in turn.
+        indirections: ${!name} indirections and ${name@P} / ${name@E}
+            transforms, which use a variable's value as a name or expand it
+    """
+    tree: 'CommandList'
+    arithmetic: List[str] = field(default_factory=list)
+    indirections: List[str] = field(default_factory=list)
+Token = Tuple[str, Union[str, Word, None]]
+
+
+class _Parser:
+    """Recursive-descent parser over a shared source string
+
+    Command and process substitutions are parsed by a nested parser that
+    starts at the substitution and hands its end position back, so quoting
+    and nesting inside them follow the same rules as the outer script.
+    """
+
+    def __init__(self, source: str, pos: int = 0, parent: Optional['_Parser'] = None):
+        self.depth = parent.depth + 1 if parent is not None else 0
+        if self.depth > MAX_DEPTH:
+            raise BashSyntaxError("nesting too deep")
+        self.src = source
+        self.pos = pos
+        # Evaluated text, shared with the parsers of nested substitutions
+        self.arithmetic: List[str] = parent.arithmetic if parent is not None else []
+        self.indirections: List[str] = parent.indirections if parent is not None else []
+        self._peeked: Optional[Token] = None
+        # Here-documents whose bodies start after the next newline: (redirect, delimiter, strip tabs, quoted)
+        self._heredocs: List[Tuple[Redirect, str, bool, bool]] = []
+
+    # Lexing
+
+    def _next_token(self) -> Token:
+        src = self.src
+        while self.pos < len(src):
+            c = src[self.pos]
+            if c in ' \t':
+                self.pos += 1
+            elif c == '\\' and src.startswith('\\\n', self.pos):
+                self.pos += 2
+            elif c == '#':
+                end = src.find('\n', self.pos)
+                self.pos = len(src) if end < 0 else end
+            else:
+                break
+        if self.pos >= len(src):
+            return ('eof', None)
+
+        c = src[self.pos]
+        if c == '\n':
+            self.pos += 1
+            if self._heredocs:
+                self._read_heredoc_bodies()
+            return ('op', '\n')
+        if c in '<>' and src.startswith('(', self.pos + 1):
+            return ('word', self._read_word())
+        io_number = IO_NUMBER_PATTERN.match(src, self.pos)
+        if io_number:
+            self.pos = io_number.end()
+        for operator in OPERATORS:
+            if src.startswith(operator, self.pos):
+                self.pos += len(operator)
+                return ('op', operator)
+        return ('word', self._read_word())
+
+    def _read_word(self) -> Word:
+        src = self.src
+        start = self.pos
+        value = []
+        static = True
+        expandable = False
+        substitutions = []
+        while self.pos < len(src):
+            c = src[self.pos]
+            if c in METACHARACTERS:
+                if c in '<>' and src.startswith('(', self.pos + 1):
+                    # Process substitution <(...) or >(...)
+                    self.pos += 2
+                    substitutions.append(self._parse_substitution())
+                    static = False
+                    continue
+                break
+            if c == '\\':
+                if not src.startswith('\n', self.pos + 1):
+                    value.append(src[self.pos + 1:self.pos + 2])
+                self.pos += 2
+            elif c == "'":
+                end = src.find("'", self.pos + 1)
+                if end < 0:
+                    raise BashSyntaxError("unterminated single quote")
+                value.append(src[self.pos + 1:end])
+                self.pos = end + 1
+            elif c == '"':
+                static = self._read_double_quoted(value, substitutions) and static
+            elif c == '$':
+                static = self._read_dollar(value, substitutions, quoted=False) and static
+            elif c == '`':
+                self.pos += 1
+                substitutions.append(self._parse_backticks())
+                static = False
+            else:
+                if c in '*?' or (c == '~' and self.pos == start):
+                    expandable = True
+                elif c == '[' and BRACKET_EXPRESSION_PATTERN.match(src, self.pos):
+                    expandable = True
+                elif c == '{' and BRACE_EXPANSION_PATTERN.match(src, self.pos):
+                    expandable = True
+                value.append(c)
+                self.pos += 1
+        return Word(src[start:self.pos], ''.join(value) if static else None, substitutions, expandable)
+
+    def _read_double_quoted(self, value: List[str], substitutions: List[Node]) -> bool:
+        """Read a "..." string; returns whether it is free of expansions"""
+        src = self.src
+        self.pos += 1
+        static = True
+        while self.pos < len(src):
+            c = src[self.pos]
+            if c == '"':
+                self.pos += 1
+                return static
+            if c == '\\':
+                following = src[self.pos + 1:self.pos + 2]
+                if following in ('$', '`', '"', '\\'):
+                    value.append(following)
+                    self.pos += 2
+                elif following == '\n':
+                    self.pos += 2
+                else:
+                    value.append('\\')
+                    self.pos += 1
+            elif c == '$':
+                static = self._read_dollar(value, substitutions, quoted=True) and static
+            elif c == '`':
+                self.pos += 1
+                substitutions.append(self._parse_backticks())
+                static = False
+            else:
+                value.append(c)
+                self.pos += 1
+        raise BashSyntaxError("unterminated double quote")
+
+    def _read_dollar(self, value: List[str], substitutions: List[Node], quoted: bool) -> bool:
+        """Read an expansion starting at '$'; returns True if it was a literal '$'"""
+        src = self.src
+        following = src[self.pos + 1:self.pos + 2]
+        if src.startswith('$((', self.pos):
+            self.pos += 3
+            self._read_arithmetic(substitutions)
+        elif following == '[':
+            # Obsolete $[...] arithmetic
+            end = src.find(']', self.pos)
+            if end < 0:
+                raise BashSyntaxError("unterminated $[...]")
+            self.arithmetic.append(src[self.pos + 2:end])
+            substitutions.extend(_Parser(src[self.pos + 2:end], 0, self).scan_expansions())
+            self.pos = end + 1
+        elif following == '(':
+            self.pos += 2
+            substitutions.append(self._parse_substitution())
+        elif following == '{':
+            self.pos += 2
+            self._read_braced_parameter(substitutions)
+        elif following == "'" and not quoted:
+            # ANSI-C string; escapes such as \x72 can spell anything, so it is never literal
+            self.pos += 2
+            while self.pos < len(src) and src[self.pos] != "'":
+                self.pos += 2 if src[self.pos] == '\\' else 1
+            if self.pos >= len(src):
+                raise BashSyntaxError("unterminated $'...' string")
+            self.pos += 1
+        elif following == '"' and not quoted:
+            self.pos += 1
+            return self._read_double_quoted(value, substitutions)
+        elif following and (NAME_PATTERN.match(following) or following in '0123456789@*#?$!-'):
+            name = NAME_PATTERN.match(src, self.pos + 1)
+            self.pos = name.end() if name else self.pos + 2
+        else:
+            value.append('$')
+            self.pos += 1
+            return True
+        return False
+
+    def _read_arithmetic(self, substitutions: List[Node]) -> None:
+        """Read up to the '))' closing $(( or ((, keeping any substitutions inside"""
+        src = self.src
+        start = self.pos
+        depth = 0
+        while self.pos < len(src):
+            c = src[self.pos]
+            if c == '$':
+                self._read_dollar([], substitutions, quoted=True)
+                continue
+            if c == '`':
+                self.pos += 1
+                substitutions.append(self._parse_backticks())
+                continue
+            if c == '(':
+                depth += 1
+            elif c == ')':
+                if depth == 0:
+                    if not src.startswith('))', self.pos):
+                        raise BashSyntaxError("arithmetic expression not closed by '))'")
+                    self.arithmetic.append(src[start:self.pos])
+                    self.pos += 2
+                    return
+                depth -= 1
+            self.pos += 1
+        raise BashSyntaxError("unterminated arithmetic expression")
+
+    def _read_braced_parameter(self, substitutions: List[Node]) -> None:
+        """Read up to the '}' closing ${, keeping substitutions in default values and patterns"""
+        src = self.src
+        start = self.pos
+        while self.pos < len(src):
+            c = src[self.pos]
+            if c == '}':
+                self._note_parameter(src[start:self.pos])
+                self.pos += 1
+                return
+            if c == '\\':
+                self.pos += 2
+            elif c == "'":
+                end = src.find("'", self.pos + 1)
+                if end < 0:
+                    raise BashSyntaxError("unterminated single quote")
+                self.pos = end + 1
+            elif c == '"':
+                self._read_double_quoted([], substitutions)
+            elif c == '$':
+                self._read_dollar([], substitutions, quoted=True)
+            elif c == '`':
+                self.pos += 1
+                substitutions.append(self._parse_backticks())
+            else:
+                self.pos += 1
+        raise BashSyntaxError("unterminated ${...}")
+
+    def _note_parameter(self, text: str) -> None:
+        """Record the indirection, transform, subscript or offsets of a ${...} expansion"""
+        match = PARAMETER_PATTERN.match(text)
+        if not match:
+            return
+        indirect, _, _, subscript, rest = match.groups()
+        # ${!name[@]} lists keys and ${!prefix*} names; anything else with '!' is indirection
+        if indirect and not (subscript in ('@', '*') and not rest) and rest not in ('*', '@'):
+            self.indirections.append(f'${{{text}}}')
+        if subscript is not None and subscript not in ('@', '*'):
+            self.arithmetic.append(subscript)
+        if rest[:2] in EVALUATING_TRANSFORMS:
+            self.indirections.append(f'${{{text}}}')
+        elif rest.startswith(':') and rest[1:2] not in ('-', '=', '+', '?'):
+            self.arithmetic.append(rest[1:])
+
+    def _parse_substitution(self) -> Node:
+        """Parse the commands of $(...), <(...) or >(...) up to the closing ')'"""
+        inner = _Parser(self.src, self.pos, self)
+        node = inner.parse_list(ops=(')',))
+        if inner._advance() != ('op', ')'):
+            raise BashSyntaxError("unterminated command substitution")
+        self.pos = inner.pos
+        return node
+
+    def _parse_backticks(self) -> Node:
+        """Parse the commands of `...`, after undoing its backslash escapes"""
+        src = self.src
+        inner = []
+        while self.pos < len(src):
+            c = src[self.pos]
+            if c == '`':
+                self.pos += 1
+                return _Parser(''.join(inner), 0, self).parse_script()
+            if c == '\\' and src[self.pos + 1:self.pos + 2] in ('`', '\\', '$'):
+                inner.append(src[self.pos + 1])
+                self.pos += 2
+            else:
+                inner.append(c)
+                self.pos += 1
+        raise BashSyntaxError("unterminated backquote")
+
+    def _read_heredoc_bodies(self) -> None:
+        src = self.src
+        for redirect, delimiter, strip_tabs, quoted in self._heredocs:
+            lines = []
+            while self.pos < len(src):
+                end = src.find('\n', self.pos)
+                end = len(src) if end < 0 else end
+                line = src[self.pos:end]
+                self.pos = min(end + 1, len(src))
+                if (line.lstrip('\t') if strip_tabs else line) == delimiter:
+                    break
+                lines.append(line)
+            if not quoted:
+                # Unquoted bodies are expanded like double-quoted strings
+                redirect.substitutions.extend(_Parser('\n'.join(lines), 0, self).scan_expansions())
+        self._heredocs = []
+
+    def scan_expansions(self) -> List[Node]:
+        """Substitutions in text that is expanded but not parsed as commands"""
+        substitutions = []
+        src = self.src
+        while self.pos < len(src):
+            c = src[self.pos]
+            if c == '\\':
+                self.pos += 2
+            elif c == '$':
+                self._read_dollar([], substitutions, quoted=True)
+            elif c == '`':
+                self.pos += 1
+                substitutions.append(self._parse_backticks())
+            else:
+                self.pos += 1
+        return substitutions
+
+    # Parsing
+
+    def _peek(self) -> Token:
+        if self._peeked is None:
+            self._peeked = self._next_token()
+        return self._peeked
+
+    def _advance(self) -> Token:
+        token = self._peek()
+        self._peeked = None
+        return token
+
+    def _at_op(self, *operators: str) -> bool:
+        kind, value = self._peek()
+        return kind == 'op' and value in operators
+
+    def _at_reserved(self, *words: str) -> bool:
+        kind, word = self._peek()
+        # Reserved words only count unquoted
+        return kind == 'word' and word.text in words
+
+    def _expect_op(self, operator: str) -> None:
+        if not self._at_op(operator):
+            raise BashSyntaxError(f"expected '{operator}', found {self._describe()}")
+        self._advance()
+
+    def _expect_reserved(self, word: str) -> None:
+        if not self._at_reserved(word):
+            raise BashSyntaxError(f"expected '{word}', found {self._describe()}")
+        self._advance()
+
+    def _expect_word(self) -> Word:
+        kind, word = self._advance()
+        if kind != 'word':
+            raise BashSyntaxError(f"expected a word, found {word!r}")
+        return word
+
+    def _describe(self) -> str:
+        kind, value = self._peek()
+        if kind == 'eof':
+            return 'end of script'
+        return repr(value.text if kind == 'word' else value)
+
+    def _skip_newlines(self) -> None:
+        while self._at_op('\n'):
+            self._advance()
+
+    def parse_script(self) -> CommandList:
+        node = self.parse_list()
+        if self._peek()[0] != 'eof':
+            raise BashSyntaxError(f"unexpected {self._describe()}")
+        return node
+
+    def parse_list(self, reserved: Tuple[str, ...] = (), ops: Tuple[str, ...] = ()) -> CommandList:
+        """Commands up to end of input or one of the given reserved words or operators"""
+        commands = []
+        while True:
+            self._skip_newlines()
+            if self._peek()[0] == 'eof' or self._at_reserved(*reserved) or self._at_op(*ops):
+                break
+            commands.append(self._parse_and_or())
+            if not self._at_op(';', '&', '\n'):
+                break
+            self._advance()
+        return CommandList(commands)
+
+    def _parse_and_or(self) -> Node:
+        commands = [self._parse_pipeline()]
+        while self._at_op('&&', '||'):
+            self._advance()
+            self._skip_newlines()
+            commands.append(self._parse_pipeline())
+        return commands[0] if len(commands) == 1 else CommandList(commands)
+
+    def _parse_pipeline(self) -> Node:
+        negated = False
+        if self._at_reserved('time'):
+            self._advance()
+            if self._at_reserved('-p'):
+                self._advance()
+        if self._at_reserved('!'):
+            self._advance()
+            negated = True
+        commands = [self._parse_command()]
+        while self._at_op('|', '|&'):
+            self._advance()
+            self._skip_newlines()
+            commands.append(self._parse_command())
+        return commands[0] if len(commands) == 1 and not negated else Pipeline(commands, negated)
+
+    def _parse_command(self) -> Node:
+        if self._at_op('('):
+            self._advance()
+            body = self.parse_list(ops=(')',))
+            self._expect_op(')')
+            return Compound('subshell', [body], redirects=self._parse_redirects())
+        if self._at_op('(('):
+            self._advance()
+            substitutions = []
+            self._read_arithmetic(substitutions)
+            return Compound('arithmetic', substitutions, redirects=self._parse_redirects())
+        kind, word = self._peek()
+        if kind == 'word':
+            parse = {
+                '{': self._parse_group, 'if': self._parse_if, 'for': self._parse_for, 'select': self._parse_for,
+                'while': self._parse_while, 'until': self._parse_while, 'case': self._parse_case,
+                '[[': self._parse_conditional, 'function': self._parse_function,
+            }.get(word.text)
+            if parse is not None:
+                node = parse()
+                if isinstance(node, Compound):
+                    node.redirects = self._parse_redirects()
+                return node
+        if kind == 'word' or (kind == 'op' and word in REDIRECT_OPERATORS):
+            return self._parse_simple_command()
+        raise BashSyntaxError(f"unexpected {self._describe()}")
+
+    def _parse_group(self) -> Compound:
+        self._advance()
+        body = self.parse_list(reserved=('}',))
+        self._expect_reserved('}')
+        return Compound('group', [body])
+
+    def _parse_if(self) -> Compound:
+        self._advance()
+        body = []
+        while True:
+            body.append(self.parse_list(reserved=('then',)))
+            self._expect_reserved('then')
+            body.append(self.parse_list(reserved=('elif', 'else', 'fi')))
+            if not self._at_reserved('elif'):
+                break
+            self._advance()
+        if self._at_reserved('else'):
+            self._advance()
+            body.append(self.parse_list(reserved=('fi',)))
+        self._expect_reserved('fi')
+        return Compound('if', body)
+
+    def _parse_for(self) -> Compound:
+        kind = self._advance()[1].text
+        words = []
+        variable = None
+        if self._at_op('(('):
+            self._advance()
+            substitutions = []
+            self._read_arithmetic(substitutions)
+            if self._at_op(';'):
+                self._advance()
+        else:
+            variable = self._expect_word().text
+            self._skip_newlines()
+            if self._at_reserved('in'):
+                self._advance()
+                while self._peek()[0] == 'word':
+                    words.append(self._advance()[1])
+                if not self._at_op(';', '\n'):
+                    raise BashSyntaxError(f"expected ';' or newline, found {self._describe()}")
+                self._advance()
+            elif self._at_op(';'):
+                self._advance()
+            substitutions = []
+        self._skip_newlines()
+        self._expect_reserved('do')
+        body = self.parse_list(reserved=('done',))
+        self._expect_reserved('done')
+        return Compound(kind, substitutions + [body], words, variable=variable)
+
+    def _parse_while(self) -> Compound:
+        kind = self._advance()[1].text
+        condition = self.parse_list(reserved=('do',))
+        self._expect_reserved('do')
+        body = self.parse_list(reserved=('done',))
+        self._expect_reserved('done')
+        return Compound(kind, [condition, body])
+
+    def _parse_case(self) -> Compound:
+        self._advance()
+        words = [self._expect_word()]
+        self._skip_newlines()
+        self._expect_reserved('in')
+        body = []
+        while True:
+            self._skip_newlines()
+            if self._at_reserved('esac'):
+                self._advance()
+                break
+            if self._at_op('('):
+                self._advance()
+            words.append(self._expect_word())
+            while self._at_op('|'):
+                self._advance()
+                words.append(self._expect_word())
+            self._expect_op(')')
+            body.append(self.parse_list(reserved=('esac',), ops=tuple(CASE_TERMINATORS)))
+            if self._at_op(*CASE_TERMINATORS):
+                self._advance()
+            elif not self._at_reserved('esac'):
+                raise BashSyntaxError(f"expected ';;' or 'esac', found {self._describe()}")
+        return Compound('case', body, words)
+
+    def _parse_conditional(self) -> Compound:
+        self._advance()
+        words = []
+        while True:
+            kind, value = self._advance()
+            if kind == 'eof':
+                raise BashSyntaxError("expected ']]'")
+            if kind == 'word':
+                if value.text == ']]':
+                    return Compound('conditional', words=words)
+                words.append(value)
+
+    def _parse_function(self) -> FunctionDef:
+        self._advance()
+        name = self._expect_word()
+        if self._at_op('('):
+            self._advance()
+            self._expect_op(')')
+        self._skip_newlines()
+        return FunctionDef(name.text, self._parse_command())
+
+    def _parse_redirects(self) -> List[Redirect]:
+        redirects = []
+        while self._at_op(*REDIRECT_OPERATORS):
+            redirects.append(self._parse_redirect())
+        return redirects
+
+    def _parse_redirect(self) -> Redirect:
+        operator = self._advance()[1]
+        target = self._expect_word()
+        redirect = Redirect(operator, target)
+        if operator in ('<<', '<<-'):
+            quoted = any(c in target.text for c in '\'"\\')
+            delimiter = target.value if target.value is not None else target.text
+            self._heredocs.append((redirect, delimiter, operator == '<<-', quoted))
+        return redirect
+
+    def _parse_simple_command(self) -> Node:
+        assignments, words, redirects = [], [], []
+        while True:
+            kind, token = self._peek()
+            if kind == 'op' and token in REDIRECT_OPERATORS:
+                redirects.append(self._parse_redirect())
+                continue
+            if kind != 'word':
+                break
+            self._advance()
+            if not words and ASSIGNMENT_PATTERN.match(token.text):
+                assignments.append(token)
+                if token.text.endswith('=') and self._at_op('('):
+                    # Array assignment: name=(items)
+                    self._advance()
+                    while True:
+                        self._skip_newlines()
+                        if self._at_op(')'):
+                            self._advance()
+                            break
+                        assignments.append(self._expect_word())
+                continue
+            if not words and not assignments and not redirects and self._at_op('('):
+                self._advance()
+                self._expect_op(')')
+                self._skip_newlines()
+                return FunctionDef(token.text, self._parse_command())
+            words.append(token)
+        if not (assignments or words or redirects):
+            raise BashSyntaxError(f"unexpected {self._describe()}")
+        return SimpleCommand(assignments, words, redirects)
+
+
+def analyze(script: str) -> Script:
+    """Parse a bash script and collect the text it evaluates when it runs
+
+    Raises:
+        BashSyntaxError: If the script is not valid bash (or uses syntax
+            this parser does not support)
+    """
+    parser = _Parser(script)
+    return Script(parser.parse_script(), parser.arithmetic, parser.indirections)
+
+
+def parse(script: str) -> CommandList:
+    """Parse a bash script into its command tree
+
+    Raises:
+        BashSyntaxError: If the script is not valid bash (or uses syntax
+            this parser does not support)
+    """
+    return analyze(script).tree
+
+
+def iter_commands(node: Node) -> Iterator[SimpleCommand]:
+    """Every simple command in a tree, including those in substitutions and here-documents"""
+    return (node for node in iter_nodes(node) if isinstance(node, SimpleCommand))
+
+
+def iter_nodes(node: Node) -> Iterator[Node]:
+    """Every node in a tree, including those in substitutions and here-documents"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        words, redirects = [], []
+        if isinstance(node, SimpleCommand):
+            words, redirects = node.assignments + node.words, node.redirects
+        elif isinstance(node, (Pipeline, CommandList)):
+            stack.extend(reversed(node.commands))
+        elif isinstance(node, Compound):
+            stack.extend(reversed(node.body))
+            words, redirects = node.words, node.redirects
+        elif isinstance(node, FunctionDef):
+            stack.append(node.body)
+        for word in words:
+            stack.extend(word.substitutions)
+        for redirect in redirects:
+            stack.extend(redirect.target.substitutions + redirect.substitutions)
+
+
+def function_names(node: Node) -> List[str]:
+    """Names of the functions a script defines"""
+    names = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, FunctionDef):
+            names.append(node.name)
+            stack.append(node.body)
+        elif isinstance(node, (Pipeline, CommandList)):
+            stack.extend(node.commands)
+        elif isinstance(node, Compound):
+            stack.extend(node.body)
+    return names
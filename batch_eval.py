@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import difflib
+import json
+import logging
+import re
+import time
+from typing import Dict, List, Optional
+
+from benchmark_llm_latency import make_provider
+from benchmark_retrieval import make_embeddings
+from config import ALLOWED_COMMANDS
+from llms.async_runner import runner
+from llms.llm_base import LLMBase
+from llms.recording import RECORDING_MODES, RecordingLLM
+from llms.resilient import ResilientLLM
+from metrics import percentile
+from rag_service import RAGService
+from sandbox import execute_in_sandbox
+from script_validation import check_script, shellcheck
+
+STAGES = ('retrieve', 'generate', 'validate', 'execute', 'total')
+WHITESPACE_PATTERN = re.compile(r"\s+")
+allowed_commands = set(ALLOWED_COMMANDS)
+
+
+def load_requests(path: str, limit: Optional[int] = None) -> List[Dict]:
+    """Read evaluation requests from a JSONL file
+
+    Each line is an object with a "query" and optionally an "id" and an
+    "expected_script". Lines without a query are skipped.
+    """
+    requests = []
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            if not request.get('query'):
+                logging.warning(f"Skipping line {number} of {path}: no 'query'")
+                continue
+            request.setdefault('id', str(number))
+            requests.append(request)
+            if limit and len(requests) >= limit:
+                break
+    return requests
+
+
+def normalize_script(script: str) -> str:
+    """Script without comments, blank lines and repeated whitespace, for comparison"""
+    lines = [
+        WHITESPACE_PATTERN.sub(' ', line.strip()) for line in (script or '').split('\n')
+        if line.strip() and not line.strip().startswith('#')
+    ]
+    return '\n'.join(lines)
+
+
+async def evaluate_request(request: Dict, llm: LLMBase, rag: Optional[RAGService], execute: bool,
+                           execute_timeout: float) -> Dict:
+    """Run one request through retrieval, generation, validation and optionally execution
+
+    Returns:
+        Dict: The request's id and query, the generated script, validation
+            and comparison results, any error and per-stage timings in ms
+    """
+    query = request['query']
+    result = {'id': request['id'], 'query': query}
+    timings = {}
+    start = time.perf_counter()
+    try:
+        context = None
+        if rag is not None:
+            stage_start = time.perf_counter()
+            context, stats = await asyncio.to_thread(rag.get_context_with_stats, query)
+            timings['retrieve'] = time.perf_counter() - stage_start
+            result['context_passages'] = stats.passages_used
+            result['context_tokens'] = stats.context_tokens
+
+        stage_start = time.perf_counter()
+        script, description = await llm.agenerate_bash_script(query, context)
+        timings['generate'] = time.perf_counter() - stage_start
+        result['script'] = script
+        result['description'] = description
+
+        expected = request.get('expected_script')
+        if expected is not None:
+            result['expected_script'] = expected
+            result['exact_match'] = normalize_script(script) == normalize_script(expected)
+            result['similarity'] = difflib.SequenceMatcher(
+                None, normalize_script(script), normalize_script(expected)
+            ).ratio()
+
+        stage_start = time.perf_counter()
+        valid, messages = await asyncio.to_thread(check_script, script, allowed_commands)
+        timings['validate'] = time.perf_counter() - stage_start
+        result['valid'] = valid
+        result['validation'] = messages
+
+        if execute and valid:
+            stage_start = time.perf_counter()
+            output, output_stats, returncode = await asyncio.to_thread(execute_in_sandbox, script, execute_timeout)
+            timings['execute'] = time.perf_counter() - stage_start
+            result['output'] = output
+            result['returncode'] = returncode
+            result['output_tokens'] = output_stats.original_tokens
+    except Exception as e:
+        logging.warning(f"Request {request['id']} failed: {e}")
+        result['error'] = f"{type(e).__name__}: {e}"
+    timings['total'] = time.perf_counter() - start
+    result['timings_ms'] = {stage: seconds * 1000 for stage, seconds in timings.items()}
+    return result
+
+
+async def run_batch(requests: List[Dict], llm: LLMBase, rag: Optional[RAGService], output_path: str,
+                    concurrency: int = 8, execute: bool = False, execute_timeout: float = 10.0) -> List[Dict]:
+    """Evaluate requests with at most `concurrency` in flight
+
+    Each result is appended to output_path as soon as it is ready, so a
+    partial run still leaves usable results.
+
+    Returns:
+        List[Dict]: Results in request order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index, request):
+        async with semaphore:
+            return index, await evaluate_request(request, llm, rag, execute, execute_timeout)
+
+    results = [None] * len(requests)
+    with open(output_path, 'w') as f:
+        for done in asyncio.as_completed([bounded(index, request) for index, request in enumerate(requests)]):
+            index, result = await done
+            results[index] = result
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+    return results
+
+
+def summarize(results: List[Dict], wall_seconds: float) -> Dict:
+    """Pass rates, match rates, stage latency percentiles and throughput of a run"""
+    compared = [result for result in results if 'exact_match' in result]
+    summary = {
+        'requests': len(results),
+        'errors': sum('error' in result for result in results),
+        'valid_rate': sum(bool(result.get('valid')) for result in results) / len(results) if results else 0.0,
+        'exact_match_rate': sum(result['exact_match'] for result in compared) / len(compared) if compared else None,
+        'mean_similarity': sum(result['similarity'] for result in compared) / len(compared) if compared else None,
+        'queries_per_minute': len(results) / wall_seconds * 60 if wall_seconds else 0.0,
+    }
+    for stage in STAGES:
+        values = [result['timings_ms'][stage] for result in results if stage in result['timings_ms']]
+        if values:
+            summary[f'{stage}_p50_ms'] = percentile(values, 50)
+            summary[f'{stage}_p95_ms'] = percentile(values, 95)
+    return summary
+
+
+if __name__ == "__main__":
+    # Imported pipeline modules configure INFO logging; keep the run's output readable
+    logging.basicConfig(level=logging.WARNING, force=True)
+    parser = argparse.ArgumentParser(
+        description="Batch-evaluate retrieval, script generation and validation over a JSONL file of queries"
+    )
+    parser.add_argument('--input', default='requests.jsonl',
+                        help='one {"query": ..., "id": ..., "expected_script": ...} object per line')
+    parser.add_argument('--output', default='batch_results.jsonl', help="per-request results, one JSON per line")
+    parser.add_argument('--provider', choices=['local', 'gemini', 'groq'], default='gemini')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="requests in flight; raise the provider's *_REQUESTS_PER_MINUTE to match")
+    parser.add_argument('--limit', type=int, help="evaluate only the first N requests")
+    parser.add_argument('--embeddings-dir', default='embeddings')
+    parser.add_argument('--embeddings', choices=['hashing', 'replay', 'record', 'gemini'], default='gemini',
+                        help="query embedding backend; must match the one the index was built with")
+    parser.add_argument('--embedding-recording', default='benchmark_embeddings.json')
+    parser.add_argument('--no-retrieval', action='store_true', help="generate without retrieved context")
+    parser.add_argument('--execute', action='store_true', help="also run valid scripts under firejail")
+    parser.add_argument('--execute-timeout', type=float, default=10.0)
+    parser.add_argument('--stub', action='store_true', help="serve the provider from mock_llm_server.py")
+    parser.add_argument('--recording-mode', choices=RECORDING_MODES,
+                        help="record or replay LLM responses, for free and repeatable regression runs")
+    parser.add_argument('--recording', default='batch_llm_recordings.json')
+    args = parser.parse_args()
+
+    requests = load_requests(args.input, args.limit)
+    if not requests:
+        parser.error(f"No requests with a 'query' in {args.input}")
+
+    stub_url = None
+    if args.stub:
+        from mock_llm_server import start_server
+        server = start_server()
+        stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+    llm = ResilientLLM(make_provider(args.provider, stub_url))
+    if args.recording_mode:
+        llm = RecordingLLM(llm, args.recording, mode=args.recording_mode)
+    llm.initialize()
+
+    rag = None
+    if not args.no_retrieval:
+        rag = RAGService(args.embeddings_dir,
+                         embedding_model=make_embeddings(args.embeddings, args.embedding_recording))
+        if not rag.load_index():
+            logging.warning(f"No index in {args.embeddings_dir}, generating without retrieved context")
+            rag = None
+
+    start = time.perf_counter()
+    results = runner.run(run_batch(
+        requests, llm, rag, args.output, args.concurrency, args.execute, args.execute_timeout
+    ))
+    summary = summarize(results, time.perf_counter() - start)
+    for key, value in summary.items():
+        print(f"{key:>20}: {value:.3f}" if isinstance(value, float) else f"{key:>20}: {value}")
+    print(f"{'shellcheck':>20}: {shellcheck.stats()}")
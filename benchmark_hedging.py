@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from llms.hedged import HedgedLLM
+from llms.llm_base import LLMBase
+from metrics import percentile
+
+SCRIPT_RESPONSE = json.dumps({'bash script': 'df -h', 'description': 'Shows free disk space.'})
+
+
+@dataclass
+class LatencyDistribution:
+    """Log-normal response time with an occasional slow tail, in seconds"""
+    median: float
+    sigma: float = 0.3
+    tail_probability: float = 0.0
+    tail_seconds: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LatencyDistribution':
+        """Parse 'median_ms[,sigma[,tail_probability,tail_ms]]', e.g. '120,0.3,0.05,1000'"""
+        parts = [float(part) for part in spec.split(',')]
+        distribution = cls(parts[0] / 1000)
+        if len(parts) > 1:
+            distribution.sigma = parts[1]
+        if len(parts) > 3:
+            distribution.tail_probability = parts[2]
+            distribution.tail_seconds = parts[3] / 1000
+        return distribution
+
+    def sample(self, rng: random.Random) -> float:
+        seconds = self.median * rng.lognormvariate(0, self.sigma)
+        if rng.random() < self.tail_probability:
+            seconds += self.tail_seconds
+        return seconds
+
+
+class SimulatedLLM(LLMBase):
+    """Provider that streams a canned script after a sampled delay"""
+
+    def __init__(self, name: str, latency: LatencyDistribution, seed: int = 0, chunks: int = 4):
+        super().__init__()
+        self.name = name
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.chunks = chunks
+
+    def initialize(self):
+        pass
+
+    async def _stream(self, text: str) -> AsyncIterator[str]:
+        delay = self.latency.sample(self.rng)
+        # Most of the time goes to the first token, the rest is spread over the stream
+        await asyncio.sleep(delay * 0.8)
+        size = -(-len(text) // self.chunks)
+        for i in range(0, len(text), size):
+            await asyncio.sleep(delay * 0.2 / self.chunks)
+            yield text[i:i + size]
+
+    async def _agenerate_bash_script(self, query: str, context: Optional[str] = None,
+                                     on_script: Optional[Callable[[str], None]] = None) -> tuple[str, str]:
+        return await self._collect_script_stream(self._stream(SCRIPT_RESPONSE), on_script)
+
+    async def _ainterpret_output(self, original_query: str, command_output: str,
+                                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        return await self._collect_text_stream(self._stream("You have 80 gigabytes free."), on_text)
+
+
+async def run_requests(llm: LLMBase, requests: int, concurrency: int) -> List[float]:
+    """Send requests through llm and return each one's latency in seconds"""
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def one(i):
+        async with semaphore:
+            start = loop.time()
+            await llm.agenerate_bash_script(f"query {i}", timeout=None)
+            return loop.time() - start
+
+    return await asyncio.gather(*(one(i) for i in range(requests)))
+
+
+def summarize(name: str, latencies: List[float], llm: LLMBase) -> Dict:
+    row = {'config': name}
+    for q in (50, 90, 99):
+        row[f'p{q}_ms'] = percentile(latencies, q) * 1000
+    row['mean_ms'] = sum(latencies) / len(latencies) * 1000
+    if isinstance(llm, HedgedLLM):
+        stats = llm.hedge_stats()['generate']
+        row['hedge_rate'] = stats['hedge_sent'] / len(latencies)
+        row['secondary_wins'] = stats['secondary_won']
+    else:
+        row['hedge_rate'] = 0.0
+        row['secondary_wins'] = 0
+    return row
+
+
+async def run_benchmark(primary: LatencyDistribution, secondary: LatencyDistribution,
+                        requests: int, concurrency: int, percentiles: List[float], seed: int) -> List[Dict]:
+    """Compare the primary alone with hedged pairs at several hedge percentiles
+
+    Every configuration sees the same seeded latency sequence, and starts
+    with a warm-up pass so the hedge delay is adaptive from the first
+    measured request.
+    """
+    rows = []
+    baseline = SimulatedLLM('sim-primary', primary, seed)
+    await run_requests(baseline, requests, concurrency)
+    baseline.rng.seed(seed + 1)
+    rows.append(summarize('primary only', await run_requests(baseline, requests, concurrency), baseline))
+
+    for q in percentiles:
+        hedged = HedgedLLM(
+            SimulatedLLM(f'sim-primary-p{q:g}', primary, seed),
+            SimulatedLLM(f'sim-secondary-p{q:g}', secondary, seed + 100),
+            hedge_percentile=q,
+            name=f'sim-hedged-p{q:g}',
+        )
+        # Warm-up: learn the primary's latency before measuring
+        await run_requests(hedged.primary, requests, concurrency)
+        hedged.primary.rng.seed(seed + 1)
+        rows.append(summarize(f'hedged at p{q:g}', await run_requests(hedged, requests, concurrency), hedged))
+        logging.debug(f"Hedge delay at p{q:g}: {hedged.hedge_delay('generate') * 1000:.0f} ms")
+    return rows
+
+
+def print_table(rows: List[Dict]) -> None:
+    """Print benchmark rows as an aligned table"""
+    columns = list(rows[0])
+    print('  '.join(f'{column:>15}' for column in columns))
+    for row in rows:
+        print('  '.join(f'{value:>15.3f}' if isinstance(value, float) else f'{value:>15}' for value in row.values()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Tail latency of hedged requests against simulated providers")
+    parser.add_argument('--primary', default='120,0.3,0.05,1000',
+                        help="primary latency: median_ms[,sigma[,tail_probability,tail_ms]]")
+    parser.add_argument('--secondary', default='150,0.3,0.05,1000',
+                        help="secondary latency, same format")
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--percentiles', type=float, nargs='+', default=[90, 95])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print_table(asyncio.run(run_benchmark(
+        LatencyDistribution.parse(args.primary),
+        LatencyDistribution.parse(args.secondary),
+        args.requests, args.concurrency, args.percentiles, args.seed,
+    )))
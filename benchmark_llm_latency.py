@@ -0,0 +1,130 @@
+import argparse
+import logging
+import time
+from typing import Dict, List
+
+from config import GEMINI_API_KEY, GROQ_API_KEY
+from llms.llm_base import LLMBase
+from llms.recording import RECORDING_MODES, RecordingLLM
+from metrics import percentile
+from qa_chunking import normalize_question, split_qa_pairs
+
+# Output fed to interpret_output, so every provider interprets the same text
+SAMPLE_OUTPUT = """Filesystem      Size  Used Avail Use% Mounted on
+/dev/sda1       234G  151G   72G  68% /
+tmpfs           7.8G  1.2M  7.8G   1% /dev/shm"""
+
+
+def make_provider(name: str, stub_url: str = None) -> LLMBase:
+    """Provider by name: 'local', 'gemini' or 'groq'
+
+    Args:
+        name: Provider name
+        stub_url: Root URL of a mock_llm_server.py to send requests to
+            instead of the configured endpoint
+    """
+    if name == 'local':
+        from llms.local_openai import LocalOpenAIService
+        return LocalOpenAIService(base_url=f"{stub_url}/v1") if stub_url else LocalOpenAIService()
+    if name == 'gemini':
+        from llms.gemini import GeminiService
+        return GeminiService(GEMINI_API_KEY or 'stub', base_url=stub_url) if stub_url else GeminiService(GEMINI_API_KEY)
+    if name == 'groq':
+        from llms.groq import GroqService
+        return GroqService(GROQ_API_KEY or 'stub', base_url=stub_url) if stub_url else GroqService(GROQ_API_KEY)
+    raise ValueError(f"Unsupported provider: {name}")
+
+
+def benchmark_provider(llm: LLMBase, queries: List[str]) -> Dict[str, float]:
+    """Run each query through generation and interpretation, one at a time as the assistant does
+
+    Returns:
+        Dict[str, float]: p50/p95 of time to the script, full generation,
+            interpretation and the end-to-end total, in milliseconds
+    """
+    llm.warm_up()
+    timings = {'script': [], 'generate': [], 'interpret': [], 'total': []}
+    failures = 0
+    for query in queries:
+        start = time.perf_counter()
+        script_at = []
+        try:
+            llm.generate_bash_script(query, on_script=lambda script: script_at.append(time.perf_counter()))
+            generated = time.perf_counter()
+            llm.interpret_output(query, SAMPLE_OUTPUT)
+        except Exception as e:
+            logging.warning(f"{llm.name} failed on {query!r}: {e}")
+            failures += 1
+            continue
+        done = time.perf_counter()
+        timings['script'].append((script_at[0] if script_at else generated) - start)
+        timings['generate'].append(generated - start)
+        timings['interpret'].append(done - generated)
+        timings['total'].append(done - start)
+
+    row = {'provider': llm.name, 'queries': len(queries), 'failures': failures}
+    for name, values in timings.items():
+        if values:
+            row[f'{name}_p50_ms'] = percentile(values, 50) * 1000
+            row[f'{name}_p95_ms'] = percentile(values, 95) * 1000
+    return row
+
+
+def print_table(rows: List[Dict]) -> None:
+    """Print benchmark rows as an aligned table"""
+    columns = list(dict.fromkeys(column for row in rows for column in row))
+    print('  '.join(f'{column:>16}' for column in columns))
+    for row in rows:
+        values = [row.get(column, '') for column in columns]
+        print('  '.join(f'{value:>16.1f}' if isinstance(value, float) else f'{value:>16}' for value in values))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="End-to-end LLM latency of the local backend and hosted providers")
+    parser.add_argument('--providers', nargs='+', choices=['local', 'gemini', 'groq'], default=['local'])
+    parser.add_argument('--context-file', default='context.txt')
+    parser.add_argument('--queries', type=int, default=20, help="number of context.txt questions to send")
+    parser.add_argument('--stub', action='store_true',
+                        help="serve every provider from mock_llm_server.py instead of its real endpoint")
+    parser.add_argument('--stub-ttft-ms', type=float, default=50.0)
+    parser.add_argument('--stub-tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--stub-jitter', type=float, default=0.0)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--recording-mode', choices=RECORDING_MODES,
+                        help="wrap each provider in a record/replay cache")
+    parser.add_argument('--recording', default='benchmark_llm_recordings.json',
+                        help="response file used by --recording-mode")
+    args = parser.parse_args()
+
+    with open(args.context_file, 'r') as f:
+        queries = [normalize_question(pair['question']) for pair in split_qa_pairs(f.read())][:args.queries]
+
+    stub_url = None
+    if args.stub:
+        from mock_llm_server import MockBehaviour, start_server
+        server = start_server(behaviour=MockBehaviour(
+            args.stub_ttft_ms / 1000, args.stub_tokens_per_second, args.stub_jitter, args.stub_error_rate,
+        ))
+        stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    rows, cache_stats = [], {}
+    for name in args.providers:
+        replaying = args.recording_mode == 'replay'
+        keyless = replaying or args.stub
+        if not keyless and ((name == 'gemini' and not GEMINI_API_KEY) or (name == 'groq' and not GROQ_API_KEY)):
+            logging.warning(f"Skipping {name}: no API key configured")
+            continue
+        llm = make_provider(name, stub_url)
+        if args.recording_mode:
+            llm = RecordingLLM(llm, args.recording, mode=args.recording_mode)
+        llm.initialize()
+        rows.append(benchmark_provider(llm, queries))
+        if args.recording_mode:
+            cache_stats[name] = llm.cache_stats()
+    if rows:
+        print_table(rows)
+    for name, stats in cache_stats.items():
+        print(f"{name} recording cache: {stats}")
+    if args.stub:
+        print(f"stub requests: {dict(server.RequestHandlerClass.stats)}")
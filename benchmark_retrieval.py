@@ -0,0 +1,222 @@
+import argparse
+import json
+import logging
+import tempfile
+import time
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+from create_embeddingsT import create_faiss_index, load_and_split_data, save_question_lookup
+from local_embeddings import HashingEmbeddings, RecordedEmbeddings
+from metrics import percentile
+from qa_chunking import split_qa_pairs, normalize_question
+from rag_service import RAGService, gemini_embeddings
+
+# Retriever configurations RAGService supports
+RETRIEVER_CONFIGS = {
+    'vector': {'use_question_lookup': False},
+    'lookup+vector': {'use_question_lookup': True},
+}
+RECALL_AT = (1, 3, 5)
+
+
+def build_index(context_file: str, embeddings_dir: str, chunking: str, embedding_model: Embeddings) -> float:
+    """Build an index the way the create_embeddingsT pipeline does
+
+    Args:
+        context_file: Question/Answer formatted context file
+        embeddings_dir: Where to write the index
+        chunking: 'qa' (one document per pair) or 'splitter' (fixed-size chunks)
+        embedding_model: Embedding backend
+
+    Returns:
+        float: Build time in seconds
+    """
+    start = time.perf_counter()
+    if chunking == 'qa':
+        with open(context_file, 'r') as f:
+            pairs = split_qa_pairs(f.read())
+        create_faiss_index(
+            [pair['text'] for pair in pairs],
+            embeddings_dir,
+            [{'question': pair['question'], 'answer': pair['answer']} for pair in pairs],
+            embedding_model=embedding_model,
+        )
+        save_question_lookup(pairs, embeddings_dir)
+    else:
+        create_faiss_index(load_and_split_data(context_file), embeddings_dir, embedding_model=embedding_model)
+    return time.perf_counter() - start
+
+
+def evaluate(service: RAGService, pairs: List[Dict[str, str]], depth: int) -> Dict[str, float]:
+    """Run every question through the service and score the rankings
+
+    A passage counts as relevant when it contains the question's own answer.
+
+    Args:
+        service: Loaded RAGService
+        pairs: Ground-truth Question/Answer pairs
+        depth: Number of passages retrieved per query
+
+    Returns:
+        Dict[str, float]: recall@k, MRR, latency percentiles and the share
+            of queries whose answer survives context assembly
+    """
+    ranks, latencies, in_context, context_tokens = [], [], 0, 0
+    for pair in pairs:
+        # Vosk transcripts are lower case without punctuation
+        query = normalize_question(pair['question'])
+        start = time.perf_counter()
+        passages = service.retrieve(query, k=depth)
+        latencies.append(time.perf_counter() - start)
+
+        rank = next((i + 1 for i, (text, _) in enumerate(passages) if pair['answer'] in text), None)
+        ranks.append(rank)
+
+        context = service.get_relevant_context(query, k=depth)
+        in_context += pair['answer'] in context
+        context_tokens += service.last_context_stats.context_tokens
+
+    results = {f'recall@{k}': sum(1 for r in ranks if r and r <= k) / len(ranks) for k in RECALL_AT}
+    results['mrr'] = sum(1 / r for r in ranks if r) / len(ranks)
+    results['answer_in_context'] = in_context / len(pairs)
+    results['avg_context_tokens'] = context_tokens / len(pairs)
+    results['p50_ms'] = percentile(latencies, 50) * 1000
+    results['p95_ms'] = percentile(latencies, 95) * 1000
+    return results
+
+
+def make_embeddings(backend: str, recording: str) -> Embeddings:
+    """Embedding backend by name: 'hashing', 'replay', 'record' or 'gemini'"""
+    if backend == 'hashing':
+        return HashingEmbeddings()
+    if backend == 'replay':
+        return RecordedEmbeddings(recording, mode='replay')
+    gemini = gemini_embeddings()
+    if backend == 'record':
+        return RecordedEmbeddings(recording, inner=gemini, mode='record')
+    return gemini
+
+
+def run_benchmark(context_file: str, backend: str, recording: str, depth: int) -> List[Dict]:
+    """Benchmark every chunking strategy and retriever configuration"""
+    with open(context_file, 'r') as f:
+        pairs = split_qa_pairs(f.read())
+    embedding_model = make_embeddings(backend, recording)
+
+    rows = []
+    for chunking in ('qa', 'splitter'):
+        with tempfile.TemporaryDirectory() as embeddings_dir:
+            build_seconds = build_index(context_file, embeddings_dir, chunking, embedding_model)
+            for name, options in RETRIEVER_CONFIGS.items():
+                service = RAGService(embeddings_dir, embedding_model=embedding_model, **options)
+                start = time.perf_counter()
+                if not service.load_index():
+                    raise RuntimeError(f"Could not load the {chunking} index")
+                load_ms = (time.perf_counter() - start) * 1000
+
+                row = {'chunking': chunking, 'retriever': name, 'build_s': build_seconds, 'load_ms': load_ms}
+                row.update(evaluate(service, pairs, depth))
+                rows.append(row)
+    return rows
+
+
+class LatencyEmbeddings(Embeddings):
+    """Adds a fixed round-trip delay per embedding call to another backend
+
+    Lets offline runs show the cost of per-query calls to a remote API.
+    """
+
+    def __init__(self, inner: Embeddings, delay: float):
+        self.inner = inner
+        self.delay = delay
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.delay)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.delay)
+        return self.inner.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.delay)
+        if hasattr(self.inner, 'embed_queries'):
+            return self.inner.embed_queries(texts)
+        return [self.inner.embed_query(text) for text in texts]
+
+
+def benchmark_batching(context_file: str, embedding_model: Embeddings, depth: int) -> Dict[str, float]:
+    """Time get_relevant_contexts against a loop over retrieve for every question
+
+    The Q/A lookup is disabled and the query embedding cache is cleared
+    before each run, so both paths embed and search every query.
+    """
+    with open(context_file, 'r') as f:
+        pairs = split_qa_pairs(f.read())
+    queries = [normalize_question(pair['question']) for pair in pairs]
+    with tempfile.TemporaryDirectory() as embeddings_dir:
+        build_index(context_file, embeddings_dir, 'qa', embedding_model)
+        service = RAGService(embeddings_dir, use_question_lookup=False, embedding_model=embedding_model)
+        service.load_index()
+
+        service.clear_query_cache()
+        start = time.perf_counter()
+        looped = [service.retrieve(query, k=depth) for query in queries]
+        loop_seconds = time.perf_counter() - start
+
+        service.clear_query_cache()
+        start = time.perf_counter()
+        batched = service.get_relevant_contexts(queries, k=depth)
+        batch_seconds = time.perf_counter() - start
+
+    # Batched BLAS distances can differ in the last bit, which may reorder ties
+    mismatched = sum(
+        {text for text, _ in one} != {text for text, _ in many}
+        for one, many in zip(looped, batched)
+    )
+    if mismatched:
+        logging.info(f"Batched and looped retrieval differ for {mismatched} queries (ties at the cut-off)")
+    return {
+        'queries': len(queries),
+        'loop_ms': loop_seconds * 1000,
+        'batch_ms': batch_seconds * 1000,
+        'speedup': loop_seconds / batch_seconds if batch_seconds else float('inf'),
+    }
+
+
+def print_table(rows: List[Dict]) -> None:
+    """Print benchmark rows as an aligned table"""
+    columns = list(rows[0])
+    print('  '.join(f'{column:>17}' for column in columns))
+    for row in rows:
+        print('  '.join(f'{value:>17.3f}' if isinstance(value, float) else f'{value:>17}' for value in row.values()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency benchmark over context.txt")
+    parser.add_argument('--context-file', default='context.txt')
+    parser.add_argument('--embeddings', choices=['hashing', 'replay', 'record', 'gemini'], default='hashing',
+                        help="'hashing' and 'replay' run fully offline")
+    parser.add_argument('--recording', default='benchmark_embeddings.json',
+                        help="vector file used by 'record' and 'replay'")
+    parser.add_argument('--depth', type=int, default=10, help="passages retrieved per query (for MRR)")
+    parser.add_argument('--output', help="also write the results as JSON lines")
+    parser.add_argument('--embedding-latency-ms', type=float, default=0.0,
+                        help="simulated round trip per embedding call in the batching benchmark")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.context_file, args.embeddings, args.recording, args.depth)
+    print_table(results)
+
+    embedding_model = make_embeddings(args.embeddings, args.recording)
+    if args.embedding_latency_ms:
+        embedding_model = LatencyEmbeddings(embedding_model, args.embedding_latency_ms / 1000)
+    print()
+    print_table([benchmark_batching(args.context_file, embedding_model, args.depth)])
+    if args.output:
+        with open(args.output, 'w') as f:
+            for row in results:
+                f.write(json.dumps(row) + '\n')
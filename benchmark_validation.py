@@ -0,0 +1,91 @@
+import argparse
+import json
+import logging
+import shutil
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from config import ALLOWED_COMMANDS
+from metrics import percentile
+from script_validation import ShellChecker, policy_violations
+
+
+def load_corpus(path: str) -> List[Dict]:
+    """Read validation cases: one {"script", "allowed", "note"} object per line"""
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def first_word_check(script_content: str, allowed_commands: Iterable[str]) -> Optional[str]:
+    """The previous validator: only the first word of each line was checked"""
+    for line in script_content.split('\n'):
+        command = line.strip().split()[0] if line.strip() else ''
+        if command and command not in allowed_commands:
+            return command
+    return None
+
+
+def evaluate(name: str, is_allowed: Callable[[str], bool], corpus: List[Dict], repeat: int) -> Dict:
+    """Verdict accuracy and per-script latency of one validator over the corpus"""
+    latencies = []
+    missed, refused = [], []
+    for case in corpus:
+        verdict = is_allowed(case['script'])
+        if verdict and not case['allowed']:
+            missed.append(case['note'])
+        elif not verdict and case['allowed']:
+            refused.append(case['note'])
+        start = time.perf_counter()
+        for _ in range(repeat):
+            is_allowed(case['script'])
+        latencies.append((time.perf_counter() - start) / repeat)
+    for note in missed:
+        logging.warning(f"{name} allowed: {note}")
+    for note in refused:
+        logging.warning(f"{name} refused: {note}")
+    return {
+        'validator': name,
+        'correct': len(corpus) - len(missed) - len(refused),
+        'missed': len(missed),
+        'refused': len(refused),
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p95_us': percentile(latencies, 95) * 1e6,
+        'max_us': max(latencies) * 1e6,
+    }
+
+
+def print_table(rows: List[Dict]) -> None:
+    """Print benchmark rows as an aligned table"""
+    columns = list(rows[0])
+    print('  '.join(f'{column:>12}' for column in columns))
+    for row in rows:
+        print('  '.join(f'{value:>12.1f}' if isinstance(value, float) else f'{value:>12}' for value in row.values()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(
+        description="Verdicts and latency of the script whitelist check over a corpus of adversarial scripts"
+    )
+    parser.add_argument('--corpus', default='validation_corpus.jsonl')
+    parser.add_argument('--repeat', type=int, default=200, help="timed runs per script")
+    parser.add_argument('--shellcheck', action='store_true', help="also time a shellcheck run per script")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    allowed = set(ALLOWED_COMMANDS)
+    rows = [
+        evaluate('ast', lambda script: not policy_violations(script, allowed), corpus, args.repeat),
+        evaluate('first word', lambda script: first_word_check(script, allowed) is None, corpus, args.repeat),
+    ]
+    if args.shellcheck and shutil.which('shellcheck'):
+        # Latency only: shellcheck does not know the whitelist
+        uncached = ShellChecker(cache_size=0)
+        for name, checker in (('shellcheck', uncached), ('sc cached', ShellChecker())):
+            row = evaluate(name, lambda script: checker.check(script)[0], corpus, 1)
+            row['correct'] = row['missed'] = row['refused'] = '-'
+            rows.append(row)
+    elif args.shellcheck:
+        logging.warning("shellcheck is not installed")
+    print(f"{len(corpus)} scripts, {sum(not case['allowed'] for case in corpus)} to refuse")
+    print_table(rows)
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from itertools import combinations
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"\w+")
+# Hash values are taken modulo this prime, so a * x + b fits in 64 bits
+_PRIME = (1 << 31) - 1
+
+
+def shingle_set(text: str, size: int = 5) -> Set[int]:
+    """32-bit hashes of the word n-grams in a text"""
+    words = _WORD_PATTERN.findall(text.lower())
+    grams = [' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))]
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=4).digest(), 'little')
+        for gram in grams if gram
+    }
+
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Pick (bands, rows) whose LSH S-curve crosses 0.5 closest to threshold"""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        crossing = (1 / bands) ** (1 / rows)
+        if best is None or abs(crossing - threshold) < best[0]:
+            best = (abs(crossing - threshold), bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes h(x) = (a * x + b) mod p"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, shingles: Set[int]) -> np.ndarray:
+        if not shingles:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))[np.newaxis, :]
+        return ((self.a * values + self.b) % _PRIME).min(axis=1)
+
+
+@dataclass
+class DedupResult:
+    """Chunks left after deduplication and what was saved"""
+    texts: List[str]
+    metadatas: List[Dict]
+    removed: int = 0
+    bytes_saved: int = 0
+    clusters: List[List[int]] = field(default_factory=list)
+
+    @property
+    def embedding_calls_saved(self) -> int:
+        return self.removed
+
+
+def deduplicate_chunks(texts: List[str], metadatas: Optional[List[Dict]] = None,
+                       threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 5,
+                       embedding_dim: int = 768) -> DedupResult:
+    """Merge chunks whose word-shingle Jaccard similarity reaches threshold
+
+    Candidate pairs come from MinHash LSH banding and are confirmed with the
+    exact Jaccard similarity. Each cluster keeps its first chunk; the
+    representative's metadata lists every merged chunk under 'merged_from'.
+
+    Args:
+        texts: Chunk texts in build order
+        metadatas: Per-chunk metadata (may be None)
+        threshold: Minimum Jaccard similarity to merge two chunks
+        num_perm: MinHash signature length
+        shingle_size: Words per shingle
+        embedding_dim: Vector size, used to report index bytes saved
+
+    Returns:
+        DedupResult: Surviving chunks, provenance and savings
+    """
+    metadatas = metadatas or [{} for _ in texts]
+    shingles = [shingle_set(text, shingle_size) for text in texts]
+    hasher = MinHasher(num_perm)
+    signatures = np.array([hasher.signature(s) for s in shingles]) if texts else np.empty((0, num_perm))
+    bands, rows = choose_bands(num_perm, threshold)
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, signature in enumerate(signatures):
+            buckets[signature[band * rows:(band + 1) * rows].tobytes()].append(i)
+        for members in buckets.values():
+            for i, j in combinations(members, 2):
+                if (i, j) in checked or find(i) == find(j):
+                    continue
+                checked.add((i, j))
+                union = len(shingles[i] | shingles[j])
+                if union and len(shingles[i] & shingles[j]) / union >= threshold:
+                    parent[max(find(i), find(j))] = min(find(i), find(j))
+
+    groups = defaultdict(list)
+    for i in range(len(texts)):
+        groups[find(i)].append(i)
+
+    result = DedupResult(texts=[], metadatas=[])
+    for root in sorted(groups):
+        members = groups[root]
+        metadata = dict(metadatas[root])
+        if len(members) > 1:
+            metadata['merged_from'] = [{'chunk': i, **metadatas[i]} for i in members]
+            result.clusters.append(members)
+            for i in members[1:]:
+                result.removed += 1
+                result.bytes_saved += len(texts[i].encode('utf-8')) + embedding_dim * 4
+        result.texts.append(texts[root])
+        result.metadatas.append(metadata)
+
+    logging.info(
+        f"Deduplication kept {len(result.texts)}/{len(texts)} chunks "
+        f"({bands} bands x {rows} rows, Jaccard >= {threshold}); saved "
+        f"{result.embedding_calls_saved} embedding calls and {result.bytes_saved} bytes"
+    )
+    return result
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional
+
+import numpy as np
+
+from metrics import metrics
+from qa_chunking import normalize_question
+
+# Numbers, paths and file names: the parts of a request a script is specific to
+ARGUMENT_TOKEN_PATTERN = re.compile(r"[~./]*[\w.-]*[/.][\w./-]*\w|\d+")
+
+
+def argument_tokens(text: str) -> FrozenSet[str]:
+    """Numeric, path and file name tokens of an utterance
+
+    Two utterances that differ only in these ("kill process 1234" and
+    "kill process 12345") embed almost identically but need different
+    scripts.
+    """
+    return frozenset(ARGUMENT_TOKEN_PATTERN.findall(text.lower()))
+
+
+def cache_fingerprint(allowed_commands: Iterable[str], *templates: str) -> str:
+    """Fingerprint of everything a cached script depends on
+
+    A change to the command whitelist, to a prompt template or to the
+    validation policy version changes the fingerprint, which invalidates
+    every cached script.
+
+    Args:
+        allowed_commands: The whitelist scripts were validated against
+        templates: Prompt templates used to generate the scripts, and the
+            version of the policy they were validated against
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update('\n'.join(sorted(allowed_commands)).encode('utf-8'))
+    for template in templates:
+        digest.update(b'\0')
+        digest.update(template.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CommandCache:
+    """Persistent cache of validated scripts keyed by utterance
+
+    Lookups first try the normalized ASR text, then fall back to cosine
+    similarity between query embeddings when an embedding function is given.
+    A similar entry is only returned if its numbers, paths and file names
+    match the query's, and it is marked as a semantic match so the caller
+    can validate it again and confirm it before running it.
+
+    Hit counts and last-use times are kept in memory and written to disk
+    with the next put(), eviction or flush().
+    """
+
+    def __init__(self, path: str, fingerprint: str,
+                 embed_fn: Optional[Callable[[str], List[float]]] = None,
+                 similarity_threshold: float = 0.92,
+                 ttl_seconds: float = 7 * 24 * 3600,
+                 max_entries: int = 256):
+        """Initialize the cache and load any entries saved at path
+
+        Args:
+            path: JSON file the cache is persisted to
+            fingerprint: Value from cache_fingerprint for the current setup
+            embed_fn: Returns the embedding of a query, or None to match
+                on normalized text only
+            similarity_threshold: Minimum cosine similarity for a hit
+            ttl_seconds: Entries older than this are evicted
+            max_entries: Least recently used entries beyond this are evicted
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def load(self) -> None:
+        """Load entries from disk, dropping them if the fingerprint changed"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Error loading command cache: {e}")
+            return
+
+        if data.get('fingerprint') != self.fingerprint:
+            logging.info("Whitelist or prompt template changed, invalidating command cache")
+            metrics.incr('command_cache.invalidated')
+            self.save()
+            return
+
+        self.entries = OrderedDict((entry['key'], entry) for entry in data.get('entries', []))
+        if self._evict():
+            self.save()
+        logging.info(f"Loaded {len(self.entries)} cached commands from {self.path}")
+
+    def save(self) -> None:
+        """Write entries to disk atomically"""
+        data = {'fingerprint': self.fingerprint, 'entries': list(self.entries.values())}
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            logging.error(f"Error saving command cache: {e}")
+
+    def flush(self) -> None:
+        """Write hit counts and last-use times that are not on disk yet"""
+        with self._lock:
+            if self._dirty:
+                self.save()
+
+    def get(self, query: str) -> Optional[Dict]:
+        """Return the cached entry for a query, if any
+
+        Args:
+            query: Recognized utterance
+
+        Returns:
+            Optional[Dict]: Copy of the entry with 'script', 'description'
+                and 'match' ('exact' or 'semantic'), or None
+        """
+        start = time.perf_counter()
+        key = normalize_question(query)
+        with self._lock:
+            if self._evict():
+                self.save()
+            entry = self.entries.get(key)
+            candidates = list(self.entries.values()) if entry is None else []
+        match = 'exact'
+
+        if entry is None and candidates and self.embed_fn is not None:
+            entry = self._nearest(self.embed_fn(query), candidates)
+            match = 'semantic'
+            if entry is not None and argument_tokens(entry['query']) != argument_tokens(query):
+                logging.info(
+                    f"Not reusing the script cached for '{entry['query']}': its arguments differ from '{query}'"
+                )
+                metrics.incr('command_cache.argument_mismatch')
+                entry = None
+
+        if entry is None:
+            metrics.incr('command_cache.miss')
+            return None
+
+        with self._lock:
+            entry['last_used'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            if entry['key'] in self.entries:
+                self.entries.move_to_end(entry['key'])
+            self._dirty = True
+            entry = dict(entry, match=match)
+
+        metrics.incr(f'command_cache.{match}_hit')
+        metrics.incr('command_cache.hit')
+        metrics.observe('command_cache.lookup_seconds', time.perf_counter() - start)
+        logging.info(f"Command cache {match} hit for '{query}' (cached as '{entry['query']}')")
+        return entry
+
+    def put(self, query: str, script: str, description: str) -> None:
+        """Store a script that passed validation
+
+        Args:
+            query: Utterance the script was generated for
+            script: Validated bash script
+            description: Description returned by the LLM
+        """
+        key = normalize_question(query)
+        embedding = None
+        if self.embed_fn is not None:
+            embedding = [round(float(x), 6) for x in self.embed_fn(query)]
+        now = time.time()
+        with self._lock:
+            self.entries[key] = {
+                'key': key,
+                'query': query,
+                'script': script,
+                'description': description,
+                'embedding': embedding,
+                'created': now,
+                'last_used': now,
+                'hits': 0,
+            }
+            self.entries.move_to_end(key)
+            self._evict()
+            self.save()
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            self.entries.clear()
+            self.save()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counts and hit rate since startup"""
+        hits = metrics.counter('command_cache.hit')
+        misses = metrics.counter('command_cache.miss')
+        total = hits + misses
+        return {
+            'entries': len(self.entries),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+
+    def _nearest(self, embedding: List[float], candidates: List[Dict]) -> Optional[Dict]:
+        """Most similar candidate above the similarity threshold"""
+        candidates = [entry for entry in candidates if entry.get('embedding')]
+        if not candidates:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        matrix = np.asarray([entry['embedding'] for entry in candidates], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        similarities = matrix @ query / np.maximum(norms, 1e-12)
+        best = int(np.argmax(similarities))
+        logging.debug(f"Closest cached command similarity: {similarities[best]:.3f}")
+        if similarities[best] >= self.similarity_threshold:
+            return candidates[best]
+        return None
+
+    def _evict(self) -> bool:
+        """Remove expired entries and trim to max_entries (caller holds the lock)
+
+        Returns:
+            bool: Whether any entry was removed
+        """
+        size = len(self.entries)
+        cutoff = time.time() - self.ttl_seconds
+        for key in [key for key, entry in self.entries.items() if entry['created'] < cutoff]:
+            del self.entries[key]
+            metrics.incr('command_cache.expired')
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            metrics.incr('command_cache.evicted')
+        return len(self.entries) != size
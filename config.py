@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+import json
 import os
 import getpass
 # Load environment variables from .env file
@@ -12,9 +13,135 @@ GOOGLE_API_KEY = os.getenv("GEMINI_API_KEY")
 # Groq API Key
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# LLM models and provider connections
+# Alternative API endpoints, e.g. mock_llm_server.py at http://127.0.0.1:8080
+# (unset uses the public APIs; GEMINI_BASE_URL also applies to embeddings)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GROQ_SCRIPT_MODEL = os.getenv("GROQ_SCRIPT_MODEL", "llama-3.1-8b-instant")
+GROQ_INTERPRET_MODEL = os.getenv("GROQ_INTERPRET_MODEL", "mixtral-8x7b-32768")
+# Local OpenAI-compatible server (llama.cpp, Ollama, vLLM, or mock_llm_server.py)
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL", "http://127.0.0.1:8080/v1")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY")
+LOCAL_LLM_SCRIPT_MODEL = os.getenv("LOCAL_LLM_SCRIPT_MODEL", "qwen2.5-coder:7b")
+LOCAL_LLM_INTERPRET_MODEL = os.getenv("LOCAL_LLM_INTERPRET_MODEL", "llama3.2:3b")
+# Adaptive model routing (llms/router.py): the models each provider may use,
+# with a quality tier (1 = small and fast, 2 = large). The models above are
+# the defaults, used while a model has too few samples and when routing is off.
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "true").lower() == "true"
+MODEL_ROUTES = json.loads(os.getenv("MODEL_ROUTES", "null")) or {
+    'gemini': {'gemini-1.5-flash-8b': 1, GEMINI_MODEL: 2},
+    'groq': {GROQ_SCRIPT_MODEL: 1, 'llama-3.3-70b-versatile': 2, GROQ_INTERPRET_MODEL: 2},
+    'local': {LOCAL_LLM_INTERPRET_MODEL: 1, LOCAL_LLM_SCRIPT_MODEL: 2},
+}
+# Lowest tier allowed per task, and for simple queries (short requests, small outputs)
+ROUTER_TASK_TIERS = {'generate': 2, 'interpret': 2}
+ROUTER_SIMPLE_TIER = int(os.getenv("ROUTER_SIMPLE_TIER", "1"))
+ROUTER_SIMPLE_QUERY_WORDS = int(os.getenv("ROUTER_SIMPLE_QUERY_WORDS", "8"))
+ROUTER_SIMPLE_OUTPUT_TOKENS = int(os.getenv("ROUTER_SIMPLE_OUTPUT_TOKENS", "200"))
+# Rolling window of calls per model; models with fewer samples are explored,
+# and models failing more often than ROUTER_MAX_FAILURE_RATE are avoided
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "50"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+ROUTER_EXPLORE_RATE = float(os.getenv("ROUTER_EXPLORE_RATE", "0.1"))
+ROUTER_MAX_FAILURE_RATE = float(os.getenv("ROUTER_MAX_FAILURE_RATE", "0.3"))
+# Idle time after which a pooled connection is assumed closed (next request is cold)
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "4"))
+# Record/replay LLM responses: 'off', 'record', 'replay' or 'passthrough'
+LLM_RECORDING_MODE = os.getenv("LLM_RECORDING_MODE", "off")
+LLM_RECORDING_PATH = os.getenv("LLM_RECORDING_PATH", "llm_recordings.json")
+# Deadlines for LLM calls, including any repair request
+LLM_GENERATE_TIMEOUT_SECONDS = float(os.getenv("LLM_GENERATE_TIMEOUT_SECONDS", "30"))
+LLM_INTERPRET_TIMEOUT_SECONDS = float(os.getenv("LLM_INTERPRET_TIMEOUT_SECONDS", "20"))
+# Hedged requests: wait this long on the primary until enough calls have been
+# seen to use its HEDGE_PERCENTILE latency instead
+HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "1.5"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Ask providers for JSON through their native response format/schema options
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "true").lower() == "true"
+# Rate limits, retries and circuit breakers for remote calls (resilience.py)
+# Requests per minute allowed to each provider (0 disables the limit)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15"))
+GEMINI_EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_EMBEDDING_REQUESTS_PER_MINUTE", "1500"))
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+LOCAL_LLM_REQUESTS_PER_MINUTE = float(os.getenv("LOCAL_LLM_REQUESTS_PER_MINUTE", "0"))
+# Attempts per call, with exponential backoff and jitter between them
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("RETRY_BACKOFF_SECONDS", "0.5"))
+RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("RETRY_BACKOFF_MAX_SECONDS", "8"))
+# Retries across all providers may add at most RETRY_BUDGET_RATIO of the calls
+# made in the last RETRY_BUDGET_WINDOW_SECONDS, plus RETRY_BUDGET_MIN
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN = int(os.getenv("RETRY_BUDGET_MIN", "5"))
+RETRY_BUDGET_WINDOW_SECONDS = float(os.getenv("RETRY_BUDGET_WINDOW_SECONDS", "60"))
+# Time a single LLM attempt may take to stream its first chunk, so a stalled
+# provider is retried or rerouted; streaming output is bounded only by the call deadline
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "10"))
+# Consecutive failures that open a provider's circuit, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Provider calls are rerouted to while the configured one fails: gemini, groq, local or '' for none
+LLM_FALLBACK_SERVICE = os.getenv("LLM_FALLBACK_SERVICE", "")
+
 # Vosk model path
 VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH")
 
+# Speculative retrieval/generation on stable ASR partial results
+ASR_BLOCK_SECONDS = float(os.getenv("ASR_BLOCK_SECONDS", "0.2"))
+SPECULATION_STABLE_BLOCKS = int(os.getenv("SPECULATION_STABLE_BLOCKS", "3"))
+SPECULATION_MATCH_RATIO = float(os.getenv("SPECULATION_MATCH_RATIO", "0.9"))
+SPECULATIVE_GENERATION = os.getenv("SPECULATIVE_GENERATION", "false").lower() == "true"
+
+# Commands a generated script may invoke
+ALLOWED_COMMANDS = frozenset([
+    'ls', 'echo', 'cat', 'grep', 'awk', 'sed', 'cut', 'sort', 'uniq',
+    'wc', 'head', 'tail', 'find', 'date', 'pwd', 'whoami', 'uname', 'mkdir', 
+    'rmdir', 'touch', 'cp', 'mv', 'less', 'nano', 'vim', 'more', 'diff', 
+    'tar', 'gzip', 'gunzip', 'zip', 'unzip', 'ping', 'curl', 'wget', 'apt', 
+    'dpkg', 'python', 'python3', 'g++', 'gcc', 'node', 'javac', 'java', 
+    'ruby', 'df', 'du', 'free', 'top', 'htop', 'uptime', 'ps', 'id', 
+    'hostname', 'cal', 'man', 'bc', 'time', 'xargs', 'tr', 'chmod', 'chown', 
+    'tee', 'split', 'dmesg', 'iostat', 'vmstat', 'sar', 'lsof', 'who', 
+    'last', 'mount', 'umount', 'blkid', 'fdisk', 'mkfs', 'ifconfig', 'netstat', 
+    'ss', 'iptables', 'traceroute', 'nmap', 'which', 'locate', 'bc',
+    'alias', 'unalias', 'factor', 'yes', 'shutdown', 'reboot', 'kill', 'killall',
+    'history', 'ip', 'clear', 'exit', 'logout', 'su', 'sudo', 'passwd', 'useradd',
+])
+
+# Retrieval context assembly
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "512"))
+RAG_MAX_PASSAGES = int(os.getenv("RAG_MAX_PASSAGES", "6"))
+RAG_MAX_SCORE_GAP = float(os.getenv("RAG_MAX_SCORE_GAP", "0.25"))
+# Jaccard similarity at which chunks are merged at build time (0 disables)
+RAG_DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.85"))
+# Index encoding used at build time, e.g. flat, fp16, sq8, pq96 or pca128,sq8
+RAG_INDEX_SPEC = os.getenv("RAG_INDEX_SPEC", "flat")
+RAG_RELOAD_INTERVAL_SECONDS = float(os.getenv("RAG_RELOAD_INTERVAL_SECONDS", "5"))
+# Pages ingested by ingest_docs.py, per command; removed by a full rebuild
+DOCS_MANIFEST_FILE = "docs_manifest.json"
+
+# Command output compaction before interpretation (output_compaction.py):
+# longer outputs keep their first and last lines, collapse repeats and
+# summarize table columns, within OUTPUT_MAX_TOKENS
+OUTPUT_MAX_TOKENS = int(os.getenv("OUTPUT_MAX_TOKENS", "800"))
+OUTPUT_HEAD_LINES = int(os.getenv("OUTPUT_HEAD_LINES", "30"))
+OUTPUT_TAIL_LINES = int(os.getenv("OUTPUT_TAIL_LINES", "15"))
+OUTPUT_MAX_LINE_CHARS = int(os.getenv("OUTPUT_MAX_LINE_CHARS", "300"))
+
+# Semantic command cache
+COMMAND_CACHE_PATH = os.getenv("COMMAND_CACHE_PATH", "command_cache.json")
+COMMAND_CACHE_SIMILARITY = float(os.getenv("COMMAND_CACHE_SIMILARITY", "0.92"))
+COMMAND_CACHE_TTL_SECONDS = float(os.getenv("COMMAND_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+COMMAND_CACHE_MAX_ENTRIES = int(os.getenv("COMMAND_CACHE_MAX_ENTRIES", "256"))
+
+# ShellCheck runs (script_validation.py); verdicts are cached by script hash
+SHELLCHECK_TIMEOUT_SECONDS = float(os.getenv("SHELLCHECK_TIMEOUT_SECONDS", "5"))
+SHELLCHECK_CACHE_SIZE = int(os.getenv("SHELLCHECK_CACHE_SIZE", "512"))
+SHELLCHECK_WORKERS = int(os.getenv("SHELLCHECK_WORKERS", "2"))
+
 
 
 
@@ -34,6 +161,16 @@ Don't include any additional text like ``` or comments in your response.
 Return in stringified JSON format only so that it can be converted using python json.loads().
 """
 
+# Sent once when a script response cannot be parsed locally
+JSON_REPAIR_PROMPT = """
+The following response was supposed to be a single JSON object with exactly two string keys, "bash script" and "description", but it could not be parsed ({error}).
+
+Response:
+{response}
+
+Return only the corrected JSON object, without code fences or any other text.
+"""
+
 OUTPUT_INTERPRETATION_PROMPT = """
 You are a virtual assistant answering user queries based on the output of a Bash command.
 Review the user query and the raw output below, and provide a straightforward, user-friendly interpretation of the results.
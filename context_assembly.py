@@ -0,0 +1,179 @@
+import logging
+import math
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from metrics import metrics
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Shortest shared span treated as chunk overlap rather than a coincidence
+MIN_OVERLAP_CHARS = 40
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text without a remote tokenizer
+
+    Words count as one token per four characters (rounded up) and every
+    punctuation mark as one token, which tracks BPE tokenizers closely
+    enough for budgeting English prompts.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        int: Estimated number of tokens
+    """
+    return sum(math.ceil(len(token) / 4) for token in _TOKEN_PATTERN.findall(text))
+
+
+def _overlap_length(first: str, second: str) -> int:
+    """Length of the longest suffix of first that is a prefix of second"""
+    longest = min(len(first), len(second))
+    for length in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+
+def remove_overlap(selected: List[str], text: str) -> str:
+    """Strip the parts of text already present in the selected passages
+
+    Handles chunks that are fully contained in a selected passage and the
+    prefix/suffix overlap produced by sliding-window splitters.
+
+    Args:
+        selected: Passages already placed in the context
+        text: Candidate passage
+
+    Returns:
+        str: The new part of text, or an empty string if nothing is new
+    """
+    for passage in selected:
+        if text in passage:
+            return ''
+        head = _overlap_length(passage, text)
+        if head:
+            text = text[head:]
+        tail = _overlap_length(text, passage)
+        if tail:
+            text = text[:-tail]
+    return text.strip()
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text at a whitespace boundary so it fits within max_tokens"""
+    words = text.split(' ')
+    while words and estimate_tokens(' '.join(words)) > max_tokens:
+        words.pop()
+    return ' '.join(words)
+
+
+@dataclass
+class ContextStats:
+    """What context assembly kept and what it saved"""
+    candidates: int = 0
+    passages_used: int = 0
+    raw_tokens: int = 0
+    context_tokens: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.raw_tokens - self.context_tokens
+
+
+def assemble_context(scored_passages: List[Tuple[str, float]], token_budget: int,
+                     max_score_gap: Optional[float] = None) -> Tuple[str, ContextStats]:
+    """Combine retrieved passages into a deduplicated, budgeted context
+
+    Args:
+        scored_passages: (passage, distance) pairs, best first, as returned
+            by a FAISS L2 search (lower distance is more relevant)
+        token_budget: Maximum estimated tokens in the combined context
+        max_score_gap: Drop passages whose distance exceeds the best one by
+            more than this; None keeps every passage
+
+    Returns:
+        Tuple[str, ContextStats]: The context and assembly statistics
+    """
+    stats = ContextStats(candidates=len(scored_passages))
+    stats.raw_tokens = sum(estimate_tokens(text) for text, _ in scored_passages)
+    if not scored_passages:
+        return '', stats
+
+    best_score = scored_passages[0][1]
+    selected = []
+    used_tokens = 0
+    for text, score in scored_passages:
+        if max_score_gap is not None and score - best_score > max_score_gap:
+            break
+        text = remove_overlap(selected, text)
+        if not text:
+            continue
+        tokens = estimate_tokens(text)
+        if used_tokens + tokens > token_budget:
+            if selected:
+                continue
+            # Always keep something from the best passage
+            text = truncate_to_tokens(text, token_budget)
+            tokens = estimate_tokens(text)
+        selected.append(text)
+        used_tokens += tokens
+
+    stats.passages_used = len(selected)
+    stats.context_tokens = used_tokens
+    metrics.observe('rag.context_tokens', stats.context_tokens)
+    metrics.observe('rag.context_tokens_saved', stats.tokens_saved)
+    logging.debug(
+        f"Context assembly kept {stats.passages_used}/{stats.candidates} passages, "
+        f"{stats.context_tokens} tokens ({stats.tokens_saved} saved)"
+    )
+    return '\n\n'.join(selected), stats
+
+
+class GenerationLatencyModel:
+    """Relates prompt context size to LLM generation latency
+
+    Fits latency = intercept + slope * context_tokens over recent calls, so the
+    tokens saved by context assembly can be reported as seconds saved.
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, context_tokens: int, tokens_saved: int, seconds: float) -> None:
+        """Record one generation call"""
+        with self._lock:
+            self._samples.append((context_tokens, seconds))
+        metrics.observe('llm.generate_seconds', seconds)
+        saved = self.seconds_saved(tokens_saved)
+        if saved is not None:
+            metrics.observe('rag.estimated_seconds_saved', saved)
+        logging.info(
+            f"Generation took {seconds:.2f}s with {context_tokens} context tokens "
+            f"({tokens_saved} tokens saved"
+            + (f", ~{saved * 1000:.0f} ms faster)" if saved is not None else ")")
+        )
+
+    def seconds_per_token(self) -> Optional[float]:
+        """Least-squares slope of latency over context tokens"""
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < 2:
+            return None
+        mean_x = sum(x for x, _ in samples) / len(samples)
+        mean_y = sum(y for _, y in samples) / len(samples)
+        variance = sum((x - mean_x) ** 2 for x, _ in samples)
+        if variance == 0:
+            return None
+        covariance = sum((x - mean_x) * (y - mean_y) for x, y in samples)
+        return max(0.0, covariance / variance)
+
+    def seconds_saved(self, tokens_saved: int) -> Optional[float]:
+        """Estimated latency removed by leaving tokens_saved out of the prompt"""
+        slope = self.seconds_per_token()
+        return slope * tokens_saved if slope is not None else None
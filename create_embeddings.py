@@ -4,10 +4,11 @@ import numpy as np
 import json
 import os
 from typing import List
-from tenacity import retry, stop_after_attempt, wait_exponential
 from tqdm import tqdm
-import google.generativeai as genai
-from config import GEMINI_API_KEY, GROQ_API_KEY
+import httpx
+from config import GEMINI_API_KEY, GEMINI_BASE_URL, GROQ_API_KEY
+from llms.gemini import DEFAULT_GEMINI_BASE_URL
+from resilience import guard
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -15,24 +16,33 @@ class EmbeddingProvider:
     def __init__(self, provider: str = 'gemini'):
         self.provider = provider.lower()
         if provider == 'gemini':
-            genai.configure(api_key=GEMINI_API_KEY)
+            self.api_key = GEMINI_API_KEY
+            self.base_url = (GEMINI_BASE_URL or DEFAULT_GEMINI_BASE_URL).rstrip('/')
             self.embedding_dim = 768  # Dimension for text-embedding-004
         else:
             self.api_key = GROQ_API_KEY
             self.embedding_dim = 1024
         
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     def get_embedding(self, text: str) -> np.ndarray:
-        """Get embedding from the selected provider with retry logic"""
+        """Get embedding from the selected provider, rate limited and retried by resilience.py"""
+        return guard(f'{self.provider}-embedding').call(lambda: self._embed(text))
+
+    def _embed(self, text: str) -> np.ndarray:
         if self.provider == 'gemini':
             try : 
-                result = genai.embed_content(
-                    model="models/text-embedding-004",
-                    content=text,
-                    task_type="retrieval_document",
-                    title="Embedding generation"
+                response = httpx.post(
+                    f"{self.base_url}/v1beta/models/text-embedding-004:embedContent",
+                    headers={'x-goog-api-key': self.api_key or ''},
+                    json={
+                        'model': 'models/text-embedding-004',
+                        'content': {'parts': [{'text': text}]},
+                        'taskType': 'RETRIEVAL_DOCUMENT',
+                        'title': 'Embedding generation',
+                    },
+                    timeout=30.0,
                 )
-                embedding = np.array(result['embedding'])
+                response.raise_for_status()
+                embedding = np.array(response.json()['embedding']['values'])
                 logging.info(f"Generated embedding for: {text}")
             except Exception as e:
                 logging.error(f"Failed to generate embedding: {e}")
@@ -1,15 +1,19 @@
 import logging
 import json
 import os
-from typing import List
-from tenacity import retry, stop_after_attempt, wait_exponential
+from typing import Dict, List, Optional
 from tqdm import tqdm
 import numpy as np
 from config import GEMINI_API_KEY
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from rag_service import gemini_embeddings
 from langchain_community.vectorstores import FAISS 
 from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from qa_chunking import split_qa_pairs, build_question_lookup
+from index_quantization import FULL_INDEX_FILE, SPEC_FILE, apply_to_directory, compare_index_specs, extract_vectors
+from chunk_dedup import deduplicate_chunks
+from config import RAG_INDEX_SPEC, RAG_DEDUP_THRESHOLD, DOCS_MANIFEST_FILE
 from dotenv import load_dotenv
 import os
 import getpass
@@ -24,12 +28,11 @@ class EmbeddingProvider:
     def __init__(self, provider: str = 'gemini'):
         self.provider = provider.lower()
         if provider == 'gemini':
-            self.embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+            self.embedding_model = gemini_embeddings()
             self.embedding_dim = 768  # Adjust based on model
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     def get_embedding(self, text: str) -> np.ndarray:
-        '''Get embedding from the selected provider with retry logic'''
+        '''Get embedding from the selected provider (retried by resilience.py)'''
         try:
             embedding = self.embedding_model.embed_query(text)
             return np.array(embedding).reshape(1, -1)
@@ -46,12 +49,18 @@ class EmbeddingProvider:
             embeddings.extend(batch_embeddings)
         return np.array(embeddings)
 
-def create_faiss_index(texts: List[str], embeddings_dir: str) -> None:
-    '''Create FAISS index from texts and save both index and raw texts'''
-    embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+def create_faiss_index(texts: List[str], embeddings_dir: str, metadatas: Optional[List[Dict]] = None,
+                       embedding_model: Optional[Embeddings] = None, index_spec: str = RAG_INDEX_SPEC) -> None:
+    '''Create FAISS index from texts and save both index and raw texts
+    
+    A non-flat index_spec (see index_quantization.py) re-encodes the saved
+    index and logs its recall against the full-precision vectors.
+    '''
+    embedding_model = embedding_model or gemini_embeddings()
     
     # Create Document objects
-    documents = [Document(page_content=text) for text in texts]
+    metadatas = metadatas or [{} for _ in texts]
+    documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
     
     # Create and save FAISS index
     vectorstore = FAISS.from_documents(documents, embedding_model)
@@ -62,6 +71,17 @@ def create_faiss_index(texts: List[str], embeddings_dir: str) -> None:
     # Save the index and documents
     vectorstore.save_local(embeddings_dir)
     
+    # Any float32 copy and spec from an earlier build are stale now, and so is
+    # the ingest manifest: the pages it lists are not in the rebuilt index
+    for stale_file in (FULL_INDEX_FILE, SPEC_FILE, DOCS_MANIFEST_FILE):
+        stale_path = os.path.join(embeddings_dir, stale_file)
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+    if index_spec != 'flat':
+        for row in compare_index_specs(extract_vectors(vectorstore.index), [index_spec]):
+            logging.info(f"Index spec comparison against float32: {row}")
+        apply_to_directory(embeddings_dir, index_spec)
+    
     # Save raw texts
     with open(os.path.join(embeddings_dir, 'passages.json'), 'w') as f:
         json.dump(texts, f)
@@ -79,13 +99,47 @@ def load_and_split_data(file_path: str) -> List[str]:
     
     return text_splitter.split_text(text)
 
+def load_qa_pairs(file_path: str) -> List[Dict[str, str]]:
+    '''Load a Question/Answer formatted file as one record per pair'''
+    with open(file_path, 'r') as file:
+        text = file.read()
+    
+    return split_qa_pairs(text)
+
+def save_question_lookup(pairs: List[Dict[str, str]], embeddings_dir: str) -> None:
+    '''Save the pairs and their normalized-question lookup table next to the index'''
+    with open(os.path.join(embeddings_dir, 'qa_pairs.json'), 'w') as f:
+        json.dump({'pairs': pairs, 'lookup': build_question_lookup(pairs)}, f)
+
 def main(file_path: str, embeddings_dir: str):
     '''Main function to process text data and create FAISS index'''
-    # Load and split the data
-    texts = load_and_split_data(file_path)
+    pairs = load_qa_pairs(file_path)
+    
+    if pairs:
+        # Index every Question/Answer pair as its own document
+        texts = [pair['text'] for pair in pairs]
+        metadatas = [{'question': pair['question'], 'answer': pair['answer']} for pair in pairs]
+    else:
+        # Load and split the data
+        texts = load_and_split_data(file_path)
+        metadatas = None
+    
+    # Skip embedding near-duplicate chunks
+    if RAG_DEDUP_THRESHOLD > 0:
+        deduped = deduplicate_chunks(texts, metadatas, threshold=RAG_DEDUP_THRESHOLD)
+        texts, metadatas = deduped.texts, deduped.metadatas
+    
+    create_faiss_index(texts, embeddings_dir, metadatas)
+    
+    if pairs:
+        # Exact lookups still cover every question, including merged ones
+        save_question_lookup(pairs, embeddings_dir)
+    else:
+        # Drop a lookup table left over from an earlier Q/A build
+        stale_lookup = os.path.join(embeddings_dir, 'qa_pairs.json')
+        if os.path.exists(stale_lookup):
+            os.remove(stale_lookup)
     
-    # Create and save the FAISS index
-    create_faiss_index(texts, embeddings_dir)
     logging.info("FAISS index created successfully")
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+import argparse
+import logging
+import math
+import os
+import re
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+# Index specs are "[reduction,]codec":
+#   reduction: pca<N> (PCA to N dims) or mrl<N> (keep the first N dims, Matryoshka-style)
+#   codec:     flat (float32), fp16, sq8 (8-bit scalar) or pq<M> (M-byte product codes)
+DEFAULT_SPECS = ['flat', 'fp16', 'sq8', 'pq96', 'pca256', 'pca128,sq8', 'mrl256', 'mrl256,sq8']
+# Float32 original kept next to a re-encoded index.faiss, and the spec index.faiss was encoded with
+FULL_INDEX_FILE = 'index.full.faiss'
+SPEC_FILE = 'index.spec'
+_SPEC_PATTERN = re.compile(r'^(?:(?P<reduction>pca|mrl)(?P<dim>\d+),)?(?P<codec>flat|fp16|sq8|pq(?P<m>\d+))$')
+
+
+def parse_spec(spec: str) -> Tuple[Optional[str], Optional[int], str, Optional[int]]:
+    """Split an index spec into (reduction, reduced dim, codec, PQ bytes)
+
+    A bare reduction such as "pca128" means a float32 index over the reduced vectors.
+    """
+    if re.fullmatch(r'(pca|mrl)\d+', spec):
+        spec = f"{spec},flat"
+    match = _SPEC_PATTERN.match(spec)
+    if match is None:
+        raise ValueError(f"Unsupported index spec: {spec}")
+    dim = int(match.group('dim')) if match.group('dim') else None
+    m = int(match.group('m')) if match.group('m') else None
+    codec = 'pq' if m else match.group('codec')
+    return match.group('reduction'), dim, codec, m
+
+
+def _codec_index(dim: int, codec: str, m: Optional[int], num_vectors: int) -> faiss.Index:
+    if codec == 'flat':
+        return faiss.IndexFlatL2(dim)
+    if codec == 'fp16':
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+    if codec == 'sq8':
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+    if dim % m:
+        raise ValueError(f"PQ with {m} sub-quantizers needs a dimension divisible by {m}, got {dim}")
+    # Small corpora cannot train 256 centroids per sub-quantizer
+    nbits = max(4, min(8, int(math.log2(max(num_vectors, 2)))))
+    index = faiss.IndexPQ(dim, m, nbits)
+    index.pq.cp.min_points_per_centroid = 1
+    return index
+
+
+def build_index(vectors: np.ndarray, spec: str) -> faiss.Index:
+    """Build and fill an index of the given spec from full-precision vectors
+
+    Args:
+        vectors: float32 array of shape (n, d)
+        spec: Index spec, see DEFAULT_SPECS
+
+    Returns:
+        faiss.Index: Trained index containing every vector, in order
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dim = vectors.shape
+    reduction, reduced_dim, codec, m = parse_spec(spec)
+
+    if reduction is None:
+        index = _codec_index(dim, codec, m, num_vectors)
+    else:
+        if reduced_dim >= dim:
+            raise ValueError(f"Reduced dimension {reduced_dim} must be below {dim}")
+        if reduction == 'pca' and reduced_dim > num_vectors:
+            raise ValueError(f"PCA to {reduced_dim} dims needs at least {reduced_dim} vectors, got {num_vectors}")
+        index = faiss.IndexPreTransform(_codec_index(reduced_dim, codec, m, num_vectors))
+        if reduction == 'mrl':
+            # Keep the leading dimensions and renormalize, as Matryoshka embeddings expect
+            index.prepend_transform(faiss.NormalizationTransform(reduced_dim))
+            keep = np.arange(reduced_dim, dtype=np.int32)
+            index.prepend_transform(faiss.RemapDimensionsTransform(dim, reduced_dim, faiss.swig_ptr(keep)))
+        else:
+            index.prepend_transform(faiss.PCAMatrix(dim, reduced_dim))
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def extract_vectors(index: faiss.Index) -> np.ndarray:
+    """Full-precision vectors stored in a flat index"""
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Serialized size of an index, which tracks its memory footprint"""
+    return len(faiss.serialize_index(index))
+
+
+def code_bytes_per_vector(index: faiss.Index) -> int:
+    """Bytes stored per vector, excluding fixed costs such as PCA matrices and codebooks"""
+    return index.sa_code_size()
+
+
+def recall_at_k(reference: faiss.Index, candidate: faiss.Index, queries: np.ndarray, k: int,
+                exclude_self: bool = False) -> float:
+    """Share of the reference top-k neighbours the candidate index also returns
+
+    Args:
+        reference: Full-precision index
+        candidate: Quantized or reduced index over the same vectors
+        queries: float32 query vectors
+        k: Neighbours compared per query
+        exclude_self: Queries are the indexed vectors themselves, so drop the
+            trivial self-match from both result lists
+
+    Returns:
+        float: Mean recall@k in [0, 1]
+    """
+    depth = k + 1 if exclude_self else k
+    _, expected = reference.search(queries, depth)
+    _, actual = candidate.search(queries, depth)
+    total = 0.0
+    for i, (want, got) in enumerate(zip(expected, actual)):
+        if exclude_self:
+            want = [j for j in want if j != i][:k]
+            got = [j for j in got if j != i][:k]
+        total += len(set(want) & set(got)) / k
+    return total / len(queries)
+
+
+def compare_index_specs(vectors: np.ndarray, specs: List[str], k: int = 5,
+                        queries: Optional[np.ndarray] = None) -> List[Dict]:
+    """Measure size, search latency and recall@k of each spec against float32
+
+    Args:
+        vectors: Full-precision corpus vectors
+        specs: Index specs to compare
+        k: Neighbours compared per query
+        queries: Query vectors; defaults to the corpus itself (leave-self-out)
+
+    Returns:
+        List[Dict]: One row per spec
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    exclude_self = queries is None
+    queries = vectors if queries is None else np.ascontiguousarray(queries, dtype=np.float32)
+    reference = build_index(vectors, 'flat')
+    reference_code_size = code_bytes_per_vector(reference)
+
+    rows = []
+    for spec in specs:
+        try:
+            start = time.perf_counter()
+            index = build_index(vectors, spec)
+            build_seconds = time.perf_counter() - start
+        except (ValueError, RuntimeError) as e:
+            logging.warning(f"Skipping {spec}: {e}")
+            continue
+        start = time.perf_counter()
+        index.search(queries, k)
+        search_seconds = time.perf_counter() - start
+        code_size = code_bytes_per_vector(index)
+        rows.append({
+            'spec': spec,
+            'bytes': index_memory_bytes(index),
+            'bytes_per_vector': code_size,
+            # Per-vector ratio, which is what the saving converges to on large corpora
+            'compression': reference_code_size / code_size,
+            f'recall@{k}': recall_at_k(reference, index, queries, k, exclude_self),
+            'build_s': build_seconds,
+            'search_ms_per_query': search_seconds * 1000 / len(queries),
+        })
+    return rows
+
+
+def apply_to_directory(embeddings_dir: str, spec: str) -> None:
+    """Re-encode index.faiss in place, keeping the float32 original alongside
+
+    The original is saved once as index.full.faiss and every later spec is
+    built from it, so specs can be switched without re-embedding. The spec
+    is recorded in index.spec, so ingest_docs.py can keep both in step.
+    Rebuilding the index with create_embeddingsT.py discards the saved
+    original.
+    """
+    index_path = os.path.join(embeddings_dir, 'index.faiss')
+    full_path = os.path.join(embeddings_dir, FULL_INDEX_FILE)
+    if not os.path.exists(full_path):
+        shutil.copyfile(index_path, full_path)
+    index = build_index(extract_vectors(faiss.read_index(full_path)), spec)
+    temp_path = f"{index_path}.tmp"
+    faiss.write_index(index, temp_path)
+    os.replace(temp_path, index_path)
+    with open(os.path.join(embeddings_dir, SPEC_FILE), 'w') as f:
+        f.write(spec)
+    logging.info(f"Wrote {spec} index to {index_path} ({index_memory_bytes(index)} bytes)")
+
+
+def applied_spec(embeddings_dir: str) -> Optional[str]:
+    """Spec index.faiss was last re-encoded with by apply_to_directory, if recorded"""
+    path = os.path.join(embeddings_dir, SPEC_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return f.read().strip() or None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Compare quantized/reduced FAISS indexes against float32")
+    parser.add_argument('--embeddings-dir', default='embeddings')
+    parser.add_argument('--specs', nargs='+', default=DEFAULT_SPECS)
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--apply', metavar='SPEC', help="re-encode the index in place with this spec")
+    args = parser.parse_args()
+
+    full_path = os.path.join(args.embeddings_dir, FULL_INDEX_FILE)
+    if not os.path.exists(full_path):
+        full_path = os.path.join(args.embeddings_dir, 'index.faiss')
+    corpus = extract_vectors(faiss.read_index(full_path))
+    rows = compare_index_specs(corpus, args.specs, args.k)
+    columns = list(rows[0]) if rows else []
+    print(' '.join(f'{column:>20}' for column in columns))
+    for row in rows:
+        print(' '.join(f'{value:>20.4f}' if isinstance(value, float) else f'{value:>20}' for value in row.values()))
+
+    if args.apply:
+        apply_to_directory(args.embeddings_dir, args.apply)
@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+import faiss
+from langchain_community.vectorstores import FAISS
+from rag_service import gemini_embeddings
+from config import ALLOWED_COMMANDS, DOCS_MANIFEST_FILE, RAG_INDEX_SPEC
+from index_quantization import FULL_INDEX_FILE, applied_spec, apply_to_directory
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RENDER_TIMEOUT = 10  # seconds per man page or --help call
+MAX_SECTION_CHARS = 1500
+
+# Man page section headings are upper-case lines starting at column 0
+SECTION_HEADING = re.compile(r'^[A-Z][A-Z0-9 ,/()-]*$')
+# Overstrike sequences used by nroff for bold and underline
+OVERSTRIKE = re.compile(r'.\x08')
+
+
+def render_command_docs(command: str) -> Optional[Dict[str, str]]:
+    """Render the man page of a command, falling back to its --help output
+
+    Only whitelisted commands are run with --help: many programs ignore the
+    flag, or treat it as a real argument, and would start, block or change
+    state. Runs in a worker process, so it must stay a module-level function.
+
+    Args:
+        command: Command name
+
+    Returns:
+        Optional[Dict[str, str]]: 'command', 'source' ('man' or 'help') and
+            'text', or None if no documentation is available
+    """
+    env = dict(os.environ, MANWIDTH='100', MANPAGER='cat', PAGER='cat', LC_ALL='C')
+    try:
+        result = subprocess.run(['man', '-P', 'cat', command], capture_output=True,
+                                text=True, env=env, timeout=RENDER_TIMEOUT)
+        if result.returncode == 0 and result.stdout.strip():
+            return {'command': command, 'source': 'man', 'text': OVERSTRIKE.sub('', result.stdout)}
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logging.debug(f"man {command} failed: {e}")
+
+    if command not in ALLOWED_COMMANDS or shutil.which(command) is None:
+        return None
+    try:
+        result = subprocess.run([command, '--help'], capture_output=True, text=True, env=env,
+                                stdin=subprocess.DEVNULL, timeout=RENDER_TIMEOUT)
+        text = result.stdout.strip() or result.stderr.strip()
+        if text:
+            return {'command': command, 'source': 'help', 'text': text}
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logging.debug(f"{command} --help failed: {e}")
+    return None
+
+
+def split_sections(page: Dict[str, str]) -> List[Dict]:
+    """Chunk a rendered page by man section, splitting long sections at blank lines
+
+    Args:
+        page: Result of render_command_docs
+
+    Returns:
+        List[Dict]: Chunks with 'text' and 'metadata'
+    """
+    sections = []
+    # Text before the first man heading is just the page title line
+    heading, lines = 'DESCRIPTION' if page['source'] == 'help' else None, []
+    for line in page['text'].splitlines():
+        if page['source'] == 'man' and SECTION_HEADING.match(line.rstrip()):
+            sections.append((heading, lines))
+            heading, lines = line.strip(), []
+        else:
+            lines.append(line.rstrip())
+    sections.append((heading, lines))
+
+    chunks = []
+    for heading, lines in sections:
+        body = textwrap.dedent('\n'.join(lines)).strip()
+        if heading is None or not body:
+            continue
+        pieces, current = [], ''
+        for paragraph in re.split(r'\n\s*\n', body):
+            if current and len(current) + len(paragraph) > MAX_SECTION_CHARS:
+                pieces.append(current)
+                current = ''
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        pieces.append(current)
+        for piece in pieces:
+            chunks.append({
+                'text': f"{page['command']} ({page['source']}) - {heading}:\n{piece}",
+                'metadata': {'command': page['command'], 'section': heading, 'source': page['source']},
+            })
+    return chunks
+
+
+def installed_commands() -> List[str]:
+    """Every executable name on PATH"""
+    commands = set()
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.access(path, os.X_OK) and not os.path.isdir(path):
+                commands.add(name)
+    return sorted(commands)
+
+
+def render_all(commands: List[str], workers: Optional[int] = None) -> List[Dict[str, str]]:
+    """Render documentation for many commands in parallel
+
+    Args:
+        commands: Command names
+        workers: Size of the process pool (defaults to the CPU count)
+
+    Returns:
+        List[Dict[str, str]]: Rendered pages for commands that have docs
+    """
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pages = [page for page in pool.map(render_command_docs, commands, chunksize=8) if page]
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"Rendered {len(pages)}/{len(commands)} pages in {elapsed:.2f}s "
+        f"({len(pages) / elapsed if elapsed else 0:.1f} pages/s)"
+    )
+    return pages
+
+
+def indexed_ids(embeddings_dir: str) -> set:
+    """Docstore ids of the saved index, read without loading the embedding model"""
+    path = os.path.join(embeddings_dir, 'index.pkl')
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'rb') as f:
+        _, index_to_docstore_id = pickle.load(f)
+    return set(index_to_docstore_id.values())
+
+
+def ingest(commands: List[str], embeddings_dir: str, workers: Optional[int] = None,
+           dry_run: bool = False) -> Dict[str, int]:
+    """Render, chunk and add command documentation to the index incrementally
+
+    Commands whose rendered text is unchanged since the last run, and whose
+    chunks are all still in the index, are skipped; changed ones have their
+    old chunks replaced.
+
+    Args:
+        commands: Command names to ingest
+        embeddings_dir: Directory holding the FAISS index
+        workers: Size of the render process pool
+        dry_run: Render and chunk only, without embedding or saving
+
+    Returns:
+        Dict[str, int]: Counts of rendered pages, added chunks and skipped pages
+    """
+    manifest_path = os.path.join(embeddings_dir, DOCS_MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+
+    pages = render_all(commands, workers)
+    # A rebuild of the index drops ingested pages; only trust the manifest for ids still present
+    present = indexed_ids(embeddings_dir)
+
+    new_chunks, stale_ids, skipped = [], [], 0
+    for page in pages:
+        digest = hashlib.sha256(page['text'].encode('utf-8')).hexdigest()
+        previous = manifest.get(page['command'])
+        if previous and previous['sha256'] == digest and present.issuperset(previous['ids']):
+            skipped += 1
+            continue
+        if previous:
+            stale_ids.extend(chunk_id for chunk_id in previous['ids'] if chunk_id in present)
+        chunks = split_sections(page)
+        ids = [f"doc:{page['command']}:{digest[:12]}:{i}" for i in range(len(chunks))]
+        for chunk, chunk_id in zip(chunks, ids):
+            chunk['id'] = chunk_id
+        new_chunks.extend(chunks)
+        manifest[page['command']] = {'sha256': digest, 'source': page['source'], 'ids': ids}
+
+    logging.info(f"{len(new_chunks)} new chunks, {len(stale_ids)} stale chunks, {skipped} unchanged pages")
+    stats = {'pages': len(pages), 'chunks': len(new_chunks), 'skipped': skipped}
+    if dry_run or not (new_chunks or stale_ids):
+        return stats
+
+    embedding_model = gemini_embeddings()
+    start = time.perf_counter()
+    full_path = os.path.join(embeddings_dir, FULL_INDEX_FILE)
+    reencode_spec = None
+    if os.path.exists(os.path.join(embeddings_dir, 'index.faiss')):
+        vectorstore = FAISS.load_local(embeddings_dir, embedding_model, allow_dangerous_deserialization=True)
+        if os.path.exists(full_path):
+            # index.faiss is quantized: update the float32 original and re-encode it afterwards,
+            # so a later --apply does not rebuild from a copy missing these changes
+            vectorstore.index = faiss.read_index(full_path)
+            if vectorstore.index.ntotal != len(vectorstore.index_to_docstore_id):
+                raise RuntimeError(
+                    f"{full_path} has {vectorstore.index.ntotal} vectors but the docstore has "
+                    f"{len(vectorstore.index_to_docstore_id)}; rebuild the index with create_embeddingsT.py"
+                )
+            reencode_spec = applied_spec(embeddings_dir) or RAG_INDEX_SPEC
+        if stale_ids:
+            vectorstore.delete(stale_ids)
+        if new_chunks:
+            vectorstore.add_texts(
+                [chunk['text'] for chunk in new_chunks],
+                metadatas=[chunk['metadata'] for chunk in new_chunks],
+                ids=[chunk['id'] for chunk in new_chunks],
+            )
+    else:
+        vectorstore = FAISS.from_texts(
+            [chunk['text'] for chunk in new_chunks],
+            embedding_model,
+            metadatas=[chunk['metadata'] for chunk in new_chunks],
+            ids=[chunk['id'] for chunk in new_chunks],
+        )
+    os.makedirs(embeddings_dir, exist_ok=True)
+    vectorstore.save_local(embeddings_dir)
+    if reencode_spec is not None:
+        shutil.copyfile(os.path.join(embeddings_dir, 'index.faiss'), full_path)
+        if reencode_spec != 'flat':
+            apply_to_directory(embeddings_dir, reencode_spec)
+    logging.info(f"Embedded and indexed {len(new_chunks)} chunks in {time.perf_counter() - start:.2f}s")
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest local man pages and --help output into the RAG index")
+    parser.add_argument('--embeddings-dir', default='embeddings')
+    parser.add_argument('--all', action='store_true', help="ingest the man pages of every command on PATH, not just the whitelist")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--dry-run', action='store_true', help="render and chunk without embedding (benchmark mode)")
+    args = parser.parse_args()
+
+    commands = installed_commands() if args.all else sorted(ALLOWED_COMMANDS)
+    ingest(commands, args.embeddings_dir, args.workers, args.dry_run)
@@ -0,0 +1,65 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Callable, Coroutine, Optional
+
+
+class AsyncRunner:
+    """Runs coroutines on one long-lived event loop in a background thread
+
+    Async LLM clients (gRPC channels, httpx pools) are bound to the loop
+    they were first used on, so every call goes through the same loop.
+    Synchronous callers block in run(), which keeps calling the poll and
+    idle hooks so a GUI thread can stay responsive while it waits.
+    """
+
+    def __init__(self, poll_interval: float = 0.02):
+        self.poll_interval = poll_interval
+        # Called while the main thread waits in run(), e.g. QApplication.processEvents
+        self.idle_hook: Optional[Callable[[], None]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The runner's event loop, started on first use"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='llm-event-loop', daemon=True).start()
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop from any thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, fn: Callable, *args) -> None:
+        """Run a plain callable on the loop thread"""
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def run(self, coro: Coroutine, poll: Optional[Callable[[], None]] = None) -> Any:
+        """Run a coroutine to completion and return its result
+
+        Args:
+            coro: Coroutine to run on the loop
+            poll: Called on the waiting thread between checks, e.g. to
+                deliver callbacks queued by the coroutine
+
+        Raises:
+            Whatever the coroutine raised; concurrent.futures.CancelledError
+            if it was cancelled
+        """
+        future = self.submit(coro)
+        on_main_thread = threading.current_thread() is threading.main_thread()
+        while True:
+            done, _ = concurrent.futures.wait([future], timeout=self.poll_interval)
+            if poll is not None:
+                poll()
+            if done:
+                return future.result()
+            if self.idle_hook is not None and on_main_thread:
+                self.idle_hook()
+
+
+# Shared by every LLM service
+runner = AsyncRunner()
@@ -1,48 +1,110 @@
 import json
 import logging
-import google.generativeai as genai
-from llms.llm_base import LLMBase
-from typing import Optional
+import httpx
+from llms.llm_base import LLMBase, SCRIPT_RESPONSE_SCHEMA
+from typing import AsyncIterator, Callable, Optional
+
+from config import GEMINI_BASE_URL, GEMINI_MODEL, LLM_JSON_MODE, LLM_KEEPALIVE_SECONDS, LLM_MAX_CONNECTIONS
+
+# Public Gemini API endpoint, used when GEMINI_BASE_URL is not set
+DEFAULT_GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+
+
+def gemini_schema(schema: dict) -> dict:
+    """Convert a JSON schema to the Gemini REST form (upper-case type names)"""
+    converted = {}
+    for key, value in schema.items():
+        if key == 'type':
+            converted[key] = value.upper()
+        elif key == 'properties':
+            converted[key] = {name: gemini_schema(prop) for name, prop in value.items()}
+        elif key == 'items':
+            converted[key] = gemini_schema(value)
+        else:
+            converted[key] = value
+    return converted
+
 
 class GeminiService(LLMBase):
-    def __init__(self, api_key: str):
+    """Gemini over the REST API
+
+    The SDK's async client only speaks gRPC, so requests go over a pooled
+    httpx client instead; that also lets GEMINI_BASE_URL point the service
+    at mock_llm_server.py.
+    """
+    name = 'gemini'
+    script_model = GEMINI_MODEL
+    interpret_model = GEMINI_MODEL
+    supports_json_stream = True
+
+    def __init__(self, api_key: str, base_url: Optional[str] = GEMINI_BASE_URL):
+        super().__init__()
         self.api_key = api_key
-        
+        self.base_url = (base_url or DEFAULT_GEMINI_BASE_URL).rstrip('/')
+        self.client = None
+
     def initialize(self):
-        genai.configure(api_key=self.api_key)
+        # One long-lived client; its connections stay open between requests
+        self.client = httpx.AsyncClient(
+            base_url=f"{self.base_url}/v1beta/models",
+            headers={'x-goog-api-key': self.api_key or ''},
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+            ),
+        )
+        self.json_config = {
+            'responseMimeType': 'application/json',
+            'responseSchema': gemini_schema(SCRIPT_RESPONSE_SCHEMA),
+        }
         logging.info("Gemini API initialized")
-    
-    def generate_bash_script(self, query: str, context: Optional[str] = None) -> tuple[str, str]:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Modify prompt to include context if available
-        from config import PROMPT_TEMPLATE
-        if context:
-            enhanced_prompt = f"""Context information:
-{context}
-
-Based on the above context and the following query and also use your knowledge, generate a bash script:
-{PROMPT_TEMPLATE.format(query=query)}"""
-        else:
-            enhanced_prompt = PROMPT_TEMPLATE.format(query=query)
-            
-        response = model.generate_content(enhanced_prompt)
-        
-        try:
-            jsondata = json.loads(response.text)
-            bash_script = jsondata.get('bash script')
-            description = jsondata.get('description')
-            return bash_script, description
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse Gemini response: {e}")
-            raise
-    
-    def interpret_output(self, original_query: str, command_output: str) -> str:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        from config import OUTPUT_INTERPRETATION_PROMPT
-        prompt = OUTPUT_INTERPRETATION_PROMPT.format(
-            query=original_query,
-            output=command_output
+
+    async def _aping(self):
+        # Token counting is free and goes over the same connection as generation
+        response = await self.client.post(
+            f'/{self.script_model}:countTokens', json={'contents': [{'parts': [{'text': 'ping'}]}]}
+        )
+        response.raise_for_status()
+
+    async def _astream_text(self, model: str, prompt: str,
+                            generation_config: Optional[dict] = None) -> AsyncIterator[str]:
+        """Yield the text of each streamed response chunk"""
+        body = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        if generation_config:
+            body['generationConfig'] = generation_config
+        url = f'/{model}:streamGenerateContent'
+        async with self.client.stream('POST', url, params={'alt': 'sse'}, json=body) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                # Chunks without text parts (e.g. safety or finish metadata) yield nothing
+                for candidate in json.loads(line[len('data:'):]).get('candidates', [])[:1]:
+                    for part in candidate.get('content', {}).get('parts', []):
+                        if part.get('text'):
+                            yield part['text']
+
+    def _astream_json(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        return self._astream_text(model or self.script_model, prompt, generation_config=self.json_config)
+
+    async def _agenerate_bash_script(self, query: str, context: Optional[str] = None,
+                                     on_script: Optional[Callable[[str], None]] = None) -> tuple[str, str]:
+        enhanced_prompt = self.script_prompt(query, context)
+
+        async def generate(model):
+            if LLM_JSON_MODE:
+                chunks = self._astream_json(enhanced_prompt, model)
+            else:
+                chunks = self._astream_text(model, enhanced_prompt)
+            return await self._collect_script_stream(chunks, on_script, model)
+        return await self._routed('generate', query, generate)
+
+    async def _ainterpret_output(self, original_query: str, command_output: str,
+                                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        prompt = self.interpret_prompt(original_query, command_output)
+        return await self._routed(
+            'interpret', command_output,
+            lambda model: self._collect_text_stream(self._astream_text(model, prompt), on_text)
         )
-        response = model.generate_content(prompt)
-        return response.text
\ No newline at end of file
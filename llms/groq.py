@@ -1,23 +1,67 @@
-import json
 import logging
-from groq import Groq
+import httpx
+from groq import AsyncGroq
 from llms.llm_base import LLMBase
-from typing import Optional
+from typing import AsyncIterator, Callable, Optional
+
+from config import (
+    GROQ_BASE_URL, GROQ_SCRIPT_MODEL, GROQ_INTERPRET_MODEL, LLM_JSON_MODE, LLM_KEEPALIVE_SECONDS, LLM_MAX_CONNECTIONS,
+    PROMPT_TEMPLATE
+)
 
 class GroqService(LLMBase):
-    def __init__(self, api_key: str):
+    name = 'groq'
+    script_model = GROQ_SCRIPT_MODEL
+    interpret_model = GROQ_INTERPRET_MODEL
+    supports_json_stream = True
+
+    def __init__(self, api_key: str, base_url: Optional[str] = GROQ_BASE_URL):
+        super().__init__()
         self.api_key = api_key
+        # None uses the SDK's default endpoint
+        self.base_url = base_url
         self.client = None
         
     def initialize(self):
-        self.client = Groq(api_key=self.api_key)
+        # Keep connections to the API pooled and alive between commands
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+            )
+        )
+        # Retries are left to resilience.py, which shares a budget across providers
+        self.client = AsyncGroq(api_key=self.api_key, base_url=self.base_url, http_client=http_client, max_retries=0)
         logging.info("Groq API initialized")
+
+    async def _aping(self):
+        # Listing models is free and completes the TLS handshake
+        await self.client.models.list()
     
-    def generate_bash_script(self, query: str, context: Optional[str] = None) -> tuple[str, str]:
-        # Modify prompt to include context if available
-        from config import PROMPT_TEMPLATE
+    async def _astream_text(self, model: str, prompt: str) -> AsyncIterator[str]:
+        """Yield the content deltas of a streamed chat completion"""
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def _astream_json(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        # Groq's JSON mode does not stream, so the script arrives in one piece
+        completion = await self.client.chat.completions.create(
+            model=model or self.script_model,
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"}
+        )
+        yield completion.choices[0].message.content
+
+    def script_prompt(self, query: str, context: Optional[str] = None) -> str:
         if context:
-            enhanced_prompt = f"""
+            return f"""
                 Context information:
                 {context}
 
@@ -38,37 +82,25 @@ class GroqService(LLMBase):
                 The query is:
                 {PROMPT_TEMPLATE.format(query=query)}
             """
+        return PROMPT_TEMPLATE.format(query=query)
 
-        else:
-            enhanced_prompt = PROMPT_TEMPLATE.format(query=query)
-        
-        # Using Mixtral model from Groq
-        completion = self.client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": enhanced_prompt}]
-        )
+    async def _agenerate_bash_script(self, query: str, context: Optional[str] = None,
+                                     on_script: Optional[Callable[[str], None]] = None) -> tuple[str, str]:
+        enhanced_prompt = self.script_prompt(query, context)
 
-        logging.debug(f"Groq response: {completion.choices[0].message.content}")
-        
-        try:
-            jsondata = json.loads(completion.choices[0].message.content, strict=False)
-            bash_script = jsondata.get('bash script')
-            description = jsondata.get('description')
-            return bash_script, description
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse Groq response: {e}")
-            raise
+        async def generate(model):
+            if LLM_JSON_MODE:
+                chunks = self._astream_json(enhanced_prompt, model)
+            else:
+                chunks = self._astream_text(model, enhanced_prompt)
+            return await self._collect_script_stream(chunks, on_script, model)
+        return await self._routed('generate', query, generate)
     
-    def interpret_output(self, original_query: str, command_output: str) -> str:
-        from config import OUTPUT_INTERPRETATION_PROMPT
-        prompt = OUTPUT_INTERPRETATION_PROMPT.format(
-            query=original_query,
-            output=command_output
-        )
-        
-        completion = self.client.chat.completions.create(
-            model="mixtral-8x7b-32768",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return completion.choices[0].message.content
\ No newline at end of file
+    async def _ainterpret_output(self, original_query: str, command_output: str,
+                                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        prompt = self.interpret_prompt(original_query, command_output)
+
+        return await self._routed(
+            'interpret', command_output,
+            lambda model: self._collect_text_stream(self._astream_text(model, prompt), on_text)
+        )
\ No newline at end of file
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import HEDGE_DELAY_SECONDS, HEDGE_MIN_SAMPLES, HEDGE_PERCENTILE
+from llms.llm_base import LLMBase
+from metrics import metrics, percentile
+
+
+class HedgedLLM(LLMBase):
+    """Sends each call to a primary provider and hedges to a secondary one
+
+    If the primary has not answered within its observed latency percentile
+    the same call is sent to the secondary. The first valid result wins and
+    the other call is cancelled. A primary that fails outright is failed
+    over to the secondary at once.
+    """
+
+    def __init__(self, primary: LLMBase, secondary: LLMBase,
+                 hedge_percentile: float = HEDGE_PERCENTILE, name: str = 'hedged'):
+        """Initialize the pair
+
+        Args:
+            primary: Provider every call goes to first
+            secondary: Provider hedge requests go to
+            hedge_percentile: Percentile of the primary's latency to wait before hedging
+            name: Used in log messages and metric names
+        """
+        super().__init__()
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_percentile = hedge_percentile
+        self.name = name
+
+    def initialize(self):
+        self.primary.initialize()
+        self.secondary.initialize()
+        logging.info(f"Hedging {self.primary.name} with {self.secondary.name}")
+
+    async def _aping(self):
+        await asyncio.gather(self.primary._aping(), self.secondary._aping(), return_exceptions=True)
+
+    def route(self, kind: str, text: str) -> Dict[str, str]:
+        return {**self.primary.route(kind, text), **self.secondary.route(kind, text)}
+
+    def hedge_delay(self, kind: str) -> float:
+        """Seconds to wait on the primary before hedging a 'generate' or 'interpret' call
+
+        Primary calls cancelled because the hedge won are counted at the time
+        they were cancelled, so hedging does not hide the primary's slow tail.
+        """
+        values = metrics.values(f'llm.{self.name}.{kind}_primary_seconds')
+        if len(values) < HEDGE_MIN_SAMPLES:
+            values = metrics.values(f'llm.{self.primary.name}.{kind}_seconds')
+        if len(values) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DELAY_SECONDS
+        return percentile(values, self.hedge_percentile)
+
+    async def _race(self, kind: str, make_call: Callable[[LLMBase], Awaitable],
+                    is_valid: Callable[[object], bool] = lambda result: True):
+        """Run make_call on the primary, hedging to the secondary, and return the first valid result"""
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(make_call(self.primary))
+
+        def record_primary(task):
+            if task.cancelled() or task.exception() is None:
+                metrics.observe(f'llm.{self.name}.{kind}_primary_seconds', time.perf_counter() - start)
+        primary.add_done_callback(record_primary)
+
+        tasks = {primary: self.primary}
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(kind))
+        if not done or not self._succeeded(next(iter(done)), is_valid):
+            metrics.incr(f'llm.{self.name}.{kind}_hedge_sent')
+            tasks[asyncio.ensure_future(make_call(self.secondary))] = self.secondary
+
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if self._succeeded(task, is_valid):
+                        role = 'primary' if tasks[task] is self.primary else 'secondary'
+                        metrics.incr(f'llm.{self.name}.{kind}_{role}_won')
+                        metrics.observe(f'llm.{self.name}.{kind}_seconds', time.perf_counter() - start)
+                        return task.result()
+                    if not task.cancelled():
+                        error = task.exception() or ValueError(f"{tasks[task].name} returned no result")
+                        logging.warning(f"{tasks[task].name} {kind} call failed: {error}")
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise error or asyncio.CancelledError()
+
+    @staticmethod
+    def _succeeded(task: asyncio.Future, is_valid: Callable[[object], bool]) -> bool:
+        return task.done() and not task.cancelled() and task.exception() is None and is_valid(task.result())
+
+    async def _agenerate_bash_script(self, query: str, context: Optional[str] = None,
+                                     on_script: Optional[Callable[[str], None]] = None) -> tuple[str, str]:
+        forwarded = []
+
+        def relay(script):
+            # Hand over whichever provider's script closes first
+            if on_script is not None and not forwarded:
+                forwarded.append(script)
+                on_script(script)
+
+        return await self._race(
+            'generate',
+            lambda llm: llm.agenerate_bash_script(query, context, relay, timeout=None),
+            lambda result: bool(result[0]),
+        )
+
+    async def _ainterpret_output(self, original_query: str, command_output: str,
+                                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        # The first provider to produce text owns the stream; the other is cancelled
+        owner = []
+        calls = {}
+
+        def relay(llm):
+            def forward(text):
+                if not owner:
+                    owner.append(llm)
+                    for other, task in calls.items():
+                        if other is not llm:
+                            task.cancel()
+                if owner[0] is llm and on_text is not None:
+                    on_text(text)
+            return forward
+
+        def make_call(llm):
+            calls[llm] = asyncio.ensure_future(
+                llm.ainterpret_output(original_query, command_output, relay(llm), timeout=None)
+            )
+            return calls[llm]
+
+        return await self._race('interpret', make_call)
+
+    def hedge_stats(self) -> dict:
+        """How often each call kind was hedged and which provider won"""
+        return {
+            kind: {
+                outcome: metrics.counter(f'llm.{self.name}.{kind}_{outcome}')
+                for outcome in ('hedge_sent', 'primary_won', 'secondary_won')
+            }
+            for kind in ('generate', 'interpret')
+        }
+
+    def latency_stats(self) -> dict:
+        return {llm.name: llm.latency_stats() for llm in (self.primary, self.secondary)}
+
+    def parse_stats(self) -> dict:
+        return {llm.name: llm.parse_stats() for llm in (self.primary, self.secondary)}
@@ -0,0 +1,86 @@
+import json
+import re
+from typing import Optional
+
+FENCE_PATTERN = re.compile(r"```[a-zA-Z]*\s*(.*?)```", re.DOTALL)
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+VALID_ESCAPES = set('"\\/bfnrtu')
+
+
+def first_balanced_object(text: str) -> Optional[str]:
+    """Return the first complete {...} object in text, respecting strings"""
+    start = text.find('{')
+    while start != -1:
+        depth, in_string, escape = 0, False, False
+        for i in range(start, len(text)):
+            char = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == '\\':
+                    escape = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        start = text.find('{', start + 1)
+    return None
+
+
+def relax_escapes(text: str) -> str:
+    """Double backslashes that do not start a valid JSON escape, e.g. '\\$' or '\\.'"""
+    out = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            if i + 1 < len(text) and text[i + 1] in VALID_ESCAPES:
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            out.append('\\\\')
+        else:
+            out.append(char)
+        i += 1
+    return ''.join(out)
+
+
+def extract_json_object(text: str) -> dict:
+    """Parse the JSON object in an LLM response, tolerating common deviations
+
+    Tries, in order: the text as-is, the contents of a code fence, and the
+    first balanced object; each candidate is parsed strictly and then with
+    invalid escapes and trailing commas fixed.
+
+    Args:
+        text: Raw completion text
+
+    Returns:
+        dict: Parsed object
+
+    Raises:
+        ValueError: If no JSON object can be recovered
+    """
+    candidates = [text.strip()]
+    fence = FENCE_PATTERN.search(text)
+    if fence:
+        candidates.append(fence.group(1).strip())
+    balanced = first_balanced_object(text)
+    if balanced:
+        candidates.append(balanced)
+
+    for candidate in candidates:
+        for attempt in (candidate, TRAILING_COMMA_PATTERN.sub(r'\1', relax_escapes(candidate))):
+            try:
+                data = json.loads(attempt, strict=False)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(data, dict):
+                return data
+    raise ValueError("No JSON object found in response")
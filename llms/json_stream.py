@@ -0,0 +1,89 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+
+class JsonFieldStream:
+    """Incrementally extracts top-level string fields from a streamed JSON object
+
+    Feed the completion text as it arrives; every top-level "key": "string"
+    pair is returned as soon as its closing quote has been received, long
+    before the object itself is complete. Text before the first '{' (such as
+    a code fence) is ignored.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._buffer: List[str] = []
+        self._key: Optional[str] = None
+        # What the next top-level string is: 'key' or 'value'
+        self._expect = 'key'
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Consume more text
+
+        Args:
+            chunk: Next piece of the streamed completion
+
+        Returns:
+            List[Tuple[str, str]]: (key, value) string fields completed by this chunk
+        """
+        completed = []
+        for char in chunk:
+            if not self._started:
+                if char == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        field = self._close_string()
+                        if field is not None:
+                            completed.append(field)
+                    continue
+                if self._depth == 1:
+                    self._buffer.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._buffer = []
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+            elif char == ':' and self._depth == 1:
+                self._expect = 'value'
+            elif char == ',' and self._depth == 1:
+                self._expect = 'key'
+                self._key = None
+        return completed
+
+    @property
+    def complete(self) -> bool:
+        """Whether the closing brace of the object has been seen"""
+        return self._started and self._depth == 0
+
+    def _close_string(self) -> Optional[Tuple[str, str]]:
+        raw = ''.join(self._buffer)
+        try:
+            text = json.loads(f'"{raw}"', strict=False)
+        except json.JSONDecodeError:
+            text = raw
+        if self._expect == 'key':
+            self._key = text
+            return None
+        if self._key is None:
+            return None
+        self.fields[self._key] = text
+        return self._key, text
@@ -1,21 +1,390 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from config import (
+    MODEL_ROUTING, LLM_KEEPALIVE_SECONDS, LLM_GENERATE_TIMEOUT_SECONDS, LLM_INTERPRET_TIMEOUT_SECONDS, JSON_REPAIR_PROMPT,
+    PROMPT_TEMPLATE, OUTPUT_INTERPRETATION_PROMPT
+)
+from llms.async_runner import runner
+from llms.json_extract import extract_json_object
+from llms.json_stream import JsonFieldStream
+from llms.router import model_router
+from metrics import metrics
+
+# Called once when a provider's stream yields its first chunk; set by
+# ResilientLLM to time the first chunk of an attempt rather than the whole call
+first_chunk_hook: contextvars.ContextVar[Optional[Callable[[], None]]] = contextvars.ContextVar(
+    'first_chunk_hook', default=None
+)
+
+
+# Models picked ahead of a call, by provider name; set by RecordingLLM so
+# providers use the model their recording is keyed on
+pinned_models: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar(
+    'pinned_models', default=None
+)
+
+
+def _notify_first_chunk() -> None:
+    hook = first_chunk_hook.get()
+    if hook is not None:
+        hook()
+
+
+# Response schema for generate_bash_script
+SCRIPT_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'bash script': {'type': 'string'},
+        'description': {'type': 'string'},
+    },
+    'required': ['bash script', 'description'],
+}
 
 class LLMBase(ABC):
-    """Base class for LLM services"""
-    
+    """Base class for LLM services
+
+    Providers implement the async methods; agenerate_bash_script and
+    ainterpret_output add deadlines and cancellation on top, and the
+    synchronous generate_bash_script and interpret_output run them on the
+    shared event loop for existing callers.
+    """
+
+    # Used in log messages and metric names
+    name = 'llm'
+    # Default models for each call kind; with MODEL_ROUTING the router may
+    # pick another model from MODEL_ROUTES (see route())
+    script_model = ''
+    interpret_model = ''
+    # Whether _astream_json is implemented; unparseable script responses
+    # are only sent back for repair by providers that set it
+    supports_json_stream = False
+
+    def __init__(self):
+        # Monotonic time the provider connection was last used
+        self._last_used: Optional[float] = None
+        # In-flight calls; only touched on the event loop thread
+        self._tasks: set = set()
+
     @abstractmethod
     def initialize(self):
         """Initialize the LLM service with API key"""
         pass
-    
+
     @abstractmethod
-    def generate_bash_script(self, query: str, context: Optional[str] = None) -> tuple[str, str]:
+    async def _agenerate_bash_script(self, query: str, context: Optional[str] = None,
+                                     on_script: Optional[Callable[[str], None]] = None) -> tuple[str, str]:
         """Generate bash script from query
+        on_script is called with the script as soon as it has streamed in,
+        before the description is complete
         Returns: tuple(bash_script, description)"""
         pass
-    
+
     @abstractmethod
-    def interpret_output(self, original_query: str, command_output: str) -> str:
-        """Interpret command output in natural language"""
-        pass
\ No newline at end of file
+    async def _ainterpret_output(self, original_query: str, command_output: str,
+                                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Interpret command output in natural language
+        on_text is called with each piece of the response as it streams in"""
+        pass
+
+    def script_prompt(self, query: str, context: Optional[str] = None) -> str:
+        """Prompt sent to generate a script, with retrieved context if available"""
+        if context:
+            return f"""Context information:
+{context}
+
+Based on the above context and the following query and also use your knowledge, generate a bash script:
+{PROMPT_TEMPLATE.format(query=query)}"""
+        return PROMPT_TEMPLATE.format(query=query)
+
+    def interpret_prompt(self, original_query: str, command_output: str) -> str:
+        """Prompt sent to interpret a command's output"""
+        return OUTPUT_INTERPRETATION_PROMPT.format(
+            query=original_query,
+            output=command_output
+        )
+
+    def _astream_json(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream a completion constrained to SCRIPT_RESPONSE_SCHEMA
+
+        Only called when supports_json_stream is set, by providers that
+        override it. model defaults to script_model.
+        """
+        raise NotImplementedError(f"{self.name} does not stream JSON completions")
+
+    async def _aping(self):
+        """Make the cheapest possible request to open the provider connection"""
+        pass
+
+    async def agenerate_bash_script(self, query: str, context: Optional[str] = None,
+                                    on_script: Optional[Callable[[str], None]] = None,
+                                    timeout: Optional[float] = LLM_GENERATE_TIMEOUT_SECONDS) -> tuple[str, str]:
+        """Generate bash script from query within a deadline
+
+        Raises:
+            TimeoutError: If the provider did not finish within timeout seconds
+            asyncio.CancelledError: If the call was cancelled
+        """
+        return await self._with_deadline(
+            self._agenerate_bash_script(query, context, on_script), timeout, 'generate'
+        )
+
+    async def ainterpret_output(self, original_query: str, command_output: str,
+                                on_text: Optional[Callable[[str], None]] = None,
+                                timeout: Optional[float] = LLM_INTERPRET_TIMEOUT_SECONDS) -> str:
+        """Interpret command output within a deadline
+
+        Raises:
+            TimeoutError: If the provider did not finish within timeout seconds
+            asyncio.CancelledError: If the call was cancelled
+        """
+        return await self._with_deadline(
+            self._ainterpret_output(original_query, command_output, on_text), timeout, 'interpret'
+        )
+
+    def generate_bash_script(self, query: str, context: Optional[str] = None,
+                             on_script: Optional[Callable[[str], None]] = None,
+                             timeout: Optional[float] = LLM_GENERATE_TIMEOUT_SECONDS) -> tuple[str, str]:
+        """Synchronous agenerate_bash_script; on_script runs on the calling thread"""
+        return self._run_sync(
+            lambda callback: self.agenerate_bash_script(query, context, callback, timeout), on_script
+        )
+
+    def interpret_output(self, original_query: str, command_output: str,
+                         on_text: Optional[Callable[[str], None]] = None,
+                         timeout: Optional[float] = LLM_INTERPRET_TIMEOUT_SECONDS) -> str:
+        """Synchronous ainterpret_output; on_text runs on the calling thread"""
+        return self._run_sync(
+            lambda callback: self.ainterpret_output(original_query, command_output, callback, timeout), on_text
+        )
+
+    def _run_sync(self, make_call: Callable[[Optional[Callable[[str], None]]], Awaitable],
+                  callback: Optional[Callable[[str], None]]):
+        """Run an async call on the shared loop, relaying its callbacks to this thread"""
+        if callback is None:
+            return runner.run(make_call(None))
+        pending = queue.SimpleQueue()
+
+        def deliver():
+            while True:
+                try:
+                    value = pending.get_nowait()
+                except queue.Empty:
+                    return
+                callback(value)
+
+        return runner.run(make_call(pending.put), poll=deliver)
+
+    async def _with_deadline(self, call: Awaitable, timeout: Optional[float], kind: str):
+        """Await a provider call, enforcing its deadline and tracking it for cancel()"""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            return await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            metrics.incr(f'llm.{self.name}.{kind}_timeout')
+            logging.error(f"{self.name} {kind} call timed out after {timeout}s")
+            raise TimeoutError(f"{self.name} did not respond within {timeout} seconds") from None
+        except asyncio.CancelledError:
+            metrics.incr(f'llm.{self.name}.{kind}_cancelled')
+            logging.info(f"{self.name} {kind} call cancelled")
+            raise
+        finally:
+            self._tasks.discard(task)
+
+    def cancel(self):
+        """Cancel every in-flight call on this service, e.g. when a new command starts"""
+        def cancel_all():
+            for task in list(self._tasks):
+                task.cancel()
+        runner.call_soon(cancel_all)
+
+    def warm_up(self):
+        """Open the connection ahead of the first request
+
+        Meant to run on a background thread when listening starts, so the
+        TCP and TLS handshakes overlap with the user speaking.
+        """
+        if self._connection_state() == 'warm':
+            return
+        start = time.perf_counter()
+        try:
+            runner.run(self._aping())
+        except Exception as e:
+            logging.warning(f"{self.name} warm-up failed: {e}")
+            return
+        metrics.observe(f'llm.{self.name}.warmup_seconds', time.perf_counter() - start)
+        self._last_used = time.monotonic()
+        logging.debug(f"{self.name} connection warmed up")
+
+    def _connection_state(self) -> str:
+        """'warm' if a pooled connection should still be open, else 'cold'"""
+        if self._last_used is None or time.monotonic() - self._last_used > LLM_KEEPALIVE_SECONDS:
+            return 'cold'
+        return 'warm'
+
+    def _record_request(self, state: str, seconds: float):
+        """Record a request's latency under its connection state"""
+        metrics.observe(f'llm.{self.name}.request_{state}_seconds', seconds)
+        self._last_used = time.monotonic()
+
+    def call_stats(self) -> dict:
+        """Timeout and cancellation counts per call kind"""
+        return {
+            f'{kind}_{outcome}': metrics.counter(f'llm.{self.name}.{kind}_{outcome}')
+            for kind in ('generate', 'interpret') for outcome in ('timeout', 'cancelled')
+        }
+
+    def latency_stats(self) -> dict:
+        """Cold and warm request latency summaries for this provider"""
+        return {
+            state: metrics.summary(f'llm.{self.name}.request_{state}_seconds')
+            for state in ('cold', 'warm')
+        }
+
+    def route(self, kind: str, text: str) -> Dict[str, str]:
+        """Models the providers behind this service would use for a call
+
+        Wrappers around several providers return one entry per provider.
+
+        Args:
+            kind: 'generate' or 'interpret'
+            text: The query or command output, used to judge how simple the call is
+
+        Returns:
+            Dict[str, str]: Provider name -> model
+        """
+        default = self.script_model if kind == 'generate' else self.interpret_model
+        if not MODEL_ROUTING:
+            return {self.name: default}
+        return {self.name: model_router.choose(self.name, kind, text, default)}
+
+    async def _routed(self, kind: str, text: str, call: Callable[[str], Awaitable]):
+        """Run call(model) with the model the router picks, recording how it went
+
+        A model pinned for this provider (see pinned_models) is used as is.
+
+        Args:
+            kind: 'generate' or 'interpret'
+            text: The query or command output, used to judge how simple the call is
+            call: Makes the provider call with the given model
+        """
+        model = (pinned_models.get() or {}).get(self.name)
+        if model is None:
+            if not MODEL_ROUTING:
+                return await call(self.script_model if kind == 'generate' else self.interpret_model)
+            model = self.route(kind, text)[self.name]
+        start = time.perf_counter()
+        try:
+            result = await call(model)
+        except BaseException:
+            # Includes cancellation, so a model that keeps timing out is avoided
+            model_router.record(self.name, model, kind, None)
+            raise
+        model_router.record(self.name, model, kind, time.perf_counter() - start)
+        return result
+
+    async def _collect_script_stream(self, chunks: AsyncIterable[str],
+                                     on_script: Optional[Callable[[str], None]] = None,
+                                     model: Optional[str] = None) -> tuple[str, str]:
+        """Read a streamed script completion, handing the script over as soon as it closes
+
+        Records the time to the first useful byte (the complete script).
+        A response that cannot be parsed is repaired with the same model.
+        """
+        state = self._connection_state()
+        start = time.perf_counter()
+        parser = JsonFieldStream()
+        pieces = []
+        script_seen = False
+        async for chunk in chunks:
+            if chunk and not pieces:
+                _notify_first_chunk()
+            pieces.append(chunk)
+            for key, value in parser.feed(chunk):
+                if key == 'bash script' and not script_seen:
+                    script_seen = True
+                    metrics.observe(f'llm.{self.name}.generate_ttfb_seconds', time.perf_counter() - start)
+                    if on_script is not None:
+                        on_script(value)
+        metrics.observe(f'llm.{self.name}.generate_seconds', time.perf_counter() - start)
+        self._record_request(state, time.perf_counter() - start)
+
+        text = ''.join(pieces)
+        logging.debug(f"{self.name} response: {text}")
+        jsondata = await self._parse_script_response(text, parser, model)
+        return jsondata.get('bash script'), jsondata.get('description')
+
+    async def _parse_script_response(self, text: str, parser: JsonFieldStream,
+                                     model: Optional[str] = None) -> dict:
+        """Parse a script response, falling back to one repair request
+
+        Raises:
+            ValueError: If the response cannot be parsed even after repair
+        """
+        try:
+            jsondata = extract_json_object(text)
+        except ValueError as e:
+            error = e
+        else:
+            if 'bash script' in jsondata:
+                metrics.incr(f'llm.{self.name}.parse_ok')
+                return jsondata
+            error = ValueError("response has no 'bash script' key")
+
+        if 'bash script' in parser.fields:
+            metrics.incr(f'llm.{self.name}.parse_ok')
+            return parser.fields
+
+        metrics.incr(f'llm.{self.name}.parse_failure')
+        if not self.supports_json_stream:
+            logging.error(f"Failed to parse {self.name} response: {error}")
+            raise ValueError(f"Could not parse {self.name} response: {error}")
+        logging.warning(f"Failed to parse {self.name} response ({error}), requesting a repair")
+        prompt = JSON_REPAIR_PROMPT.format(error=error, response=text)
+        try:
+            jsondata = extract_json_object(''.join([chunk async for chunk in self._astream_json(prompt, model)]))
+            if 'bash script' not in jsondata:
+                raise ValueError("repaired response has no 'bash script' key")
+        except ValueError as e:
+            metrics.incr(f'llm.{self.name}.repair_failure')
+            logging.error(f"Failed to parse {self.name} response after repair: {e}")
+            raise ValueError(f"Could not parse {self.name} response: {error}") from e
+        metrics.incr(f'llm.{self.name}.repair_success')
+        return jsondata
+
+    def parse_stats(self) -> dict:
+        """Share of script responses that failed to parse and how repairs went"""
+        ok = metrics.counter(f'llm.{self.name}.parse_ok')
+        failures = metrics.counter(f'llm.{self.name}.parse_failure')
+        repaired = metrics.counter(f'llm.{self.name}.repair_success')
+        total = ok + failures
+        return {
+            'responses': total,
+            'parse_failure_rate': failures / total if total else 0.0,
+            'repair_success_rate': repaired / failures if failures else 0.0,
+        }
+
+    async def _collect_text_stream(self, chunks: AsyncIterable[str],
+                                   on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Read a streamed text completion, forwarding each piece as it arrives"""
+        state = self._connection_state()
+        start = time.perf_counter()
+        pieces = []
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if not pieces:
+                _notify_first_chunk()
+                metrics.observe(f'llm.{self.name}.interpret_ttfb_seconds', time.perf_counter() - start)
+            pieces.append(chunk)
+            if on_text is not None:
+                on_text(chunk)
+        metrics.observe(f'llm.{self.name}.interpret_seconds', time.perf_counter() - start)
+        self._record_request(state, time.perf_counter() - start)
+        return ''.join(pieces)
@@ -0,0 +1,87 @@
+import json
+import logging
+import httpx
+from llms.llm_base import LLMBase
+from typing import AsyncIterator, Callable, Optional
+
+from config import (
+    LOCAL_LLM_BASE_URL, LOCAL_LLM_API_KEY, LOCAL_LLM_SCRIPT_MODEL, LOCAL_LLM_INTERPRET_MODEL,
+    LLM_JSON_MODE, LLM_KEEPALIVE_SECONDS, LLM_MAX_CONNECTIONS
+)
+
+class LocalOpenAIService(LLMBase):
+    """LLM service for a local OpenAI-compatible server (llama.cpp, Ollama, vLLM, ...)
+
+    Talks to /chat/completions directly over a pooled HTTP client and reads
+    the server-sent event stream, so no vendor SDK is needed.
+    """
+    name = 'local'
+    supports_json_stream = True
+
+    def __init__(self, base_url: str = LOCAL_LLM_BASE_URL, api_key: Optional[str] = LOCAL_LLM_API_KEY,
+                 script_model: str = LOCAL_LLM_SCRIPT_MODEL, interpret_model: str = LOCAL_LLM_INTERPRET_MODEL):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.script_model = script_model
+        self.interpret_model = interpret_model
+        self.client = None
+
+    def initialize(self):
+        headers = {'Authorization': f'Bearer {self.api_key}'} if self.api_key else {}
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=headers,
+            # Local models can take a while to load on the first request
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+            ),
+        )
+        logging.info(f"Local LLM endpoint {self.base_url} initialized")
+
+    async def _aping(self):
+        response = await self.client.get('/models')
+        response.raise_for_status()
+
+    async def _astream_chat(self, model: str, prompt: str, json_mode: bool = False) -> AsyncIterator[str]:
+        """Yield the content deltas of a streamed chat completion"""
+        body = {
+            'model': model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'stream': True,
+        }
+        if json_mode:
+            body['response_format'] = {'type': 'json_object'}
+        async with self.client.stream('POST', '/chat/completions', json=body) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                choices = json.loads(data).get('choices') or [{}]
+                content = choices[0].get('delta', {}).get('content')
+                if content:
+                    yield content
+
+    def _astream_json(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        return self._astream_chat(model or self.script_model, prompt, json_mode=True)
+
+    async def _agenerate_bash_script(self, query: str, context: Optional[str] = None,
+                                     on_script: Optional[Callable[[str], None]] = None) -> tuple[str, str]:
+        enhanced_prompt = self.script_prompt(query, context)
+        return await self._routed('generate', query, lambda model: self._collect_script_stream(
+            self._astream_chat(model, enhanced_prompt, json_mode=LLM_JSON_MODE), on_script, model
+        ))
+
+    async def _ainterpret_output(self, original_query: str, command_output: str,
+                                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        prompt = self.interpret_prompt(original_query, command_output)
+        return await self._routed(
+            'interpret', command_output,
+            lambda model: self._collect_text_stream(self._astream_chat(model, prompt), on_text)
+        )
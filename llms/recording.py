@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+from llms.llm_base import LLMBase, pinned_models
+from metrics import metrics
+
+RECORDING_MODES = ('record', 'replay', 'passthrough')
+
+
+class RecordingLLM(LLMBase):
+    """Record/replay cache around another LLM service
+
+    Responses are stored in a JSON file keyed by provider, model and a hash
+    of the exact prompt. The model is routed before the lookup and pinned
+    for the wrapped call, so a response is recorded under the model that
+    produced it; replay is only deterministic with MODEL_ROUTING off or
+    once the router's choices have settled. In 'record' mode recorded responses are served and
+    misses go to the wrapped service and are stored; in 'replay' mode only
+    recorded responses are served, so runs are free and deterministic; in
+    'passthrough' mode every call goes to the wrapped service.
+    """
+
+    def __init__(self, inner: LLMBase, path: str, mode: str = 'replay'):
+        """Initialize and load any recorded responses
+
+        Args:
+            inner: Service to record from
+            path: JSON file holding the recorded responses
+            mode: 'record', 'replay' or 'passthrough'
+        """
+        if mode not in RECORDING_MODES:
+            raise ValueError(f"Unsupported mode: {mode}")
+        super().__init__()
+        self.inner = inner
+        self.path = path
+        self.mode = mode
+        self.name = f'recorded-{inner.name}'
+        self.script_model = inner.script_model
+        self.interpret_model = inner.interpret_model
+        self.responses = {}
+        self._lock = threading.Lock()
+        if mode != 'passthrough' and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.responses = json.load(f)
+            logging.info(f"Loaded {len(self.responses)} recorded LLM responses from {path}")
+
+    def initialize(self):
+        # Replay never reaches the provider, so it needs no credentials
+        if self.mode != 'replay':
+            self.inner.initialize()
+
+    async def _aping(self):
+        if self.mode != 'replay':
+            await self.inner._aping()
+
+    def cache_key(self, model: str, prompt: str) -> str:
+        """Key for a (provider, model, prompt) triple"""
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return f"{self.inner.name}:{model}:{digest}"
+
+    @staticmethod
+    def model_label(models: Dict[str, str]) -> str:
+        """Model part of a cache key for the models route() picked
+
+        A single provider's model is used as is, so keys recorded before
+        routing still match; several providers are listed by name.
+        """
+        if len(models) == 1:
+            return next(iter(models.values()))
+        return ','.join(f'{provider}={model}' for provider, model in sorted(models.items()))
+
+    def save(self) -> None:
+        """Write recorded responses to disk atomically"""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.responses, f, indent=1)
+        os.replace(temp_path, self.path)
+
+    def _lookup(self, key: str):
+        if self.mode == 'passthrough':
+            return None
+        with self._lock:
+            response = self.responses.get(key)
+        metrics.incr(f'llm.{self.name}.{"hit" if response is not None else "miss"}')
+        if response is None and self.mode == 'replay':
+            raise KeyError(f"No recorded LLM response for {key}")
+        return response
+
+    def _store(self, key: str, response) -> None:
+        if self.mode != 'record':
+            return
+        with self._lock:
+            self.responses[key] = response
+            self.save()
+
+    async def _agenerate_bash_script(self, query: str, context: Optional[str] = None,
+                                     on_script: Optional[Callable[[str], None]] = None) -> tuple[str, str]:
+        models = self.inner.route('generate', query)
+        key = self.cache_key(self.model_label(models), self.inner.script_prompt(query, context))
+        recorded = self._lookup(key)
+        if recorded is not None:
+            if on_script is not None:
+                on_script(recorded['bash script'])
+            return recorded['bash script'], recorded['description']
+
+        token = pinned_models.set(models)
+        try:
+            bash_script, description = await self.inner.agenerate_bash_script(query, context, on_script, timeout=None)
+        finally:
+            pinned_models.reset(token)
+        self._store(key, {'bash script': bash_script, 'description': description})
+        return bash_script, description
+
+    async def _ainterpret_output(self, original_query: str, command_output: str,
+                                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        models = self.inner.route('interpret', command_output)
+        key = self.cache_key(self.model_label(models), self.inner.interpret_prompt(original_query, command_output))
+        recorded = self._lookup(key)
+        if recorded is not None:
+            if on_text is not None:
+                on_text(recorded)
+            return recorded
+
+        token = pinned_models.set(models)
+        try:
+            text = await self.inner.ainterpret_output(original_query, command_output, on_text, timeout=None)
+        finally:
+            pinned_models.reset(token)
+        self._store(key, text)
+        return text
+
+    def cache_stats(self) -> dict:
+        """Recorded responses, hits, misses and hit rate"""
+        hits = metrics.counter(f'llm.{self.name}.hit')
+        misses = metrics.counter(f'llm.{self.name}.miss')
+        return {
+            'mode': self.mode,
+            'entries': len(self.responses),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    def latency_stats(self) -> dict:
+        return self.inner.latency_stats()
+
+    def parse_stats(self) -> dict:
+        return self.inner.parse_stats()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import LLM_ATTEMPT_TIMEOUT_SECONDS
+from llms.llm_base import LLMBase, first_chunk_hook
+from metrics import metrics
+from resilience import CircuitOpenError, guard, is_retryable
+
+
+class ResilientLLM(LLMBase):
+    """Rate limits, retries and circuit breaking around another LLM service
+
+    Calls go through the provider's shared guard (see resilience.py). Each
+    attempt must start streaming within its own time limit, so a stalled
+    provider is retried rather than using up the whole deadline; once the
+    first chunk has arrived only the caller's deadline applies. Once output
+    has been streamed to the caller a call is not repeated, since the
+    caller would see it twice.
+    While the provider's circuit is open, or when its retries are spent,
+    calls are rerouted to the fallback service if there is one.
+
+    The wrapper keeps the inner service's name, so recordings, hedging and
+    latency metrics keyed by provider name are unaffected. Attempts call the
+    services' methods without a deadline of their own, so a call's timeout
+    or cancellation is counted once, by the wrapper, under that name.
+    """
+
+    def __init__(self, inner: LLMBase, fallback: Optional[LLMBase] = None,
+                 attempt_timeout: Optional[float] = LLM_ATTEMPT_TIMEOUT_SECONDS):
+        """Initialize the wrapper
+
+        Args:
+            inner: Service to protect
+            fallback: Service calls are rerouted to while inner is failing
+            attempt_timeout: Seconds a single attempt may take to send its first chunk
+        """
+        super().__init__()
+        self.inner = inner
+        self.fallback = fallback
+        self.attempt_timeout = attempt_timeout
+        self.guard = guard(inner.name)
+        self.name = inner.name
+        self.script_model = inner.script_model
+        self.interpret_model = inner.interpret_model
+
+    def initialize(self):
+        self.inner.initialize()
+        if self.fallback is not None:
+            self.fallback.initialize()
+            logging.info(f"Rerouting {self.inner.name} calls to {self.fallback.name} while it is failing")
+
+    async def _aping(self):
+        await self.inner._aping()
+
+    def script_prompt(self, query: str, context: Optional[str] = None) -> str:
+        return self.inner.script_prompt(query, context)
+
+    def interpret_prompt(self, original_query: str, command_output: str) -> str:
+        return self.inner.interpret_prompt(original_query, command_output)
+
+    def route(self, kind: str, text: str) -> Dict[str, str]:
+        models = self.inner.route(kind, text)
+        if self.fallback is not None:
+            models.update(self.fallback.route(kind, text))
+        return models
+
+    async def _attempt(self, make_call: Callable[[], Awaitable]):
+        """Run one attempt, failing it with TimeoutError if nothing streams within attempt_timeout"""
+        if self.attempt_timeout is None:
+            return await make_call()
+        started = asyncio.Event()
+        # The call's task copies the context, so the provider's stream sees the hook
+        token = first_chunk_hook.set(started.set)
+        try:
+            call = asyncio.ensure_future(make_call())
+        finally:
+            first_chunk_hook.reset(token)
+        first_chunk = asyncio.ensure_future(started.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {call, first_chunk}, timeout=self.attempt_timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                metrics.incr(f'resilience.{self.name}.first_chunk_timeout')
+                raise TimeoutError(f"{self.name} sent nothing within {self.attempt_timeout} seconds")
+            return await call
+        finally:
+            first_chunk.cancel()
+            call.cancel()
+
+    async def _guarded(self, kind: str, make_call: Callable[[LLMBase], Awaitable],
+                       streamed: Callable[[], bool]):
+        """Run make_call on the inner service through its guard, rerouting to the fallback"""
+        try:
+            return await self.guard.acall(lambda: make_call(self.inner), retry_if=lambda: not streamed())
+        except Exception as e:
+            if self.fallback is None or streamed() or not (isinstance(e, CircuitOpenError) or is_retryable(e)):
+                raise
+            metrics.incr(f'resilience.{self.name}.{kind}_rerouted')
+            logging.warning(f"{self.inner.name} {kind} call failed ({e}), rerouting to {self.fallback.name}")
+            return await make_call(self.fallback)
+
+    async def _agenerate_bash_script(self, query: str, context: Optional[str] = None,
+                                     on_script: Optional[Callable[[str], None]] = None) -> tuple[str, str]:
+        forwarded = []
+
+        def relay(script):
+            forwarded.append(script)
+            if on_script is not None:
+                on_script(script)
+
+        return await self._guarded(
+            'generate',
+            lambda llm: self._attempt(lambda: llm._agenerate_bash_script(query, context, relay)),
+            lambda: bool(forwarded),
+        )
+
+    async def _ainterpret_output(self, original_query: str, command_output: str,
+                                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        forwarded = []
+
+        def relay(text):
+            forwarded.append(text)
+            if on_text is not None:
+                on_text(text)
+
+        return await self._guarded(
+            'interpret',
+            lambda llm: self._attempt(
+                lambda: llm._ainterpret_output(original_query, command_output, relay)
+            ),
+            lambda: bool(forwarded),
+        )
+
+    def latency_stats(self) -> dict:
+        return self.inner.latency_stats()
+
+    def parse_stats(self) -> dict:
+        return self.inner.parse_stats()
+
+    def call_stats(self) -> dict:
+        return self.inner.call_stats()
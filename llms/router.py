@@ -0,0 +1,141 @@
+import logging
+import random
+import re
+import threading
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+
+from config import (
+    MODEL_ROUTES, ROUTER_TASK_TIERS, ROUTER_SIMPLE_TIER, ROUTER_SIMPLE_QUERY_WORDS, ROUTER_SIMPLE_OUTPUT_TOKENS,
+    ROUTER_WINDOW, ROUTER_MIN_SAMPLES, ROUTER_EXPLORE_RATE, ROUTER_MAX_FAILURE_RATE
+)
+from context_assembly import estimate_tokens
+from metrics import metrics, percentile
+
+# Words that make a request multi-step, so not simple whatever its length
+COMPOUND_QUERY_PATTERN = re.compile(r"\b(and|then|every|each|unless|if|after|before)\b", re.IGNORECASE)
+
+
+class ModelRouter:
+    """Picks the model for each LLM call from rolling per-model statistics
+
+    For every (provider, model) it keeps the latency of recent successful
+    calls per task and the outcome of recent calls; calls cut short by a
+    deadline or a won hedge count as failures. A call goes to the
+    fastest healthy model whose quality tier meets the task's; simple
+    queries may use a lower tier. Models with too few samples are tried
+    first (the provider's default model before others) and then
+    occasionally, so their statistics stay current.
+    """
+
+    def __init__(self, routes: Dict[str, Dict[str, int]] = MODEL_ROUTES,
+                 task_tiers: Dict[str, int] = ROUTER_TASK_TIERS, simple_tier: int = ROUTER_SIMPLE_TIER,
+                 window: int = ROUTER_WINDOW, min_samples: int = ROUTER_MIN_SAMPLES,
+                 explore_rate: float = ROUTER_EXPLORE_RATE, max_failure_rate: float = ROUTER_MAX_FAILURE_RATE):
+        """Initialize the router
+
+        Args:
+            routes: provider -> {model: quality tier}
+            task_tiers: Lowest tier allowed per task ('generate', 'interpret')
+            simple_tier: Lowest tier allowed for simple queries
+            window: Calls kept per model
+            min_samples: Successful calls needed before a model's latency is trusted
+            explore_rate: Share of calls sent to under-sampled models
+            max_failure_rate: Models failing more often than this are avoided
+        """
+        self.routes = routes
+        self.task_tiers = task_tiers
+        self.simple_tier = simple_tier
+        self.window = window
+        self.min_samples = min_samples
+        self.explore_rate = explore_rate
+        self.max_failure_rate = max_failure_rate
+        self._latencies = defaultdict(lambda: deque(maxlen=self.window))
+        self._outcomes = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def is_simple(self, kind: str, text: str) -> bool:
+        """Whether a query (for 'generate') or command output (for 'interpret') is simple"""
+        if kind == 'generate':
+            return len(text.split()) <= ROUTER_SIMPLE_QUERY_WORDS and not COMPOUND_QUERY_PATTERN.search(text)
+        return estimate_tokens(text) <= ROUTER_SIMPLE_OUTPUT_TOKENS
+
+    def required_tier(self, kind: str, text: str) -> int:
+        tier = self.task_tiers.get(kind, 1)
+        return min(tier, self.simple_tier) if self.is_simple(kind, text) else tier
+
+    def _samples(self, provider: str, model: str, kind: str) -> List[float]:
+        with self._lock:
+            return list(self._latencies[provider, model, kind])
+
+    def failure_rate(self, provider: str, model: str) -> float:
+        with self._lock:
+            outcomes = list(self._outcomes[provider, model])
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def choose(self, provider: str, kind: str, text: str, default: str) -> str:
+        """Model to use for one call
+
+        Args:
+            provider: Provider name, a key of routes
+            kind: 'generate' or 'interpret'
+            text: The query or command output the call is about
+            default: Provider's configured model for this task
+
+        Returns:
+            str: Model name; default if the provider has no routes
+        """
+        tiers = self.routes.get(provider)
+        if not tiers:
+            return default
+        tier = self.required_tier(kind, text)
+        models = [model for model, model_tier in tiers.items() if model_tier >= tier]
+        if not models:
+            return default
+
+        healthy = [model for model in models if self.failure_rate(provider, model) <= self.max_failure_rate]
+        if not healthy:
+            # Everything is failing; the least bad model is still better than no answer
+            healthy = [min(models, key=lambda model: self.failure_rate(provider, model))]
+        unexplored = [model for model in healthy if len(self._samples(provider, model, kind)) < self.min_samples]
+        explored = [model for model in healthy if model not in unexplored]
+        # Failing models are probed now and then so they can recover
+        probes = unexplored or [model for model in models if model not in healthy]
+
+        if not explored or (probes and random.random() < self.explore_rate):
+            model = default if default in probes else min(probes, key=lambda model: tiers[model])
+            reason = f"exploring, {len(self._samples(provider, model, kind))} samples, " \
+                     f"{self.failure_rate(provider, model):.0%} failed"
+        else:
+            latencies = {model: percentile(self._samples(provider, model, kind), 50) for model in explored}
+            model = min(explored, key=latencies.get)
+            reason = f"fastest healthy, p50 {latencies[model] * 1000:.0f} ms"
+        metrics.incr(f'router.{provider}.{kind}.{model}')
+        logging.info(f"Routing {provider} {kind} call (tier {tier}+) to {model}: {reason}")
+        return model
+
+    def record(self, provider: str, model: str, kind: str, seconds: Optional[float]) -> None:
+        """Record a call's latency, or a failed or cancelled call if seconds is None"""
+        with self._lock:
+            self._outcomes[provider, model].append(seconds is not None)
+            if seconds is not None:
+                self._latencies[provider, model, kind].append(seconds)
+
+    def stats(self) -> Dict[str, dict]:
+        """Tier, failure rate and p50 latency per task for every model that has been called"""
+        return {
+            f'{provider}:{model}': {
+                'tier': tier,
+                'failure_rate': self.failure_rate(provider, model),
+                **{
+                    f'{kind}_p50_ms': percentile([s * 1000 for s in self._samples(provider, model, kind)], 50)
+                    for kind in self.task_tiers
+                },
+            }
+            for provider, tiers in self.routes.items() for model, tier in tiers.items()
+            if self._outcomes.get((provider, model))
+        }
+
+
+# Shared by all providers, so statistics survive provider re-creation
+model_router = ModelRouter()
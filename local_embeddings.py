@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic offline embeddings from hashed word unigrams and bigrams
+
+    No model or network access is needed, which makes it suitable for
+    benchmarks and tests; quality is close to a tuned bag-of-words retriever.
+    """
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        words = _WORD_PATTERN.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            vector[value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+class RecordedEmbeddings(Embeddings):
+    """Replay embeddings recorded from another backend
+
+    In 'record' mode every vector returned by the wrapped backend is stored
+    in a JSON file; in 'replay' mode vectors are served from that file only,
+    so runs are offline and reproducible.
+    """
+
+    def __init__(self, path: str, inner: Optional[Embeddings] = None, mode: str = 'replay'):
+        """Initialize and load any recorded vectors
+
+        Args:
+            path: JSON file holding the recorded vectors
+            inner: Backend to record from (required in 'record' mode)
+            mode: 'record' or 'replay'
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unsupported mode: {mode}")
+        if mode == 'record' and inner is None:
+            raise ValueError("Record mode needs an embedding backend to record from")
+        self.path = path
+        self.inner = inner
+        self.mode = mode
+        self.vectors = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.vectors = json.load(f)
+            logging.info(f"Loaded {len(self.vectors)} recorded embeddings from {path}")
+
+    @staticmethod
+    def _key(kind: str, text: str) -> str:
+        return hashlib.sha256(f"{kind}\0{text}".encode('utf-8')).hexdigest()
+
+    def _lookup(self, kind: str, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        missing = [text for key, text in zip(keys, texts) if key not in self.vectors]
+        if missing:
+            if self.mode == 'replay':
+                raise KeyError(f"{len(missing)} texts have no recorded embedding, e.g. {missing[0]!r}")
+            if kind == 'query' and hasattr(self.inner, 'embed_queries'):
+                recorded = self.inner.embed_queries(missing)
+            elif kind == 'query':
+                recorded = [self.inner.embed_query(text) for text in missing]
+            else:
+                recorded = self.inner.embed_documents(missing)
+            with self._lock:
+                for text, vector in zip(missing, recorded):
+                    self.vectors[self._key(kind, text)] = list(vector)
+                self.save()
+        return [self.vectors[key] for key in keys]
+
+    def save(self) -> None:
+        """Write recorded vectors to disk"""
+        with open(self.path, 'w') as f:
+            json.dump(self.vectors, f)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._lookup('document', texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._lookup('query', [text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self._lookup('query', texts)
@@ -18,7 +18,6 @@ from config import GEMINI_API_KEY, GROQ_API_KEY
 from voice_recognition_thread import VoiceRecognitionThread
 from rag_service import RAGService
 from create_embeddings import EmbeddingProvider
-import google.generativeai as genai
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
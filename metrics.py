@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values
+
+    Args:
+        values: Observed values
+        q: Percentile in [0, 100]
+
+    Returns:
+        Optional[float]: The percentile, or None if there are no values
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[rank]
+
+
+class Metrics:
+    """Thread-safe in-process counters and rolling timings"""
+
+    def __init__(self, window: int = 1000):
+        """Initialize an empty registry
+
+        Args:
+            window: Number of most recent observations kept per timing
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._observations = defaultdict(lambda: deque(maxlen=self.window))
+
+    def incr(self, name: str, value: int = 1) -> None:
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a value that describes current state, e.g. a circuit breaker's"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def gauge(self, name: str) -> Optional[float]:
+        """Current value of a gauge, or None if it was never set"""
+        with self._lock:
+            return self._gauges.get(name)
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one observation, e.g. a latency in seconds"""
+        with self._lock:
+            self._observations[name].append(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Observe the wall-clock duration of the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name: str) -> int:
+        """Current value of a counter"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def values(self, name: str) -> List[float]:
+        """Observations currently in the window for a timing"""
+        with self._lock:
+            return list(self._observations.get(name, ()))
+
+    def summary(self, name: str) -> Dict[str, Optional[float]]:
+        """Count, mean and percentiles of a timing"""
+        values = self.values(name)
+        return {
+            'count': len(values),
+            'mean': sum(values) / len(values) if values else None,
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p95': percentile(values, 95),
+            'max': max(values) if values else None,
+        }
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """All counters, gauges and timing summaries"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            names = list(self._observations)
+        return {
+            'counters': counters,
+            'gauges': gauges,
+            'timings': {name: self.summary(name) for name in names},
+        }
+
+    def log_snapshot(self, level: int = logging.INFO) -> None:
+        """Write the current snapshot to the log"""
+        logging.log(level, f"Metrics: {self.snapshot()}")
+
+
+# Process-wide registry shared by all services
+metrics = Metrics()
@@ -0,0 +1,331 @@
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from local_embeddings import HashingEmbeddings
+
+QUERY_PATTERN = re.compile(r"Here is the issue you need to resolve:\s*(.+)")
+INTERPRETATION_MARKER = "Raw Command Output:"
+OUTPUT_PATTERN = re.compile(r"Raw Command Output:\s*\n(.*?)\n\s*\n", re.DOTALL)
+# Gemini REST paths: /v1beta/models/{model}:{method}
+GEMINI_PATH_PATTERN = re.compile(r"/v1(?:beta)?/models/(?P<model>[^:/]+):(?P<method>\w+)$")
+
+# Keyword -> (bash script, description), checked in order
+CANNED_SCRIPTS = [
+    (('disk', 'space', 'storage'), ('df -h', 'Shows used and available space on each mounted filesystem.')),
+    (('memory', 'ram'), ('free -h', 'Shows total, used and available memory.')),
+    (('uptime', 'running for', 'load'), ('uptime', 'Shows how long the system has been running and its load.')),
+    (('who am i', 'username', 'logged in as'), ('whoami', 'Prints the current user name.')),
+    (('ip address', 'hostname', 'device name'), ('hostname', 'Prints the name of this device.')),
+    (('date', 'time'), ('date', 'Prints the current date and time.')),
+    (('directory', 'folder', 'where am i'), ('pwd', 'Prints the current working directory.')),
+    (('kernel', 'operating system'), ('uname -a', 'Shows the kernel name, version and architecture.')),
+]
+DEFAULT_SCRIPT = ('echo "I am not sure how to do that"', 'Prints a message.')
+
+
+@dataclass
+class MockBehaviour:
+    """How the mock server answers
+
+    Attributes:
+        ttft_seconds: Delay before the first token (or before an embedding)
+        tokens_per_second: Streaming rate after the first token
+        jitter: Relative spread of every delay, e.g. 0.2 for +/-20%
+        error_rate: Share of requests answered with error_status
+        error_status: HTTP status of injected errors (429, 500, 503, ...)
+        responses: Scripted replies tried before the canned ones, each a
+            {"match": regex, "response": text or JSON object} dict
+        seed: Seed for jitter and error injection
+    """
+    ttft_seconds: float = 0.05
+    tokens_per_second: float = 200.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    responses: List[Dict] = field(default_factory=list)
+    seed: Optional[int] = None
+
+
+def scripted_reply(prompt: str, responses: List[Dict]) -> Optional[str]:
+    """First scripted response whose pattern matches the prompt"""
+    for entry in responses:
+        if re.search(entry['match'], prompt, re.IGNORECASE):
+            response = entry['response']
+            return response if isinstance(response, str) else json.dumps(response)
+    return None
+
+
+def canned_reply(prompt: str, responses: Optional[List[Dict]] = None) -> str:
+    """Answer a script prompt with JSON and an interpretation prompt with a sentence"""
+    scripted = scripted_reply(prompt, responses or [])
+    if scripted is not None:
+        return scripted
+    if INTERPRETATION_MARKER in prompt:
+        match = OUTPUT_PATTERN.search(prompt + '\n\n')
+        output = match.group(1).strip() if match else ''
+        first_line = output.split('\n')[0] if output else 'nothing'
+        return f"The command returned {first_line}."
+
+    match = QUERY_PATTERN.search(prompt)
+    query = (match.group(1) if match else prompt).lower()
+    script, description = next(
+        (reply for keywords, reply in CANNED_SCRIPTS if any(keyword in query for keyword in keywords)),
+        DEFAULT_SCRIPT,
+    )
+    return json.dumps({'bash script': script, 'description': description})
+
+
+def tokenize(text: str) -> Iterator[str]:
+    """Split text into roughly token-sized pieces"""
+    for match in re.finditer(r"\s*\S{1,4}|\s+", text):
+        yield match.group(0)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible (local backends, Groq) and Gemini REST endpoints
+
+    OpenAI-style paths are matched by suffix, so both /v1/chat/completions
+    and Groq's /openai/v1/chat/completions work.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    behaviour = MockBehaviour()
+    rng = random.Random()
+    embeddings = HashingEmbeddings()
+    # Requests served per endpoint, including injected errors
+    stats = Counter()
+
+    def log_message(self, format, *args):
+        logging.debug(f"mock LLM server: {format % args}")
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _path(self) -> str:
+        return urlsplit(self.path).path.rstrip('/')
+
+    def _jittered(self, seconds: float) -> float:
+        jitter = self.behaviour.jitter
+        return max(0.0, seconds * (1 + self.rng.uniform(-jitter, jitter))) if jitter else seconds
+
+    def _delays(self) -> Tuple[float, float]:
+        """Time to first token and time per token"""
+        behaviour = self.behaviour
+        return self._jittered(behaviour.ttft_seconds), self._jittered(1.0 / behaviour.tokens_per_second)
+
+    def _inject_error(self, endpoint: str, gemini: bool) -> bool:
+        """Answer with an error in the API's own format for a share of requests"""
+        self.stats[endpoint] += 1
+        if self.rng.random() >= self.behaviour.error_rate:
+            return False
+        self.stats[f'{endpoint}.error'] += 1
+        status = self.behaviour.error_status
+        message = f"Injected error {status}"
+        if gemini:
+            self._send_json(status, {'error': {'code': status, 'message': message, 'status': 'UNAVAILABLE'}})
+        else:
+            self._send_json(status, {'error': {'message': message, 'type': 'server_error'}})
+        return True
+
+    def do_GET(self):
+        path = self._path()
+        if path.endswith('/models') and '/v1beta' in path:
+            self._send_json(200, {'models': [{'name': 'models/mock', 'displayName': 'Mock'}]})
+        elif path.endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model'}]})
+        else:
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+
+    def do_POST(self):
+        path = self._path()
+        gemini = GEMINI_PATH_PATTERN.search(path)
+        if gemini:
+            self._gemini(gemini.group('model'), gemini.group('method'))
+        elif path.endswith('/chat/completions'):
+            self._chat_completions()
+        else:
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def _stream_events(self, events: Iterator[dict], done_marker: bool):
+        """Send server-sent events, pacing them like token generation"""
+        ttft, per_token = self._delays()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        time.sleep(ttft)
+        for i, event in enumerate(events):
+            if i:
+                time.sleep(per_token)
+            self._write_chunk(f'data: {json.dumps(event)}\n\n'.encode('utf-8'))
+        if done_marker:
+            self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _wait_for_reply(self, reply: str):
+        ttft, per_token = self._delays()
+        time.sleep(ttft + per_token * sum(1 for _ in tokenize(reply)))
+
+    def _chat_completions(self):
+        request = self._read_json()
+        if self._inject_error('chat.completions', gemini=False):
+            return
+        prompt = '\n'.join(message.get('content', '') for message in request.get('messages', []))
+        reply = canned_reply(prompt, self.behaviour.responses)
+        model = request.get('model', 'mock')
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+
+        if request.get('stream'):
+            self._stream_events((
+                {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}],
+                }
+                for token in tokenize(reply)
+            ), done_marker=True)
+            return
+        self._wait_for_reply(reply)
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(reply) // 4,
+                      'total_tokens': (len(prompt) + len(reply)) // 4},
+        })
+
+    @staticmethod
+    def _gemini_text(content: dict) -> str:
+        return '\n'.join(part.get('text', '') for part in content.get('parts', []))
+
+    def _gemini(self, model: str, method: str):
+        request = self._read_json()
+        if self._inject_error(f'gemini.{method}', gemini=True):
+            return
+
+        if method == 'countTokens':
+            text = '\n'.join(self._gemini_text(content) for content in request.get('contents', []))
+            self._send_json(200, {'totalTokens': len(text) // 4})
+        elif method in ('generateContent', 'streamGenerateContent'):
+            prompt = '\n'.join(self._gemini_text(content) for content in request.get('contents', []))
+            reply = canned_reply(prompt, self.behaviour.responses)
+            if method == 'generateContent':
+                self._wait_for_reply(reply)
+                self._send_json(200, self._gemini_response(reply, 'STOP'))
+            elif 'alt=sse' in urlsplit(self.path).query:
+                tokens = list(tokenize(reply))
+                self._stream_events((
+                    self._gemini_response(token, 'STOP' if i == len(tokens) - 1 else None)
+                    for i, token in enumerate(tokens)
+                ), done_marker=False)
+            else:
+                # Without alt=sse the API streams one JSON array
+                self._wait_for_reply(reply)
+                self._send_json(200, [self._gemini_response(reply, 'STOP')])
+        elif method == 'embedContent':
+            time.sleep(self._delays()[0])
+            self._send_json(200, {'embedding': {'values': self._embed(request)}})
+        elif method == 'batchEmbedContents':
+            time.sleep(self._delays()[0])
+            self._send_json(200, {'embeddings': [{'values': self._embed(item)} for item in request.get('requests', [])]})
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': f'Unknown method {method}', 'status': 'NOT_FOUND'}})
+
+    def _embed(self, request: dict) -> List[float]:
+        vector = self.embeddings.embed_query(self._gemini_text(request.get('content', {})))
+        dimensions = request.get('outputDimensionality')
+        return vector[:dimensions] if dimensions else vector
+
+    @staticmethod
+    def _gemini_response(text: str, finish_reason: Optional[str]) -> dict:
+        candidate = {'content': {'role': 'model', 'parts': [{'text': text}]}, 'index': 0}
+        if finish_reason:
+            candidate['finishReason'] = finish_reason
+        return {'candidates': [candidate]}
+
+
+def start_server(host: str = '127.0.0.1', port: int = 0,
+                 behaviour: MockBehaviour = None) -> ThreadingHTTPServer:
+    """Start the mock server on a background thread
+
+    Args:
+        host: Interface to bind
+        port: Port to bind, 0 for any free port
+        behaviour: Latency, error and response settings
+
+    Returns:
+        ThreadingHTTPServer: Running server. Point LOCAL_LLM_BASE_URL at
+            f"http://{host}:{port}/v1" and GROQ_BASE_URL / GEMINI_BASE_URL
+            at f"http://{host}:{port}"; request counts are in
+            server.RequestHandlerClass.stats
+    """
+    behaviour = behaviour or MockBehaviour()
+    handler = type('ConfiguredMockLLMHandler', (MockLLMHandler,), {
+        'behaviour': behaviour,
+        'rng': random.Random(behaviour.seed),
+        'stats': Counter(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='mock-llm-server', daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Mock Groq/OpenAI-compatible and Gemini LLM and embedding server with canned bash scripts")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--ttft-ms', type=float, default=50.0, help="delay before the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--jitter', type=float, default=0.0, help="relative spread of every delay, e.g. 0.2")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--responses', help='JSON file of scripted replies: [{"match": regex, "response": ...}]')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    responses = []
+    if args.responses:
+        with open(args.responses, 'r') as f:
+            responses = json.load(f)
+    server = start_server(args.host, args.port, MockBehaviour(
+        args.ttft_ms / 1000, args.tokens_per_second, args.jitter,
+        args.error_rate, args.error_status, responses, args.seed,
+    ))
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    logging.info(f"Mock LLM server listening: LOCAL_LLM_BASE_URL={base_url}/v1 "
+                 f"GROQ_BASE_URL={base_url} GEMINI_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
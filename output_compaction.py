@@ -0,0 +1,272 @@
+import logging
+import re
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from config import OUTPUT_MAX_TOKENS, OUTPUT_HEAD_LINES, OUTPUT_TAIL_LINES, OUTPUT_MAX_LINE_CHARS
+from context_assembly import estimate_tokens
+from metrics import metrics
+
+DIGITS_PATTERN = re.compile(r"\d+")
+NUMBER_PATTERN = re.compile(r"^-?\d+(?:\.\d+)?%?$")
+# Bounds on the table summary, so it cannot outgrow the output it replaces
+MAX_SUMMARY_COLUMNS = 12
+MAX_DISTINCT_VALUES = 1000
+MAX_VALUE_CHARS = 30
+# Shorter runs of repeated lines are kept as they are; a marker would not save anything
+MIN_COLLAPSED_RUN = 4
+
+
+def line_shape(line: str) -> str:
+    """A line with its numbers masked, so lines differing only in counters or timestamps match"""
+    return DIGITS_PATTERN.sub('#', line)
+
+
+@dataclass
+class CompactionStats:
+    """Size of a command's output before and after compaction
+
+    omitted_lines counts lines dropped between the head and the tail,
+    after repeated lines were collapsed.
+    """
+    original_lines: int = 0
+    original_bytes: int = 0
+    original_tokens: int = 0
+    compacted_lines: int = 0
+    compacted_tokens: int = 0
+    collapsed_lines: int = 0
+    omitted_lines: int = 0
+    compacted: bool = False
+
+    @property
+    def ratio(self) -> float:
+        """Compacted tokens as a share of the original tokens"""
+        return self.compacted_tokens / self.original_tokens if self.original_tokens else 1.0
+
+
+class ColumnStats:
+    """Running summary of one table column"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.numbers = 0
+        self.low = None
+        self.high = None
+        self.values = Counter()
+        self.overflow = False
+
+    def add(self, value: str) -> None:
+        self.count += 1
+        if NUMBER_PATTERN.match(value):
+            number = float(value.rstrip('%'))
+            self.numbers += 1
+            self.low = number if self.low is None else min(self.low, number)
+            self.high = number if self.high is None else max(self.high, number)
+        if value in self.values or len(self.values) < MAX_DISTINCT_VALUES:
+            self.values[value] += 1
+        else:
+            self.overflow = True
+
+    def describe(self) -> str:
+        if self.count and self.numbers == self.count:
+            return f"{self.name} {self.low:g} to {self.high:g}"
+        distinct = f"{len(self.values)}{'+' if self.overflow else ''} distinct"
+        common = ', '.join(
+            f"{value[:MAX_VALUE_CHARS]} ({count})" for value, count in self.values.most_common(3) if count > 1
+        )
+        return f"{self.name} {distinct}" + (f", most common {common}" if common else '')
+
+
+class TableSummary:
+    """Column summaries of whitespace-aligned tabular output (ps, df, ss, ...)
+
+    The first line is taken as the header; rows with at least as many
+    fields are counted, with any extra words folded into the last column.
+    """
+
+    def __init__(self, header: str):
+        self.columns = [ColumnStats(name) for name in header.split()]
+        self.rows = 0
+        self.other_lines = 0
+
+    @staticmethod
+    def is_header(line: str) -> bool:
+        fields = line.split()
+        return len(fields) >= 2 and not any(NUMBER_PATTERN.match(field) for field in fields)
+
+    def add(self, line: str) -> None:
+        fields = line.split(None, len(self.columns) - 1)
+        if len(fields) != len(self.columns):
+            self.other_lines += 1
+            return
+        self.rows += 1
+        for column, value in zip(self.columns, fields):
+            column.add(value)
+
+    def is_table(self) -> bool:
+        return self.rows >= 2 and self.rows >= 0.8 * (self.rows + self.other_lines)
+
+    def describe(self) -> str:
+        columns = '; '.join(column.describe() for column in self.columns[:MAX_SUMMARY_COLUMNS])
+        return f"[table of {self.rows} rows: {columns}]"
+
+
+class OutputCompactor:
+    """Bounded, streaming compaction of command output for an LLM prompt
+
+    Lines are fed one at a time and only a bounded amount is kept: output
+    that fits in max_tokens is returned verbatim; longer output keeps its
+    first head_lines and last tail_lines, with runs of repeated or
+    near-identical lines collapsed, long lines cut, a count of what was
+    left out and, for tabular output, a summary of each column.
+    """
+
+    def __init__(self, max_tokens: int = OUTPUT_MAX_TOKENS, head_lines: int = OUTPUT_HEAD_LINES,
+                 tail_lines: int = OUTPUT_TAIL_LINES, max_line_chars: int = OUTPUT_MAX_LINE_CHARS):
+        """Initialize an empty compactor
+
+        Args:
+            max_tokens: Token cap of the compacted output (estimate_tokens)
+            head_lines: Lines kept from the start of the output
+            tail_lines: Lines kept from the end of the output
+            max_line_chars: Longer lines are cut to this many characters
+        """
+        self.max_tokens = max_tokens
+        self.head_lines = head_lines
+        self.max_line_chars = max_line_chars
+        self.stats = CompactionStats()
+        # Verbatim copy, dropped as soon as the output outgrows max_tokens
+        self._raw: Optional[List[str]] = []
+        self._raw_tokens = 0
+        self._head: List[str] = []
+        self._tail = deque(maxlen=tail_lines)
+        # Current run of lines with the same shape: [shape, first lines, last, count, identical]
+        self._run = None
+        self._table: Optional[TableSummary] = None
+        self._seen_content = False
+        self._result = None
+
+    def feed_line(self, line: str) -> None:
+        """Add one line of output, without its newline"""
+        tokens = estimate_tokens(line)
+        self.stats.original_lines += 1
+        self.stats.original_bytes += len(line.encode('utf-8')) + 1
+        self.stats.original_tokens += tokens
+        if self._raw is not None:
+            self._raw.append(line)
+            self._raw_tokens += tokens
+            if self._raw_tokens > self.max_tokens:
+                self._raw = None
+
+        if self._table is not None:
+            self._table.add(line)
+        elif not self._seen_content and line.strip():
+            self._seen_content = True
+            if TableSummary.is_header(line):
+                self._table = TableSummary(line)
+
+        shape = line_shape(line)
+        if self._run is not None and self._run[0] == shape:
+            if len(self._run[1]) < MIN_COLLAPSED_RUN:
+                self._run[1].append(line)
+            self._run[2] = line
+            self._run[3] += 1
+            self._run[4] = self._run[4] and line == self._run[1][0]
+        else:
+            self._flush_run()
+            self._run = [shape, [line], line, 1, True]
+
+    def feed(self, text: str) -> None:
+        """Add a block of output made of whole lines"""
+        for line in text.splitlines():
+            self.feed_line(line)
+
+    def _flush_run(self) -> None:
+        if self._run is None:
+            return
+        _, first_lines, last, count, identical = self._run
+        self._run = None
+        if count < MIN_COLLAPSED_RUN:
+            lines = first_lines
+        elif identical:
+            lines = [last, f"[previous line repeated {count - 1} more times]"]
+            self.stats.collapsed_lines += count - 1
+        else:
+            lines = [first_lines[0], f"[{count - 2} similar lines]", last]
+            self.stats.collapsed_lines += count - 2
+        for line in lines:
+            self._emit(line)
+
+    def _emit(self, line: str) -> None:
+        if len(line) > self.max_line_chars:
+            line = f"{line[:self.max_line_chars]}[... {len(line) - self.max_line_chars} more characters]"
+        if len(self._head) < self.head_lines:
+            self._head.append(line)
+            return
+        if len(self._tail) == self._tail.maxlen:
+            self.stats.omitted_lines += 1
+        self._tail.append(line)
+
+    def _compose(self, head: int, tail: int) -> str:
+        tail_lines = list(self._tail)
+        omitted = self.stats.omitted_lines + (len(self._head) - head) + (len(tail_lines) - tail)
+        lines = self._head[:head]
+        if omitted:
+            lines.append(f"[... {omitted} lines omitted ...]")
+            if self._table is not None and self._table.is_table():
+                lines.append(self._table.describe())
+        lines.extend(tail_lines[len(tail_lines) - tail:])
+        return '\n'.join(lines)
+
+    def result(self) -> str:
+        """The compacted output; call once all lines have been fed"""
+        if self._result is not None:
+            return self._result
+        self._flush_run()
+        if self._raw is not None:
+            text = '\n'.join(self._raw)
+        else:
+            self.stats.compacted = True
+            head, tail = len(self._head), len(self._tail)
+            text = self._compose(head, tail)
+            # Drop lines from whichever end has more until the cap is met
+            while estimate_tokens(text) > self.max_tokens and head + tail > 0:
+                if head >= tail:
+                    head -= 1
+                else:
+                    tail -= 1
+                text = self._compose(head, tail)
+            if estimate_tokens(text) > self.max_tokens:
+                # Only the markers and table summary are left; cut them to roughly the cap
+                text = text[:self.max_tokens * 3]
+
+        self.stats.compacted_lines = text.count('\n') + 1 if text else 0
+        self.stats.compacted_tokens = estimate_tokens(text)
+        metrics.observe('output.original_tokens', self.stats.original_tokens)
+        metrics.observe('output.compacted_tokens', self.stats.compacted_tokens)
+        if self.stats.compacted:
+            metrics.incr('output.compacted')
+            logging.info(
+                f"Compacted command output from {self.stats.original_lines} lines / "
+                f"{self.stats.original_tokens} tokens to {self.stats.compacted_lines} lines / "
+                f"{self.stats.compacted_tokens} tokens"
+            )
+        self._result = text
+        return text
+
+
+def compact_output(text: str, **kwargs) -> Tuple[str, CompactionStats]:
+    """Compact an output already held in memory
+
+    Args:
+        text: Command output
+        **kwargs: OutputCompactor settings
+
+    Returns:
+        Tuple[str, CompactionStats]: Compacted output and its statistics
+    """
+    compactor = OutputCompactor(**kwargs)
+    compactor.feed(text)
+    return compactor.result(), compactor.stats
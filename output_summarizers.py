@@ -0,0 +1,295 @@
+import ipaddress
+import logging
+import re
+import shlex
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from metrics import metrics
+
+# Shell syntax that means the script is more than a single simple command
+COMPOUND_PATTERN = re.compile(r"[|;&<>`]|\$\(")
+USERNAME_PATTERN = re.compile(r"^[a-z_][a-z0-9_.-]*\$?$", re.IGNORECASE)
+UPTIME_PATTERN = re.compile(
+    r"up\s+(?P<up>.+?),\s+(?P<users>\d+)\s+users?,\s+load averages?:\s*"
+    r"(?P<l1>[\d.]+),?\s+(?P<l5>[\d.]+),?\s+(?P<l15>[\d.]+)"
+)
+# Only human-readable df output is summarized: block counts (default, -k, -B) and
+# inode counts (-i) would be spoken as free space, and -T/--output move the columns
+DF_HEADER = ['Filesystem', 'Size', 'Used', 'Avail', 'Use%', 'Mounted', 'on']
+FREE_HEADER = ['total', 'used', 'free']
+HOSTNAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9.-]*$")
+# Default date output: a year and a clock time, in whatever locale order
+DATE_PATTERN = re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?\b.*\b\d{4}\b|\b\d{4}\b.*\b\d{1,2}:\d{2}")
+UNAME_FIELD_PATTERN = re.compile(r"^[\w.+~/-]+$")
+FREE_UNITS = {'-b': 'B', '--bytes': 'B', '-k': 'KiB', '--kibi': 'KiB', '-m': 'MiB', '--mebi': 'MiB',
+              '-g': 'GiB', '--gibi': 'GiB'}
+
+
+@dataclass
+class Summary:
+    """Structured data parsed from a command's output and the sentence to speak"""
+    command: str
+    data: Dict = field(default_factory=dict)
+    text: str = ''
+
+
+# Command name -> parser(argv, output) returning a Summary
+SUMMARIZERS: Dict[str, Callable[[List[str], str], Summary]] = {}
+
+
+def summarizer(*commands: str):
+    """Register a parser for the given command names"""
+    def register(fn):
+        for command in commands:
+            SUMMARIZERS[command] = fn
+        return fn
+    return register
+
+
+def script_command(script_content: str) -> Optional[List[str]]:
+    """Return the argv of a script made of a single simple command
+
+    Blank lines, comments and the shebang are ignored; pipelines, lists,
+    redirections and substitutions are not summarized locally.
+    """
+    lines = [
+        line.strip() for line in script_content.split('\n')
+        if line.strip() and not line.strip().startswith('#')
+    ]
+    if len(lines) != 1 or COMPOUND_PATTERN.search(lines[0]):
+        return None
+    try:
+        argv = shlex.split(lines[0])
+    except ValueError:
+        return None
+    if argv and argv[0] == 'sudo':
+        argv = argv[1:]
+    return argv or None
+
+
+def summarize_output(script_content: str, command_output: str, returncode: int = 0) -> Optional[Summary]:
+    """Summarize a command's output locally if a parser knows the command
+
+    Parsers only accept output in the format they expect, and a failed
+    command is never summarized, so error messages are left to the LLM.
+
+    Args:
+        script_content: Script that was executed
+        command_output: Its output (stderr if it failed)
+        returncode: The script's exit status
+
+    Returns:
+        Optional[Summary]: None when the command failed, no parser matches
+            or parsing fails, in which case the LLM should interpret the output
+    """
+    if returncode != 0:
+        metrics.incr('summarizer.command_failed')
+        return None
+    argv = script_command(script_content)
+    parser = SUMMARIZERS.get(argv[0]) if argv else None
+    if parser is None or not command_output.strip():
+        metrics.incr('summarizer.miss')
+        return None
+
+    start = time.perf_counter()
+    try:
+        summary = parser(argv, command_output)
+    except (ValueError, IndexError, KeyError) as e:
+        logging.debug(f"Could not summarize {argv[0]} output locally: {e}")
+        metrics.incr('summarizer.parse_failed')
+        return None
+    metrics.observe('summarizer.seconds', time.perf_counter() - start)
+    metrics.incr('summarizer.hit')
+    return summary
+
+
+def savings(interpret_timing: str) -> Dict[str, float]:
+    """Interpretation calls avoided and the LLM time that saved
+
+    Args:
+        interpret_timing: Metric holding the LLM interpretation latencies
+
+    Returns:
+        Dict[str, float]: Counts, plus saved seconds estimated from the mean
+            LLM interpretation latency minus the local parsing time
+    """
+    hits = metrics.counter('summarizer.hit')
+    llm = metrics.summary(interpret_timing)
+    local = metrics.summary('summarizer.seconds')
+    saved = None
+    if hits and llm['mean'] is not None:
+        saved = hits * (llm['mean'] - (local['mean'] or 0.0))
+    return {
+        'calls_avoided': hits,
+        'llm_calls': llm['count'],
+        'parse_failed': metrics.counter('summarizer.parse_failed'),
+        'estimated_seconds_saved': saved,
+    }
+
+
+def _table(output: str) -> List[List[str]]:
+    """Split non-empty output lines into whitespace-separated fields"""
+    return [line.split() for line in output.strip().split('\n') if line.strip()]
+
+
+def _percent(value: str) -> int:
+    return int(value.rstrip('%'))
+
+
+def _expand_short_flags(argv: List[str]) -> List[str]:
+    """Split clusters of short options, so ['-hw'] becomes ['-h', '-w']"""
+    args = []
+    for arg in argv:
+        if arg.startswith('-') and not arg.startswith('--') and len(arg) > 2:
+            args.extend(f'-{flag}' for flag in arg[1:])
+        else:
+            args.append(arg)
+    return args
+
+
+@summarizer('df')
+def summarize_df(argv: List[str], output: str) -> Summary:
+    rows = _table(output)
+    if rows[0] != DF_HEADER:
+        raise ValueError(f"not a human-readable df listing: {' '.join(rows[0])}")
+    filesystems = []
+    for row in rows[1:]:
+        if len(row) < 6:
+            raise ValueError(f"unexpected df row: {row}")
+        filesystems.append({
+            'filesystem': row[0], 'size': row[1], 'used': row[2], 'available': row[3],
+            'use_percent': _percent(row[4]), 'mounted_on': ' '.join(row[5:]),
+        })
+    if not filesystems:
+        raise ValueError("no filesystems listed")
+
+    # A single row means a path was given; otherwise report the root filesystem
+    main = next((fs for fs in filesystems if fs['mounted_on'] == '/'), filesystems[0])
+    text = (f"You have {main['available']} free on {main['mounted_on']}, "
+            f"out of {main['size']}, which is {main['use_percent']} percent used.")
+    fullest = max(filesystems, key=lambda fs: fs['use_percent'])
+    if fullest is not main and fullest['use_percent'] >= 90:
+        text += f" {fullest['mounted_on']} is almost full at {fullest['use_percent']} percent."
+    return Summary('df', {'filesystems': filesystems}, text)
+
+
+@summarizer('free')
+def summarize_free(argv: List[str], output: str) -> Summary:
+    table = _table(output)
+    header = [column.lower() for column in table[0]]
+    if header[:3] != FREE_HEADER:
+        raise ValueError(f"not a free listing: {' '.join(table[0])}")
+    rows = {row[0].rstrip(':').lower(): row[1:] for row in table[1:]}
+    mem = dict(zip(header, rows['mem']))
+    args = _expand_short_flags(argv)
+    unit = '' if any(arg in ('-h', '--human') for arg in args) else next(
+        (FREE_UNITS[arg] for arg in args if arg in FREE_UNITS), 'KiB')
+    values = {
+        'total': mem['total'], 'used': mem['used'], 'free': mem['free'],
+        # Older procps prints buffers and cache without an available column
+        'available': mem.get('available', mem['free']),
+    }
+    data = {'unit': unit or None, 'memory': values}
+    suffix = f" {unit}" if unit else ''
+    text = f"You have {values['available']}{suffix} of memory available out of {values['total']}{suffix}."
+    if 'swap' in rows:
+        swap = dict(zip(header, rows['swap']))
+        data['swap'] = {'total': swap['total'], 'used': swap['used'], 'free': swap['free']}
+        if swap['used'] not in ('0', '0B'):
+            text += f" {swap['used']}{suffix} of swap is in use."
+    return Summary('free', data, text)
+
+
+@summarizer('uptime')
+def summarize_uptime(argv: List[str], output: str) -> Summary:
+    line = output.strip()
+    if '-p' in argv or '--pretty' in argv:
+        if not line.startswith('up '):
+            raise ValueError(f"unexpected uptime output: {line}")
+        return Summary('uptime', {'up': line[3:]}, f"The system has been {line}.")
+    match = UPTIME_PATTERN.search(line)
+    if not match:
+        raise ValueError(f"unexpected uptime output: {line}")
+    up = match.group('up').strip()
+    # "up 2 days,  3:04" -> "2 days, 3 hours and 4 minutes"
+    parts = [part.strip() for part in up.split(',')]
+    clock = re.fullmatch(r"(\d+):(\d+)", parts[-1])
+    if clock:
+        parts[-1] = f"{int(clock.group(1))} hours and {int(clock.group(2))} minutes"
+    data = {
+        'up': up,
+        'users': int(match.group('users')),
+        'load_average': [float(match.group(key)) for key in ('l1', 'l5', 'l15')],
+    }
+    text = (f"The system has been up for {', '.join(parts)}, with {data['users']} users logged in "
+            f"and a load average of {data['load_average'][0]} over the last minute.")
+    return Summary('uptime', data, text)
+
+
+@summarizer('whoami')
+def summarize_whoami(argv: List[str], output: str) -> Summary:
+    user = output.strip()
+    if not USERNAME_PATTERN.match(user):
+        raise ValueError(f"unexpected whoami output: {user}")
+    return Summary('whoami', {'user': user}, f"You are logged in as {user}.")
+
+
+@summarizer('hostname')
+def summarize_hostname(argv: List[str], output: str) -> Summary:
+    values = output.split()
+    if not values:
+        raise ValueError("empty hostname output")
+    if any(arg in ('-I', '--all-ip-addresses', '-i', '--ip-address') for arg in argv):
+        for value in values:
+            # Raises ValueError for anything that is not an address
+            ipaddress.ip_address(value.split('%')[0])
+        return Summary('hostname', {'addresses': values},
+                       f"This device's IP addresses are {', '.join(values)}.")
+    if len(values) != 1 or not HOSTNAME_PATTERN.match(values[0]):
+        raise ValueError(f"unexpected hostname output: {output.strip()}")
+    return Summary('hostname', {'hostname': values[0]}, f"This device is called {values[0]}.")
+
+
+@summarizer('pwd')
+def summarize_pwd(argv: List[str], output: str) -> Summary:
+    path = output.strip()
+    if not path.startswith('/') or '\n' in path:
+        raise ValueError(f"unexpected pwd output: {path}")
+    return Summary('pwd', {'path': path}, f"The current directory is {path}.")
+
+
+@summarizer('date')
+def summarize_date(argv: List[str], output: str) -> Summary:
+    # A custom format may print anything, so only plain date is summarized
+    if len(argv) > 1 or '\n' in output.strip():
+        raise ValueError("date with arguments")
+    now = output.strip()
+    if not DATE_PATTERN.search(now):
+        raise ValueError(f"unexpected date output: {now}")
+    return Summary('date', {'date': now}, f"It is {now}.")
+
+
+@summarizer('uname')
+def summarize_uname(argv: List[str], output: str) -> Summary:
+    fields = output.split()
+    flags = ''.join(arg.lstrip('-') for arg in argv[1:] if arg.startswith('-') and not arg.startswith('--'))
+    if not fields:
+        raise ValueError("empty uname output")
+    if not all(UNAME_FIELD_PATTERN.match(field) for field in fields[:3]):
+        raise ValueError(f"unexpected uname output: {output.strip()}")
+    if 'a' in flags:
+        data = {'kernel_name': fields[0], 'hostname': fields[1], 'kernel_release': fields[2],
+                'machine': fields[-2] if fields[-1] == 'GNU/Linux' else fields[-1]}
+        return Summary('uname', data, f"You are running {data['kernel_name']} kernel "
+                                      f"{data['kernel_release']} on {data['machine']}.")
+    if len(fields) != 1:
+        raise ValueError(f"unexpected uname output: {output.strip()}")
+    if flags == 'r':
+        return Summary('uname', {'kernel_release': fields[0]}, f"The kernel version is {fields[0]}.")
+    if flags in ('m', 'p', 'i'):
+        return Summary('uname', {'machine': fields[0]}, f"The machine architecture is {fields[0]}.")
+    if flags in ('', 's'):
+        return Summary('uname', {'kernel_name': fields[0]}, f"The operating system kernel is {fields[0]}.")
+    raise ValueError(f"unsupported uname flags: {flags}")
@@ -0,0 +1,90 @@
+import logging
+import re
+import string
+from typing import Dict, List, Optional
+
+# A pair starts at "Question:" and runs until the next "Question:" at the start
+# of a line. Some pairs in context.txt keep the question and answer on one line.
+QA_PATTERN = re.compile(
+    r'Question:\s*(?P<question>.*?)\s*Answer:\s*(?P<answer>.*?)\s*(?=\n\s*Question:|\Z)',
+    re.S
+)
+
+_PUNCTUATION = str.maketrans('', '', string.punctuation.replace("'", ''))
+
+
+def normalize_question(text: str) -> str:
+    """Normalize a question for exact lookups
+
+    Lowercases, drops punctuation (apart from apostrophes) and collapses
+    whitespace, so "How do I check RAM?" and "how do i check ram" match.
+
+    Args:
+        text: Raw question or ASR transcript
+
+    Returns:
+        str: Normalized key
+    """
+    return ' '.join(text.lower().translate(_PUNCTUATION).split())
+
+
+def split_qa_pairs(text: str) -> List[Dict[str, str]]:
+    """Split a Question/Answer formatted document into one record per pair
+
+    Args:
+        text: Contents of a context file such as context.txt
+
+    Returns:
+        List[Dict[str, str]]: Records with 'question', 'answer' and 'text'
+            (the full "Question: ...\\nAnswer: ..." passage)
+    """
+    pairs = []
+    for match in QA_PATTERN.finditer(text):
+        question = ' '.join(match.group('question').split())
+        answer = ' '.join(match.group('answer').split())
+        if not question or not answer:
+            continue
+        pairs.append({
+            'question': question,
+            'answer': answer,
+            'text': f"Question: {question}\nAnswer: {answer}",
+        })
+    logging.info(f"Found {len(pairs)} question/answer pairs")
+    return pairs
+
+
+def build_question_lookup(pairs: List[Dict[str, str]]) -> Dict[str, List[int]]:
+    """Build a normalized-question -> pair indices hash map
+
+    Pairs that normalize to the same question are all kept, in order, since
+    they may answer it differently.
+
+    Args:
+        pairs: Records returned by split_qa_pairs
+
+    Returns:
+        Dict[str, List[int]]: Normalized question to positions in pairs
+    """
+    lookup = {}
+    for i, pair in enumerate(pairs):
+        lookup.setdefault(normalize_question(pair['question']), []).append(i)
+    return lookup
+
+
+def lookup_questions(lookup: Dict[str, List[int]], pairs: List[Dict[str, str]],
+                     query: str) -> List[Dict[str, str]]:
+    """Return every pair whose normalized question equals the normalized query
+
+    Args:
+        lookup: Map built by build_question_lookup
+        pairs: Records the lookup indexes into
+        query: User query
+
+    Returns:
+        List[Dict[str, str]]: Matching pairs, empty if there are none
+    """
+    indices = lookup.get(normalize_question(query), [])
+    if isinstance(indices, int):
+        # Lookups saved before duplicate questions were kept
+        indices = [indices]
+    return [pairs[i] for i in indices]
@@ -1,74 +1,380 @@
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Tuple, Union
 import numpy as np
 import json
 import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 load_dotenv()
 from langchain_community.vectorstores import FAISS
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from qa_chunking import lookup_questions
+from context_assembly import assemble_context, ContextStats
+from config import RAG_CONTEXT_TOKEN_BUDGET, RAG_MAX_PASSAGES, RAG_MAX_SCORE_GAP, GEMINI_BASE_URL
+from metrics import metrics
+from resilience import ResilientEmbeddings
+
+# Files whose modification marks a rebuilt index
+INDEX_FILES = ('index.faiss', 'index.pkl', 'passages.json', 'qa_pairs.json')
+
+
+def gemini_embeddings() -> Embeddings:
+    """Gemini embedding-001, rate limited and retried by resilience.py
+
+    Requests go to GEMINI_BASE_URL over REST when it is set.
+    """
+    if GEMINI_BASE_URL:
+        embeddings = GoogleGenerativeAIEmbeddings(
+            model="models/embedding-001",
+            transport="rest",
+            client_options={"api_endpoint": GEMINI_BASE_URL},
+        )
+    else:
+        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+    return ResilientEmbeddings(embeddings, 'gemini-embedding')
+
+
+@dataclass
+class IndexSnapshot:
+    """Everything loaded from one version of the embeddings directory
+
+    Snapshots are never modified after loading; a reload builds a new one and
+    swaps the reference, so queries in flight keep a consistent view.
+    """
+    vectorstore: Optional[FAISS] = None
+    passages: list = field(default_factory=list)
+    qa_pairs: list = field(default_factory=list)
+    question_lookup: dict = field(default_factory=dict)
+    version: Optional[str] = None
+    load_seconds: float = 0.0
+    loaded_at: Optional[float] = None
+
 
 class RAGService:
-    def __init__(self, embeddings_dir: str):
+    def __init__(self, embeddings_dir: str, use_question_lookup: bool = True,
+                 token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+                 max_passages: int = RAG_MAX_PASSAGES,
+                 max_score_gap: Optional[float] = RAG_MAX_SCORE_GAP,
+                 embedding_model: Optional[Embeddings] = None):
         """Initialize RAG service to use existing embeddings
         
         Args:
             embeddings_dir: Directory containing the FAISS index and passages
+            use_question_lookup: Answer near-exact question matches from the
+                Q/A lookup table without running a vector search
+            token_budget: Maximum estimated tokens of context per query
+            max_passages: Number of candidate passages retrieved per query
+            max_score_gap: Drop candidates whose distance exceeds the best
+                match by more than this (None keeps all candidates)
+            embedding_model: Embeddings the index was built with (defaults
+                to Gemini embedding-001)
         """
         self.embeddings_dir = embeddings_dir
-        self.vectorstore = None
-        self.embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        self.passages = []
+        self.embedding_model = embedding_model or gemini_embeddings()
+        self.use_question_lookup = use_question_lookup
+        self._snapshot = IndexSnapshot()
+        self._load_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop_watching = threading.Event()
+        self._watcher = None
+        self._query_embeddings = OrderedDict()
+        self._query_embeddings_size = 256
+        self._query_embeddings_lock = threading.Lock()
+        self.token_budget = token_budget
+        self.max_passages = max_passages
+        self.max_score_gap = max_score_gap
+        self.last_context_stats = ContextStats()
+        
+    @property
+    def vectorstore(self) -> Optional[FAISS]:
+        return self._snapshot.vectorstore
+    
+    @property
+    def passages(self) -> list:
+        return self._snapshot.passages
+    
+    @property
+    def qa_pairs(self) -> list:
+        return self._snapshot.qa_pairs
+    
+    @property
+    def question_lookup(self) -> dict:
+        return self._snapshot.question_lookup
+    
+    @property
+    def index_version(self) -> Optional[str]:
+        """Version of the index currently answering queries"""
+        return self._snapshot.version
+    
+    @property
+    def is_ready(self) -> bool:
+        """Whether an index has been loaded"""
+        return self._ready.is_set()
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until an index is loaded or the timeout expires"""
+        return self._ready.wait(timeout)
+        
+    def _index_signature(self) -> Optional[str]:
+        """Fingerprint of the index files' sizes and modification times"""
+        parts = []
+        for name in INDEX_FILES:
+            path = os.path.join(self.embeddings_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+        if not parts:
+            return None
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:12]
         
     def load_index(self) -> bool:
         """Load existing FAISS index and passages
         
+        The new index replaces the current one in a single reference swap,
+        so it is safe to call while queries are running.
+        
         Returns:
             bool: True if loading was successful, False otherwise
         """
-        try:
-            # Load the vector store
-            self.vectorstore = FAISS.load_local(
-                self.embeddings_dir,
-                self.embedding_model,
-                allow_dangerous_deserialization=True
-            )
-            
-            # Load raw passages
-            passages_path = os.path.join(self.embeddings_dir, 'passages.json')
-            with open(passages_path, 'r') as f:
-                self.passages = json.load(f)
+        with self._load_lock:
+            start = time.perf_counter()
+            version = self._index_signature()
+            try:
+                # Load the vector store
+                vectorstore = FAISS.load_local(
+                    self.embeddings_dir,
+                    self.embedding_model,
+                    allow_dangerous_deserialization=True
+                )
+                
+                # Load raw passages
+                passages_path = os.path.join(self.embeddings_dir, 'passages.json')
+                with open(passages_path, 'r') as f:
+                    passages = json.load(f)
                 
-            logging.info(f"Loaded existing index from {self.embeddings_dir}")
+                # Load the Q/A lookup table if the index was built from Q/A pairs
+                qa_pairs, question_lookup = [], {}
+                qa_path = os.path.join(self.embeddings_dir, 'qa_pairs.json')
+                if os.path.exists(qa_path):
+                    with open(qa_path, 'r') as f:
+                        qa_data = json.load(f)
+                    qa_pairs = qa_data['pairs']
+                    question_lookup = qa_data['lookup']
+                    logging.info(f"Loaded {len(question_lookup)} questions for exact lookup")
+                    
+            except Exception as e:
+                logging.error(f"Error loading index or passages: {e}")
+                metrics.incr('rag.index_load_failed')
+                return False
+            
+            load_seconds = time.perf_counter() - start
+            self._snapshot = IndexSnapshot(
+                vectorstore, passages, qa_pairs, question_lookup,
+                version, load_seconds, time.time()
+            )
+            self._ready.set()
+            metrics.observe('rag.index_load_seconds', load_seconds)
+            metrics.incr('rag.index_loads')
+            logging.info(f"Loaded index version {version} from {self.embeddings_dir} in {load_seconds:.2f}s")
             return True
+        
+    def start_background_load(self) -> threading.Thread:
+        """Load the index on a background thread
+        
+        Queries issued before it finishes are answered without context.
+        """
+        thread = threading.Thread(target=self.load_index, name='rag-index-load', daemon=True)
+        thread.start()
+        return thread
+        
+    def start_watching(self, interval: float = 5.0) -> None:
+        """Reload the index whenever the files in embeddings_dir change
+        
+        A change is picked up once the files have stayed the same for one
+        polling interval, so a rebuild in progress is not loaded half-written.
+        
+        Args:
+            interval: Seconds between polls
+        """
+        if self._watcher is not None:
+            return
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name='rag-index-watch', daemon=True)
+        self._watcher.start()
+        
+    def stop_watching(self) -> None:
+        """Stop the index watcher thread"""
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        
+    def _watch(self, interval: float) -> None:
+        pending = None
+        while not self._stop_watching.wait(interval):
+            signature = self._index_signature()
+            if signature is None or signature == self._snapshot.version:
+                pending = None
+                continue
+            if signature != pending:
+                # Wait one more interval for the rebuild to finish writing
+                pending = signature
+                continue
+            logging.info(f"Index files changed, reloading (version {signature})")
+            if self.load_index():
+                metrics.incr('rag.index_reloads')
+            pending = None
+        
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing the vector if the same query was seen recently
+        
+        Args:
+            query: The query text
             
-        except Exception as e:
-            logging.error(f"Error loading index or passages: {e}")
-            return False
+        Returns:
+            List[float]: Query embedding
+        """
+        return self.embed_queries([query])[0]
         
-    def get_relevant_context(self, query: str, k: int = 3) -> str:
-        """Retrieve relevant context for a given query
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed many queries, sending only the uncached ones in a single call
+        
+        Args:
+            queries: Query texts
+            
+        Returns:
+            List[List[float]]: One embedding per query, in order
+        """
+        embeddings = {}
+        with self._query_embeddings_lock:
+            for query in queries:
+                if query in self._query_embeddings:
+                    self._query_embeddings.move_to_end(query)
+                    embeddings[query] = self._query_embeddings[query]
+        missing = list(dict.fromkeys(query for query in queries if query not in embeddings))
+        
+        if len(missing) == 1:
+            embeddings[missing[0]] = self.embedding_model.embed_query(missing[0])
+        elif missing:
+            if hasattr(self.embedding_model, 'embed_queries'):
+                vectors = self.embedding_model.embed_queries(missing)
+            elif isinstance(self.embedding_model, GoogleGenerativeAIEmbeddings):
+                vectors = self.embedding_model.embed_documents(missing, task_type="retrieval_query")
+            else:
+                vectors = [self.embedding_model.embed_query(query) for query in missing]
+            embeddings.update(zip(missing, vectors))
+        
+        if missing:
+            with self._query_embeddings_lock:
+                for query in missing:
+                    self._query_embeddings[query] = embeddings[query]
+                while len(self._query_embeddings) > self._query_embeddings_size:
+                    self._query_embeddings.popitem(last=False)
+        return [embeddings[query] for query in queries]
+        
+    def clear_query_cache(self) -> None:
+        """Forget cached query embeddings"""
+        with self._query_embeddings_lock:
+            self._query_embeddings.clear()
+        
+    def retrieve(self, query: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Retrieve ranked passages for a query
         
         Args:
             query: The query text
-            k: Number of relevant passages to retrieve
+            k: Number of passages to retrieve (defaults to max_passages)
             
         Returns:
-            str: Combined relevant passages as context
+            List[Tuple[str, float]]: (passage, L2 distance) pairs, best first;
+                an exact question match is returned alone with distance 0.0,
+                and nothing is returned while the index is still loading
+        """
+        return self.get_relevant_contexts([query], k)[0]
+        
+    def get_relevant_contexts(self, queries: List[str], k: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        """Retrieve ranked passages for many queries at once
+        
+        Uncached queries are embedded in one batched call and searched with a
+        single vectorized FAISS search.
+        
+        Args:
+            queries: Query texts, e.g. n-best ASR hypotheses
+            k: Number of passages per query (defaults to max_passages)
             
-        Raises:
-            ValueError: If index hasn't been loaded
+        Returns:
+            List[List[Tuple[str, float]]]: Per query, (passage, L2 distance)
+                pairs best first, as for retrieve()
         """
-        if self.vectorstore is None:
-            raise ValueError("Index not loaded. Call load_index() first.")
+        # Use one snapshot for the whole batch even if a reload swaps it
+        snapshot = self._snapshot
+        if snapshot.vectorstore is None:
+            logging.warning("Index not loaded yet, continuing without context")
+            metrics.incr('rag.not_ready', len(queries))
+            return [[] for _ in queries]
+        
+        results = [None] * len(queries)
+        # Near-exact question matches skip the vector search entirely
+        if self.use_question_lookup and snapshot.question_lookup:
+            for i, query in enumerate(queries):
+                pairs = lookup_questions(snapshot.question_lookup, snapshot.qa_pairs, query)
+                if pairs:
+                    logging.debug(f"Exact question match for: {query} ({len(pairs)} pairs)")
+                    results[i] = [(pair['text'], 0.0) for pair in pairs]
+        
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            vectors = np.asarray(self.embed_queries([queries[i] for i in pending]), dtype=np.float32)
+            vectorstore = snapshot.vectorstore
+            distances, indices = vectorstore.index.search(vectors, k or self.max_passages)
+            for i, row_distances, row_indices in zip(pending, distances, indices):
+                results[i] = [
+                    (vectorstore.docstore.search(vectorstore.index_to_docstore_id[j]).page_content, float(distance))
+                    for distance, j in zip(row_distances, row_indices) if j != -1
+                ]
+        return results
+        
+    def get_context_with_stats(self, query: str, k: Optional[int] = None) -> Tuple[str, ContextStats]:
+        """Retrieve context for a query along with its assembly statistics
+        
+        Safe to call from worker threads, unlike reading last_context_stats.
+        
+        Args:
+            query: The query text
+            k: Maximum number of passages to retrieve (defaults to max_passages)
             
-        # Get relevant documents
-        docs = self.vectorstore.similarity_search(query, k=k)
+        Returns:
+            Tuple[str, ContextStats]: Combined passages and what assembly kept
+        """
+        # Deduplicate overlapping chunks and pack them into the token budget
+        return assemble_context(
+            self.retrieve(query, k),
+            self.token_budget,
+            self.max_score_gap
+        )
+        
+    def get_relevant_context(self, query: str, k: Optional[int] = None) -> str:
+        """Retrieve relevant context for a given query
         
-        # Extract and combine the content
-        context = "\n\n".join([doc.page_content for doc in docs])
+        Candidates are deduplicated, cut at the score gap and packed into the
+        token budget, so fewer than k passages may be returned.
         
+        Args:
+            query: The query text
+            k: Maximum number of passages to retrieve (defaults to max_passages)
+            
+        Returns:
+            str: Combined relevant passages as context, empty while the
+                index is still loading
+        """
+        context, self.last_context_stats = self.get_context_with_stats(query, k)
         return context
 
 if __name__ == "__main__":
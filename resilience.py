@@ -0,0 +1,380 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+from config import (
+    GEMINI_REQUESTS_PER_MINUTE, GEMINI_EMBEDDING_REQUESTS_PER_MINUTE, GROQ_REQUESTS_PER_MINUTE,
+    LOCAL_LLM_REQUESTS_PER_MINUTE, RETRY_MAX_ATTEMPTS, RETRY_BACKOFF_SECONDS, RETRY_BACKOFF_MAX_SECONDS,
+    RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN, RETRY_BUDGET_WINDOW_SECONDS,
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS
+)
+from metrics import metrics
+
+T = TypeVar('T')
+
+# Requests per minute by provider; providers not listed are not rate limited
+REQUESTS_PER_MINUTE = {
+    'gemini': GEMINI_REQUESTS_PER_MINUTE,
+    'gemini-embedding': GEMINI_EMBEDDING_REQUESTS_PER_MINUTE,
+    'groq': GROQ_REQUESTS_PER_MINUTE,
+    'local': LOCAL_LLM_REQUESTS_PER_MINUTE,
+}
+# Throttling, overload and server errors; other 4xx responses will not succeed on a retry
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Gauge values of CircuitBreaker.state
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of an SDK or httpx error, looking through chained causes"""
+    while error is not None:
+        for candidate in (getattr(error, 'status_code', None),
+                          getattr(getattr(error, 'response', None), 'status_code', None),
+                          getattr(error, 'code', None)):
+            if isinstance(candidate, int):
+                return candidate
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call may succeed if repeated: timeouts, connection errors, 429 and 5xx"""
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    while error is not None:
+        if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After header), if any"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    try:
+        return float(headers.get('retry-after')) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket: a steady request rate with short bursts"""
+
+    def __init__(self, requests_per_minute: float, burst_seconds: float = 10.0):
+        """Initialize a full bucket
+
+        Args:
+            requests_per_minute: Sustained rate; 0 or less disables limiting
+            burst_seconds: Bucket size, as seconds' worth of the rate (at least one request)
+        """
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Going negative queues callers behind each other instead of letting them race
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+
+class RetryBudget:
+    """Caps retries across all providers at a share of recent calls
+
+    Keeps a retry storm from multiplying the load on a provider that is
+    already failing: once the budget is spent, failures surface at once.
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, minimum: int = RETRY_BUDGET_MIN,
+                 window_seconds: float = RETRY_BUDGET_WINDOW_SECONDS):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window_seconds = window_seconds
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        for events in (self._calls, self._retries):
+            while events and events[0] < now - self.window_seconds:
+                events.popleft()
+
+    def record_call(self) -> None:
+        """Count a first attempt"""
+        with self._lock:
+            self._calls.append(time.monotonic())
+
+    def try_retry(self) -> bool:
+        """Spend one retry if the budget allows it"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if len(self._retries) >= self.minimum + self.ratio * len(self._calls):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker:
+    """Fails fast while a provider keeps failing
+
+    After failure_threshold consecutive retryable failures the circuit opens
+    and calls are rejected for reset_seconds; then a single trial call is let
+    through (half open), which closes the circuit on success or reopens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+        metrics.set_gauge(f'resilience.{name}.breaker_state', BREAKER_STATES['closed'])
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.reset_seconds:
+            return 'open'
+        return 'half_open'
+
+    def _set_state(self, state: str) -> None:
+        metrics.set_gauge(f'resilience.{self.name}.breaker_state', BREAKER_STATES[state])
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                self._set_state('half_open')
+                return True
+        metrics.incr(f'resilience.{self.name}.breaker_rejected')
+        return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logging.info(f"{self.name} circuit closed")
+                self._set_state('closed')
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    metrics.incr(f'resilience.{self.name}.breaker_opened')
+                    logging.warning(f"{self.name} circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+                self._set_state('open')
+
+    def release(self) -> None:
+        """Let another trial through if this one ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            self._trial_running = False
+
+
+class ProviderGuard:
+    """Rate limit, retries and circuit breaker for one provider"""
+
+    def __init__(self, name: str, requests_per_minute: float = 0, budget: Optional[RetryBudget] = None,
+                 max_attempts: int = RETRY_MAX_ATTEMPTS):
+        """Initialize the guard
+
+        Args:
+            name: Provider name, used in log messages and metric names
+            requests_per_minute: Rate limit; 0 disables it
+            budget: Retry budget, shared across providers by default
+            max_attempts: Attempts per call, including the first
+        """
+        self.name = name
+        self.bucket = TokenBucket(requests_per_minute)
+        self.breaker = CircuitBreaker(name)
+        self.budget = budget or retry_budget
+        self.max_attempts = max_attempts
+
+    def _before_attempt(self) -> float:
+        """Check the circuit and return the rate limiter's wait in seconds"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        wait = self.bucket.reserve()
+        if wait > 0:
+            metrics.incr(f'resilience.{self.name}.rate_limited')
+            metrics.observe(f'resilience.{self.name}.rate_wait_seconds', wait)
+        return wait
+
+    def _after_failure(self, error: Exception, attempt: int) -> Optional[float]:
+        """Record a failure and return the backoff before the next attempt, or None to give up"""
+        if not is_retryable(error):
+            # The provider answered; the request itself was bad
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        metrics.incr(f'resilience.{self.name}.failure')
+        if self.breaker.state == 'open':
+            # Retrying would only be rejected; fail now so the caller can reroute
+            return None
+        if attempt + 1 >= self.max_attempts:
+            metrics.incr(f'resilience.{self.name}.retry_exhausted')
+            return None
+        if not self.budget.try_retry():
+            metrics.incr(f'resilience.{self.name}.retry_budget_exhausted')
+            logging.warning(f"Retry budget exhausted, not retrying {self.name}")
+            return None
+        metrics.incr(f'resilience.{self.name}.retry')
+        backoff = min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** attempt)
+        # Full jitter spreads retries from concurrent callers
+        delay = max(retry_after(error) or 0.0, random.uniform(0, backoff))
+        logging.warning(f"{self.name} call failed ({error}), retrying in {delay:.2f}s")
+        return delay
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Call fn under the rate limit, retrying retryable failures
+
+        Raises:
+            CircuitOpenError: If the provider's circuit is open
+        """
+        self.budget.record_call()
+        for attempt in range(self.max_attempts):
+            wait = self._before_attempt()
+            try:
+                # Inside the try, so an interrupted wait releases a half-open trial
+                time.sleep(wait)
+                result = fn()
+            except Exception as e:
+                delay = self._after_failure(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, make_call: Callable[[], Awaitable[T]],
+                    retry_if: Callable[[], bool] = lambda: True) -> T:
+        """Async call: await make_call() under the rate limit, retrying retryable failures
+
+        Args:
+            make_call: Returns a new awaitable for each attempt
+            retry_if: Checked before each retry, e.g. to stop once output was streamed
+
+        Raises:
+            CircuitOpenError: If the provider's circuit is open
+        """
+        self.budget.record_call()
+        for attempt in range(self.max_attempts):
+            wait = self._before_attempt()
+            try:
+                # Inside the try, so a call cancelled while rate limited releases a half-open trial
+                await asyncio.sleep(wait)
+                result = await make_call()
+            except Exception as e:
+                delay = self._after_failure(e, attempt)
+                if delay is None or not retry_if():
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+
+# Shared by every provider, so a widespread outage cannot multiply traffic
+retry_budget = RetryBudget()
+_guards: Dict[str, ProviderGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def guard(name: str) -> ProviderGuard:
+    """The process-wide guard of a provider, created on first use"""
+    with _guards_lock:
+        if name not in _guards:
+            _guards[name] = ProviderGuard(name, REQUESTS_PER_MINUTE.get(name, 0))
+        return _guards[name]
+
+
+def resilience_stats() -> Dict[str, dict]:
+    """Circuit state, failures, retries and rate limiting per provider"""
+    with _guards_lock:
+        names = list(_guards)
+    return {
+        name: {
+            'state': _guards[name].breaker.state,
+            **{
+                outcome: metrics.counter(f'resilience.{name}.{outcome}')
+                for outcome in ('failure', 'retry', 'retry_exhausted', 'retry_budget_exhausted',
+                                'breaker_opened', 'breaker_rejected', 'rate_limited')
+            },
+        }
+        for name in names
+    }
+
+
+class ResilientEmbeddings(Embeddings):
+    """Embeddings whose remote calls go through a provider guard"""
+
+    def __init__(self, inner: Embeddings, name: str = 'gemini-embedding'):
+        """Initialize the wrapper
+
+        Args:
+            inner: Remote embedding backend
+            name: Guard to use; its rate limit comes from REQUESTS_PER_MINUTE
+        """
+        self.inner = inner
+        self.name = name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return guard(self.name).call(lambda: self.inner.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return guard(self.name).call(lambda: self.inner.embed_query(text))
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries in one guarded batch request, for RAGService.embed_queries"""
+        if hasattr(self.inner, 'embed_queries'):
+            batch = lambda: self.inner.embed_queries(texts)
+        elif isinstance(self.inner, GoogleGenerativeAIEmbeddings):
+            batch = lambda: self.inner.embed_documents(texts, task_type="retrieval_query")
+        else:
+            batch = lambda: [self.inner.embed_query(text) for text in texts]
+        return guard(self.name).call(batch)
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+from output_compaction import CompactionStats, OutputCompactor
+
+# Run scripts without network, sound, GPU, root or access to the real home directory
+FIREJAIL_ARGS = [
+    'firejail',
+    '--noprofile',
+    '--quiet',
+    '--private',
+    '--noroot',
+    '--net=none',
+    '--nosound',
+    '--no3d',
+]
+
+
+def execute_in_sandbox(script_content: str, timeout: Optional[float] = None) -> Tuple[str, CompactionStats, int]:
+    """Run a script under firejail
+
+    Args:
+        script_content: Bash script to run
+        timeout: Seconds after which the script is killed (None waits indefinitely)
+
+    Returns:
+        Tuple[str, CompactionStats, int]: Compacted stdout (stderr if the
+            script failed), its size before and after compaction, and the
+            exit status
+    """
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as temp_file:
+        temp_file.write(script_content)
+        temp_file_path = temp_file.name
+
+    try:
+        process = subprocess.Popen(
+            FIREJAIL_ARGS + ['bash', temp_file_path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace'
+        )
+        killer = threading.Timer(timeout, process.kill) if timeout else None
+        if killer is not None:
+            killer.start()
+
+        # Compact while reading, so a huge output is never held in memory
+        stdout, stderr = OutputCompactor(), OutputCompactor()
+
+        def drain(pipe, compactor):
+            for line in pipe:
+                compactor.feed_line(line.rstrip('\n'))
+
+        stderr_reader = threading.Thread(target=drain, args=(process.stderr, stderr), daemon=True)
+        stderr_reader.start()
+        drain(process.stdout, stdout)
+        stderr_reader.join()
+        returncode = process.wait()
+        if killer is not None:
+            killer.cancel()
+        compactor = stdout if returncode == 0 else stderr
+        return compactor.result(), compactor.stats, returncode
+    finally:
+        os.unlink(temp_file_path)
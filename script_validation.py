@@ -0,0 +1,559 @@
+import hashlib
+import json
+import logging
+import posixpath
+import re
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from bash_ast import (
+    ASSIGNMENT_PATTERN, NAME_PATTERN, BashSyntaxError, Compound, SimpleCommand, Word, analyze, function_names,
+    iter_nodes
+)
+from config import SHELLCHECK_TIMEOUT_SECONDS, SHELLCHECK_CACHE_SIZE, SHELLCHECK_WORKERS
+from metrics import metrics
+
+# Part of the command cache fingerprint; bump it when the policy changes so
+# scripts validated under the old policy are not reused
+POLICY_VERSION = 'ast-3'
+# Builtins and keywords that cannot run another program, so are always allowed
+SHELL_BUILTINS = frozenset({
+    ':', '[', 'test', 'true', 'false', 'printf', 'cd', 'read', 'export', 'local', 'declare', 'typeset',
+    'readonly', 'unset', 'shift', 'set', 'return', 'break', 'continue', 'let', 'wait', 'getopts',
+})
+# Variables that change which program or code a later command runs
+PROTECTED_VARIABLES = frozenset({
+    'PATH', 'LD_PRELOAD', 'LD_LIBRARY_PATH', 'LD_AUDIT', 'BASH_ENV', 'ENV', 'IFS', 'PROMPT_COMMAND', 'PS4',
+    'SHELLOPTS', 'BASHOPTS', 'GLOBIGNORE',
+})
+# Builtins whose arguments can be assignments
+DECLARATION_BUILTINS = frozenset({'export', 'local', 'declare', 'typeset', 'readonly'})
+# Builtins that set variables named in their arguments: the options that take
+# a value, the options whose value is a variable name, and the operands that are
+SETTING_BUILTINS = {
+    'read': ('adinNptu', 'a', slice(None)),
+    'printf': ('v', 'v', slice(0)),
+    'mapfile': ('dnOsuCc', '', slice(None)),
+    'readarray': ('dnOsuCc', '', slice(None)),
+    'getopts': ('', '', slice(1, 2)),
+}
+# Variables bash itself keeps as integers, safe to use in arithmetic
+INTEGER_VARIABLES = frozenset({
+    'RANDOM', 'SECONDS', 'LINENO', 'BASHPID', 'PPID', 'UID', 'EUID', 'EPOCHSECONDS', 'SRANDOM', 'OPTIND', 'COLUMNS',
+    'LINES',
+})
+# [[ ]] operators whose operands are evaluated as arithmetic
+ARITHMETIC_TEST_OPERATORS = frozenset({'-eq', '-ne', '-lt', '-le', '-gt', '-ge'})
+INTEGER_PATTERN = re.compile(r"-?\d+")
+INTEGER_RANGE_PATTERN = re.compile(r"\{-?\d+\.\.-?\d+(?:\.\.-?\d+)?\}")
+# Variable names in an arithmetic expression, skipping ${#name}, base#digits and 0x digits
+ARITHMETIC_NAME_PATTERN = re.compile(r"(?<![\w#])[A-Za-z_][A-Za-z0-9_]*")
+ARITHMETIC_LENGTH_PATTERN = re.compile(r"\$\{#[^}]*\}")
+# Names an arithmetic expression assigns to, which always hold integers afterwards
+ARITHMETIC_TARGET_PATTERN = re.compile(
+    r"([A-Za-z_][A-Za-z0-9_]*)\s*(?:\[[^\]]*\])?\s*(?:(?:[-+*/%&|^]|<<|>>)?=(?!=)|\+\+|--)"
+    r"|(?:\+\+|--)\s*([A-Za-z_][A-Za-z0-9_]*)"
+)
+SUBSCRIPTED_NAME_PATTERN = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)(?:\[(.*)\])?", re.DOTALL)
+# Protected variables a command may be given for its own run: the assignment
+# neither outlives the command nor changes which program runs
+COMMAND_SCOPED_VARIABLES = {'read': frozenset({'IFS'})}
+# Whitelisted commands may be named by their path in one of these directories
+SYSTEM_BIN_DIRECTORIES = frozenset({'/bin', '/usr/bin', '/sbin', '/usr/sbin', '/usr/local/bin'})
+# Commands that run the command given in their arguments, with the options that take a separate value
+COMMAND_WRAPPERS = {
+    'sudo': {'-u', '-g', '-C', '-D', '-h', '-p', '-r', '-t', '-U', '-T', '--user', '--group', '--host',
+             '--prompt', '--role', '--type', '--other-user', '--chdir', '--close-from', '--command-timeout'},
+    'xargs': {'-I', '-n', '-P', '-d', '-L', '-s', '-E', '-a', '--max-args', '--max-procs', '--delimiter',
+              '--arg-file', '--max-lines', '--max-chars', '--eof', '--process-slot-var'},
+    'time': {'-f', '-o', '--format', '--output'},
+    'nice': {'-n', '--adjustment'},
+    'nohup': set(),
+    'env': {'-u', '--unset', '-C', '--chdir'},
+    'timeout': {'-s', '--signal', '-k', '--kill-after'},
+    'stdbuf': {'-i', '-o', '-e'},
+    'ionice': {'-c', '-n', '-p', '--class', '--classdata'},
+    'command': set(),
+    'exec': {'-a'},
+    'watch': {'-n', '-d', '--interval'},
+}
+# Positional arguments a wrapper takes before the command (timeout's duration)
+WRAPPER_POSITIONALS = {'timeout': 1}
+# sudo options that start a shell when no command follows
+SUDO_SHELL_OPTIONS = frozenset({'-s', '-i', '--shell', '--login'})
+FIND_EXEC_ACTIONS = frozenset({'-exec', '-execdir', '-ok', '-okdir'})
+# su -c is parsed as a script; deeper nesting is refused
+MAX_SU_DEPTH = 3
+
+
+@dataclass
+class PolicyViolation:
+    """A command or assignment in a script that the whitelist does not allow"""
+    command: str
+    reason: str
+
+    def __str__(self) -> str:
+        return self.reason
+
+
+class _PolicyChecker:
+    """Checks every command of a parsed script against the whitelist"""
+
+    def __init__(self, allowed_commands: Iterable[str], functions: Iterable[str] = (), depth: int = 0):
+        self.allowed = set(allowed_commands)
+        self.functions: Set[str] = set(functions)
+        self.depth = depth
+        self.violations: List[PolicyViolation] = []
+        # Arithmetic the script evaluates, and whether each variable is only ever set to integers
+        self.arithmetic: List[str] = []
+        self.integers: Dict[str, bool] = {}
+        self.integer_declared: Set[str] = set()
+        self.assigned: List[Tuple[str, str]] = []
+
+    def _flag(self, command: str, reason: str) -> None:
+        self.violations.append(PolicyViolation(command, reason))
+
+    def check_script(self, script_content: str) -> List[PolicyViolation]:
+        try:
+            script = analyze(script_content)
+        except BashSyntaxError as e:
+            # Fail closed: a script that cannot be parsed cannot be checked
+            self._flag('', f"the script could not be parsed ({e})")
+            return self.violations
+        self.functions.update(function_names(script.tree))
+        for text in script.indirections:
+            self._flag(text, f"'{text}' uses a variable's value as a name or expands it when the script runs")
+        self.arithmetic.extend(script.arithmetic)
+        for node in iter_nodes(script.tree):
+            if isinstance(node, SimpleCommand):
+                scoped = COMMAND_SCOPED_VARIABLES.get(node.words[0].value, ()) if node.words else ()
+                for assignment in node.assignments:
+                    self._check_assignment(assignment, scoped)
+                if node.words:
+                    self._check_command(node.words)
+            elif isinstance(node, Compound):
+                self._check_compound(node)
+        self._check_arithmetic()
+        return self.violations
+
+    def _check_assignment(self, word: Word, scoped: Iterable[str] = ()) -> None:
+        match = ASSIGNMENT_PATTERN.match(word.text)
+        if not match:
+            return
+        name = match.group(1)
+        if name in PROTECTED_VARIABLES and name not in scoped:
+            self._flag(name, f"setting {name} is not allowed")
+        subscript = SUBSCRIPTED_NAME_PATTERN.fullmatch(word.text[:match.end()].rstrip('+='))
+        if subscript and subscript.group(2) is not None:
+            self.arithmetic.append(subscript.group(2))
+        value = None if word.value is None else word.value[word.value.index('=') + 1:]
+        self._note_value(name, value)
+        self.assigned.append((name, word.text[match.end():]))
+
+    def _note_value(self, name: str, value: Optional[str]) -> None:
+        """Record a value the script sets a variable to, None if it is computed when the script runs"""
+        integer = value is not None and bool(INTEGER_PATTERN.fullmatch(value))
+        self.integers[name] = self.integers.get(name, True) and integer
+
+    def _check_compound(self, node: Compound) -> None:
+        if node.variable is not None:
+            # Loop items, or the positional parameters without 'in'
+            integers = bool(node.words) and node.kind == 'for' and all(
+                word.value is not None and (
+                    INTEGER_PATTERN.fullmatch(word.value)
+                    or INTEGER_RANGE_PATTERN.fullmatch(word.value) and word.expandable
+                )
+                for word in node.words
+            )
+            self._note_value(node.variable, '0' if integers else None)
+        elif node.kind == 'conditional':
+            for index, word in enumerate(node.words):
+                if word.value in ARITHMETIC_TEST_OPERATORS and word.text == word.value:
+                    self.arithmetic.extend(operand.text for operand in node.words[max(index - 1, 0):index + 2:2])
+
+    def _check_arithmetic(self) -> None:
+        """Refuse arithmetic on command output or on variables that may hold an expression
+
+        Bash expands a variable used in arithmetic and evaluates its value
+        as arithmetic too, including any $(...) in an array subscript, so
+        only variables the script sets to integer literals are safe.
+        """
+        for name in self.integer_declared:
+            self.arithmetic.extend(text for assigned, text in self.assigned if assigned == name)
+            self.integers[name] = True
+        for expression in self.arithmetic:
+            for match in ARITHMETIC_TARGET_PATTERN.finditer(expression):
+                name = match.group(1) or match.group(2)
+                self.integers.setdefault(name, True)
+        flagged = set()
+        for expression in self.arithmetic:
+            if '$(' in expression or '`' in expression:
+                self._flag(expression, f"command output in '{expression.strip()}' is evaluated as arithmetic")
+                continue
+            for name in ARITHMETIC_NAME_PATTERN.findall(ARITHMETIC_LENGTH_PATTERN.sub('', expression)):
+                if name in INTEGER_VARIABLES or self.integers.get(name) or name in flagged:
+                    continue
+                flagged.add(name)
+                self._flag(name, f"'{name}' is evaluated as arithmetic but the script does not only set it to integers")
+
+    def _check_variable(self, name: Optional[str], text: str, action: str = 'setting') -> None:
+        """Flag a variable name given to a builtin that is protected or computed when the script runs"""
+        if name is None:
+            self._flag(text, f"the variable name '{text}' is computed when the script runs")
+            return
+        match = SUBSCRIPTED_NAME_PATTERN.fullmatch(name)
+        if not match:
+            self._flag(name, f"'{name}' is not a variable name")
+            return
+        name, subscript = match.groups()
+        if subscript is not None:
+            self.arithmetic.append(subscript)
+        if name in PROTECTED_VARIABLES:
+            self._flag(name, f"{action} {name} is not allowed")
+        if action == 'setting':
+            self._note_value(name, None)
+
+    @staticmethod
+    def _split_options(arguments: Sequence[Word],
+                       takes_value: str) -> Tuple[List[Tuple[str, Optional[str], str]], Sequence[Word]]:
+        """Split a builtin's arguments into options and operands
+
+        Returns:
+            Tuple: (flag, value, value text) for each option, with a value of
+                None if it is computed when the script runs, and the operands
+        """
+        options = []
+        index = 0
+        while index < len(arguments):
+            value = arguments[index].value
+            if value == '--':
+                index += 1
+                break
+            if value is None or arguments[index].expandable or len(value) < 2 or value[0] not in '-+':
+                break
+            for position, flag in enumerate(value[1:], 2):
+                if flag not in takes_value:
+                    options.append((flag, None, ''))
+                    continue
+                if position < len(value):
+                    options.append((flag, value[position:], value[position:]))
+                elif index + 1 < len(arguments):
+                    index += 1
+                    word = arguments[index]
+                    options.append((flag, None if word.expandable else word.value, word.text))
+                break
+            index += 1
+        return options, arguments[index:]
+
+    def _check_declaration(self, arguments: Sequence[Word]) -> None:
+        """Check the variables export, local, declare and the like set, unexport or refer to"""
+        options, operands = self._split_options(arguments, '')
+        flags = {flag for flag, _, _ in options}
+        if flags & {'f', 'F'}:
+            # Operands name functions
+            return
+        if 'i' in flags:
+            self.integer_declared.update(
+                (ASSIGNMENT_PATTERN.match(word.text) or NAME_PATTERN.fullmatch(word.text) or [word.text])[0].rstrip('+=')
+                for word in operands
+            )
+        for word in operands:
+            match = ASSIGNMENT_PATTERN.match(word.text)
+            if match:
+                self._check_assignment(word)
+                if 'n' in flags:
+                    target = None if word.value is None else word.value[match.end():]
+                    self._check_variable(target, word.text, 'a reference to')
+            else:
+                self._check_variable(None if word.expandable else word.value, word.text, 'declaring')
+
+    def _check_setting_builtin(self, name: str, arguments: Sequence[Word]) -> None:
+        """Check the variables read, printf -v, mapfile and getopts assign to"""
+        takes_value, name_options, name_operands = SETTING_BUILTINS[name]
+        options, operands = self._split_options(arguments, takes_value)
+        for flag, value, text in options:
+            if flag in name_options:
+                self._check_variable(value, text)
+        for word in operands[name_operands]:
+            self._check_variable(None if word.expandable else word.value, word.text)
+
+    def _command_name(self, word: Word) -> Optional[str]:
+        """The whitelisted name a command word runs, flagging it if there is none"""
+        if word.value is None or word.expandable:
+            self._flag(word.text, f"the command name '{word.text}' is computed when the script runs")
+            return None
+        name = word.value
+        if '/' in name:
+            directory, base = posixpath.split(posixpath.normpath(name))
+            if directory not in SYSTEM_BIN_DIRECTORIES or base not in self.allowed:
+                self._flag(name, f"'{name}' is not a whitelisted command in a system directory")
+                return None
+            return base
+        if name in self.functions or name in SHELL_BUILTINS:
+            return name
+        if name not in self.allowed:
+            self._flag(name, f"'{name}' is not in the whitelist of allowed commands.")
+            return None
+        return name
+
+    def _check_command(self, words: Sequence[Word]) -> None:
+        name = self._command_name(words[0])
+        if name is None:
+            return
+        arguments = words[1:]
+        if name in DECLARATION_BUILTINS:
+            self._check_declaration(arguments)
+        elif name in SETTING_BUILTINS:
+            self._check_setting_builtin(name, arguments)
+        elif name == 'let':
+            self.arithmetic.extend(word.text for word in arguments)
+        elif name == 'unset':
+            options, operands = self._split_options(arguments, '')
+            if 'f' not in {flag for flag, _, _ in options}:
+                for word in operands:
+                    self._check_variable(None if word.expandable else word.value, word.text, 'unsetting')
+        if name in COMMAND_WRAPPERS:
+            self._check_wrapped(name, arguments)
+        elif name == 'su':
+            self._check_su(arguments)
+        elif name == 'find':
+            self._check_find(arguments)
+
+    def _check_wrapped(self, name: str, arguments: Sequence[Word]) -> None:
+        """Check the command run by sudo, xargs, env, timeout and the like"""
+        takes_value = COMMAND_WRAPPERS[name]
+        positionals = WRAPPER_POSITIONALS.get(name, 0)
+        options = set()
+        index = 0
+        while index < len(arguments):
+            value = arguments[index].value or ''
+            if value == '--':
+                index += 1
+                break
+            if name == 'env' and ASSIGNMENT_PATTERN.match(arguments[index].text):
+                self._check_assignment(arguments[index])
+            elif value.startswith('-') and len(value) > 1:
+                options.add(value.split('=', 1)[0])
+                if value in takes_value:
+                    index += 1
+            elif positionals:
+                positionals -= 1
+            else:
+                break
+            index += 1
+        if index < len(arguments):
+            self._check_command(arguments[index:])
+        elif name == 'sudo' and options & SUDO_SHELL_OPTIONS:
+            self._flag('sudo', "sudo without a command starts a shell")
+
+    def _check_su(self, arguments: Sequence[Word]) -> None:
+        scripts = [
+            arguments[index + 1] for index, word in enumerate(arguments[:-1])
+            if word.value in ('-c', '--command', '--session-command')
+        ]
+        if not scripts:
+            self._flag('su', "su without -c starts a shell")
+            return
+        for script in scripts:
+            if script.value is None:
+                self._flag('su', "the command run by su -c is computed when the script runs")
+            elif self.depth >= MAX_SU_DEPTH:
+                self._flag('su', "su -c is nested too deeply")
+            else:
+                nested = _PolicyChecker(self.allowed, self.functions, self.depth + 1)
+                self.violations.extend(nested.check_script(script.value))
+
+    def _check_find(self, arguments: Sequence[Word]) -> None:
+        index = 0
+        while index < len(arguments):
+            if arguments[index].value in FIND_EXEC_ACTIONS:
+                start = index + 1
+                index = start
+                while index < len(arguments) and arguments[index].value not in (';', '+'):
+                    index += 1
+                if start < index:
+                    self._check_command(arguments[start:index])
+            index += 1
+
+
+def policy_violations(script_content: str, allowed_commands: Iterable[str]) -> List[PolicyViolation]:
+    """Every command in a script that the whitelist does not allow
+
+    The script is parsed into a syntax tree, so commands after pipes,
+    '&&', '||' and ';', inside subshells, groups, loops and functions,
+    in $(...), backquote and process substitutions, and those run by
+    sudo, su -c, xargs, find -exec and similar wrappers are all checked.
+    Command names that only exist once the script runs (variables,
+    globs) are refused, as is a script that cannot be parsed. So are
+    expansions that run a variable's value as code: ${!name}, ${name@P},
+    and arithmetic on variables not only ever set to integers.
+
+    Args:
+        script_content: Bash script
+        allowed_commands: Whitelisted command names
+
+    Returns:
+        List[PolicyViolation]: Empty if the script is allowed
+    """
+    return _PolicyChecker(allowed_commands).check_script(script_content)
+
+
+def find_disallowed_command(script_content: str, allowed_commands: Iterable[str]) -> Optional[str]:
+    """Return the first command that is not allowed, if any"""
+    violations = policy_violations(script_content, allowed_commands)
+    return violations[0].command if violations else None
+
+
+class ShellChecker:
+    """Runs ShellCheck on a worker pool, with verdicts cached by script hash
+
+    Scripts are passed on stdin and results read as JSON, so no temporary
+    file is written. Only real verdicts are cached: a run that times out
+    or cannot start fails the script but is retried next time.
+    """
+
+    def __init__(self, timeout: float = SHELLCHECK_TIMEOUT_SECONDS, cache_size: int = SHELLCHECK_CACHE_SIZE,
+                 workers: int = SHELLCHECK_WORKERS):
+        """Initialize an empty cache
+
+        Args:
+            timeout: Seconds a ShellCheck run may take before the script is failed
+            cache_size: Verdicts kept, least recently used dropped first
+            workers: ShellCheck runs in parallel
+        """
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shellcheck')
+
+    @staticmethod
+    def _key(script_content: str) -> str:
+        return hashlib.sha256(script_content.encode('utf-8')).hexdigest()
+
+    def _cached(self, key: str) -> Optional[Tuple[bool, str]]:
+        with self._lock:
+            verdict = self._cache.get(key)
+            if verdict is not None:
+                self._cache.move_to_end(key)
+        metrics.incr('shellcheck.cache_hit' if verdict is not None else 'shellcheck.cache_miss')
+        return verdict
+
+    def _store(self, key: str, verdict: Tuple[bool, str]) -> None:
+        with self._lock:
+            self._cache[key] = verdict
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _run(self, script_content: str) -> Tuple[Tuple[bool, str], bool]:
+        """One ShellCheck run; returns the verdict and whether it may be cached"""
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(
+                ['shellcheck', '-s', 'bash', '-f', 'json', '-'],
+                input=script_content, capture_output=True, text=True, timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired:
+            metrics.incr('shellcheck.timeout')
+            logging.warning(f"ShellCheck timed out after {self.timeout:g}s")
+            return (False, f"ShellCheck did not finish within {self.timeout:g} seconds"), False
+        except FileNotFoundError:
+            return (False, "ShellCheck is not installed"), False
+        finally:
+            seconds = time.perf_counter() - start
+            metrics.observe('shellcheck.seconds', seconds)
+            logging.debug(f"ShellCheck run took {seconds * 1000:.0f} ms")
+
+        # 0: no issues, 1: issues found; anything else is a ShellCheck error
+        if result.returncode not in (0, 1):
+            return (False, f"ShellCheck failed: {result.stderr.strip()}"), False
+        try:
+            comments = json.loads(result.stdout or '[]')
+        except json.JSONDecodeError:
+            return (False, f"ShellCheck returned unreadable output: {result.stdout[:200]}"), False
+        report = '\n'.join(
+            f"line {comment['line']}:{comment['column']}: {comment['level']} SC{comment['code']}: {comment['message']}"
+            for comment in comments
+        )
+        return (result.returncode == 0, report), True
+
+    def check(self, script_content: str) -> Tuple[bool, str]:
+        """Run ShellCheck on a script, or return the cached verdict
+
+        Returns:
+            Tuple[bool, str]: Whether it passed, and ShellCheck's findings one per line
+        """
+        key = self._key(script_content)
+        verdict = self._cached(key)
+        if verdict is not None:
+            return verdict
+        verdict, cacheable = self._run(script_content)
+        if cacheable:
+            self._store(key, verdict)
+        return verdict
+
+    def submit(self, script_content: str) -> Future:
+        """Start check() on the worker pool"""
+        return self._executor.submit(self.check, script_content)
+
+    def shutdown(self) -> None:
+        """Stop the worker pool without waiting for runs in progress"""
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Cache hits and misses, timeouts and run latency since startup"""
+        hits = metrics.counter('shellcheck.cache_hit')
+        misses = metrics.counter('shellcheck.cache_miss')
+        runs = metrics.summary('shellcheck.seconds')
+        return {
+            'cached': len(self._cache),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'timeouts': metrics.counter('shellcheck.timeout'),
+            'runs': runs['count'],
+            'p50_ms': runs['p50'] * 1000 if runs['p50'] is not None else None,
+            'p95_ms': runs['p95'] * 1000 if runs['p95'] is not None else None,
+        }
+
+
+# Shared, so the GUI, the batch runner and the benchmark reuse each other's verdicts
+shellcheck = ShellChecker()
+
+
+def run_shellcheck(script_content: str) -> Tuple[bool, str]:
+    """Run shellcheck on a script, through the shared cache
+
+    Returns:
+        Tuple[bool, str]: Whether it passed, and shellcheck's report
+    """
+    return shellcheck.check(script_content)
+
+
+def check_script(script_content: str, allowed_commands: Iterable[str]) -> Tuple[bool, List[str]]:
+    """Validate a script without touching the GUI, so it can run on a worker thread
+
+    Returns:
+        Tuple[bool, List[str]]: Whether the script passed, and the messages to show
+    """
+    # ShellCheck runs in a subprocess, so start it first and check the whitelist meanwhile
+    pending = shellcheck.submit(script_content)
+
+    # Step 1: Check every command against the whitelist
+    violations = policy_violations(script_content, allowed_commands)
+    if violations:
+        # Leave the ShellCheck run to finish; its verdict is cached for a retry
+        return False, [f"Validation failed: {violation}" for violation in violations]
+
+    # Step 2: Use shellcheck for static analysis
+    passed, report = pending.result()
+    if not passed:
+        heading = "ShellCheck found issues in the script:" if report.startswith('line ') else "ShellCheck failed:"
+        return False, [heading, report]
+    return True, ["ShellCheck validation passed."]
@@ -0,0 +1,178 @@
+import difflib
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Tuple
+
+from context_assembly import ContextStats
+from llms.async_runner import runner
+from metrics import metrics
+from qa_chunking import normalize_question
+
+
+@dataclass
+class SpeculativeResult:
+    """Work done ahead of the final transcript"""
+    query: str
+    context: str
+    context_stats: ContextStats
+    bash_script: Optional[str] = None
+    description: Optional[str] = None
+    elapsed: float = 0.0
+
+
+class _Attempt:
+    """Cancellation state of one speculation"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        # The LLM call on the shared loop, once generation has started
+        self.generation: Optional[Future] = None
+
+    def cancel(self) -> bool:
+        """Stop the speculation, returning whether an LLM call was in flight"""
+        self.cancelled.set()
+        generation = self.generation
+        return generation is not None and generation.cancel()
+
+
+class Speculator:
+    """Starts retrieval (and optionally generation) on stable ASR partials
+
+    Only the latest partial is kept in flight. When the final transcript
+    arrives, resolve() hands back the speculative result if the texts match
+    closely enough and discards it otherwise. The retrieved context is
+    reused on a close match, but a generated script only when the
+    normalized texts are identical: transcripts that differ in one
+    argument ("kill process 1234" / "12345") need different scripts.
+    Discarding a speculation cancels its LLM call if one is in flight.
+    """
+
+    def __init__(self, retrieve_fn: Callable[[str], Tuple[str, ContextStats]],
+                 generate_fn: Optional[Callable[[str, str], Awaitable[Tuple[str, str]]]] = None,
+                 match_ratio: float = 0.9):
+        """Initialize the speculator
+
+        Args:
+            retrieve_fn: Returns (context, context stats) for a query
+            generate_fn: Coroutine function returning (bash_script,
+                description) for a query and context, run on the shared
+                LLM loop so it can be cancelled; None to speculate on
+                retrieval only
+            match_ratio: Minimum similarity between the speculated and final
+                transcripts for reusing the retrieved context (1.0 requires
+                identical normalized text)
+        """
+        self.retrieve_fn = retrieve_fn
+        self.generate_fn = generate_fn
+        self.match_ratio = match_ratio
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='speculation')
+        self._lock = threading.Lock()
+        self._query = None
+        self._future = None
+        self._attempt = None
+
+    def speculate(self, partial: str) -> None:
+        """Start speculative work for a stable partial transcript"""
+        key = normalize_question(partial)
+        if not key:
+            return
+        with self._lock:
+            if self._query is not None and normalize_question(self._query) == key:
+                return
+            self._discard()
+            attempt = _Attempt()
+            self._query = partial
+            self._attempt = attempt
+            self._future = self._executor.submit(self._run, partial, attempt)
+        metrics.incr('speculation.started')
+        logging.debug(f"Speculating on partial transcript: {partial}")
+
+    def resolve(self, final: str) -> Optional[SpeculativeResult]:
+        """Claim the speculative result for the final transcript
+
+        Args:
+            final: Final ASR transcript
+
+        Returns:
+            Optional[SpeculativeResult]: The result if the speculation matched
+                and succeeded, otherwise None. Its bash_script is None unless
+                the transcripts are identical once normalized.
+        """
+        with self._lock:
+            query, future = self._query, self._future
+            if future is None:
+                return None
+            exact = normalize_question(query) == normalize_question(final)
+            ratio = 1.0 if exact else difflib.SequenceMatcher(
+                None, normalize_question(query), normalize_question(final)
+            ).ratio()
+            if ratio < self.match_ratio:
+                logging.info(f"Speculation missed ('{query}' vs '{final}', ratio {ratio:.2f})")
+                self._discard()
+                return None
+            self._query = self._future = self._attempt = None
+
+        try:
+            result = future.result()
+        except CancelledError:
+            metrics.incr('speculation.failed')
+            return None
+        except Exception as e:
+            logging.error(f"Speculative work failed: {e}")
+            metrics.incr('speculation.failed')
+            return None
+        if not exact and result.bash_script is not None:
+            logging.info(f"Regenerating the script: '{query}' differs from '{final}'")
+            metrics.incr('speculation.script_discarded')
+            result.bash_script = result.description = None
+        metrics.incr('speculation.hit')
+        logging.info(f"Speculation hit for '{final}' ({result.elapsed:.2f}s of work done ahead)")
+        return result
+
+    def cancel(self) -> None:
+        """Drop any speculation in flight"""
+        with self._lock:
+            self._discard()
+
+    def stats(self) -> dict:
+        """Started, hit, wasted and cancelled-before-start speculation counts, LLM calls stopped and scripts not reused"""
+        started = metrics.counter('speculation.started')
+        hits = metrics.counter('speculation.hit')
+        return {
+            'started': started,
+            'hits': hits,
+            'wasted': metrics.counter('speculation.wasted'),
+            'cancelled': metrics.counter('speculation.cancelled'),
+            'generations_cancelled': metrics.counter('speculation.generation_cancelled'),
+            'scripts_discarded': metrics.counter('speculation.script_discarded'),
+            'hit_rate': hits / started if started else 0.0,
+        }
+
+    def _discard(self) -> None:
+        """Cancel the current speculation and count it as waste (caller holds the lock)"""
+        if self._future is None:
+            return
+        if self._attempt.cancel():
+            metrics.incr('speculation.generation_cancelled')
+        if not self._future.cancel():
+            # Already running: it stops before or during generation and its result is ignored
+            metrics.incr('speculation.wasted')
+        else:
+            metrics.incr('speculation.cancelled')
+        self._query = self._future = self._attempt = None
+
+    def _run(self, query: str, attempt: _Attempt) -> SpeculativeResult:
+        start = time.perf_counter()
+        context, context_stats = self.retrieve_fn(query)
+        result = SpeculativeResult(query, context, context_stats)
+        if self.generate_fn is not None and not attempt.cancelled.is_set():
+            attempt.generation = runner.submit(self.generate_fn(query, context))
+            # A discard between the check and the submit missed the call; cancel it here
+            if attempt.cancelled.is_set():
+                attempt.generation.cancel()
+            result.bash_script, result.description = attempt.generation.result()
+        result.elapsed = time.perf_counter() - start
+        return result
@@ -1,21 +1,30 @@
 import os
-import subprocess
+import time
 import logging
 import json
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pyttsx3
 # from gtts import gTTS
 # from playsound import playsound
 # from pydub import AudioSegment
 # from pydub.generators import Sine
 # import simpleaudio as sa
-from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTextEdit, QProgressBar, QApplication
+from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTextEdit, QProgressBar, QApplication, QMessageBox
 from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPalette, QTextCursor\
 
 from llms.gemini import GeminiService
 import numpy as np
 from llms.groq import GroqService
+from llms.hedged import HedgedLLM
+from llms.local_openai import LocalOpenAIService
+from llms.recording import RecordingLLM
+from llms.resilient import ResilientLLM
+from llms.router import model_router
+from llms.async_runner import runner
+from concurrent.futures import CancelledError
 
 from config import GEMINI_API_KEY
 
@@ -27,7 +36,19 @@ from rag_service import RAGService
 
 from create_embeddings import EmbeddingProvider
 
-import google.generativeai as genai
+from command_cache import CommandCache, cache_fingerprint
+from context_assembly import GenerationLatencyModel
+from speculation import Speculator
+from script_validation import POLICY_VERSION, check_script, shellcheck
+from output_summarizers import summarize_output, savings
+from sandbox import execute_in_sandbox
+from config import (
+    ALLOWED_COMMANDS, PROMPT_TEMPLATE, COMMAND_CACHE_PATH, COMMAND_CACHE_SIMILARITY,
+    COMMAND_CACHE_TTL_SECONDS, COMMAND_CACHE_MAX_ENTRIES,
+    SPECULATION_MATCH_RATIO, SPECULATIVE_GENERATION, RAG_RELOAD_INTERVAL_SECONDS,
+    LLM_RECORDING_MODE, LLM_RECORDING_PATH, LLM_FALLBACK_SERVICE
+)
+from resilience import resilience_stats
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -35,6 +56,17 @@ logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %
 # Configure the Gemini API
 # genai.configure(api_key=GEMINI_API_KEY)
 
+def make_llm(llm_service: str):
+    """Provider by name: 'gemini', 'groq' or 'local'"""
+    if llm_service == 'gemini':
+        return GeminiService(GEMINI_API_KEY)
+    if llm_service == 'groq':
+        return GroqService(GROQ_API_KEY)
+    if llm_service == 'local':
+        return LocalOpenAIService()
+    raise ValueError(f"Unsupported LLM service: {llm_service}")
+
+
 class TTSThread(QThread):
     def __init__(self, text):
         super().__init__()
@@ -144,47 +176,64 @@ class VoiceAssistant(QMainWindow):
         self.voice_thread = VoiceRecognitionThread()
         self.voice_thread.status_update.connect(self.update_status)
         self.voice_thread.command_received.connect(self.process_command)
+        self.voice_thread.partial_stable.connect(self.speculate_command)
 
-        # Initialize the LLM service
-        if llm_service == 'gemini':
-            self.llm = GeminiService(GEMINI_API_KEY)
-        elif llm_service == 'groq':
-            self.llm = GroqService(GROQ_API_KEY)
+        # Initialize the LLM service; every provider is rate limited, retried and circuit broken
+        if llm_service == 'hedged':
+            # An open circuit fails the primary at once, so the secondary takes over
+            self.llm = HedgedLLM(ResilientLLM(make_llm('gemini')), ResilientLLM(make_llm('groq')))
         else:
-            raise ValueError(f"Unsupported LLM service: {llm_service}")
+            fallback = None
+            if LLM_FALLBACK_SERVICE and LLM_FALLBACK_SERVICE != llm_service:
+                fallback = ResilientLLM(make_llm(LLM_FALLBACK_SERVICE))
+            self.llm = ResilientLLM(make_llm(llm_service), fallback)
+        if LLM_RECORDING_MODE != 'off':
+            self.llm = RecordingLLM(self.llm, LLM_RECORDING_PATH, mode=LLM_RECORDING_MODE)
 
         self.llm.initialize()
-
-        try:
-            self.rag = RAGService(embeddings_dir)
-            self.rag.load_index()
-        except FileNotFoundError:
+        # Keep the window responsive while waiting on LLM calls. Signals
+        # delivered meanwhile must not start a second command (see process_command)
+        runner.idle_hook = QApplication.processEvents
+        self.processing = False
+        self.pending_command = None
+
+        # Load the index in the background and pick up rebuilt indexes without a restart
+        self.rag = RAGService(embeddings_dir)
+        if not os.path.isdir(embeddings_dir):
             logging.error(
                 "Embeddings not found. Please run create_embeddings.py first with your context file."
             )
-            raise
+        self.rag.start_background_load()
+        self.rag.start_watching(RAG_RELOAD_INTERVAL_SECONDS)
 
         self.embedding_provider = EmbeddingProvider(llm_service)
+        self.generation_latency = GenerationLatencyModel()
+
+        # Start work on stable partial transcripts before the final one arrives
+        self.speculator = Speculator(
+            self.rag.get_context_with_stats,
+            self.llm.agenerate_bash_script if SPECULATIVE_GENERATION else None,
+            match_ratio=SPECULATION_MATCH_RATIO,
+        )
 
 
         # Timer for progress bar
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_progress)
 
-        self.allowed_commands = set([
-            'ls', 'echo', 'cat', 'grep', 'awk', 'sed', 'cut', 'sort', 'uniq',
-            'wc', 'head', 'tail', 'find', 'date', 'pwd', 'whoami', 'uname', 'mkdir', 
-            'rmdir', 'touch', 'cp', 'mv', 'less', 'nano', 'vim', 'more', 'diff', 
-            'tar', 'gzip', 'gunzip', 'zip', 'unzip', 'ping', 'curl', 'wget', 'apt', 
-            'dpkg', 'python', 'python3', 'g++', 'gcc', 'node', 'javac', 'java', 
-            'ruby', 'df', 'du', 'free', 'top', 'htop', 'uptime', 'ps', 'id', 
-            'hostname', 'cal', 'man', 'bc', 'time', 'xargs', 'tr', 'chmod', 'chown', 
-            'tee', 'split', 'dmesg', 'iostat', 'vmstat', 'sar', 'lsof', 'who', 
-            'last', 'mount', 'umount', 'blkid', 'fdisk', 'mkfs', 'ifconfig', 'netstat', 
-            'ss', 'iptables', 'traceroute', 'nmap', 'which', 'locate', 'bc',
-            'alias', 'unalias', 'factor', 'yes', 'shutdown', 'reboot', 'kill', 'killall',
-            'history', 'ip', 'clear', 'exit', 'logout', 'su', 'sudo', 'passwd', 'useradd',
-        ])
+        self.allowed_commands = set(ALLOWED_COMMANDS)
+        # Validation starts as soon as the script field has streamed in
+        self.validation_executor = ThreadPoolExecutor(max_workers=1)
+
+        # Scripts that already passed validation, reused for repeated utterances
+        self.command_cache = CommandCache(
+            COMMAND_CACHE_PATH,
+            cache_fingerprint(self.allowed_commands, PROMPT_TEMPLATE, POLICY_VERSION),
+            embed_fn=self.rag.embed_query,
+            similarity_threshold=COMMAND_CACHE_SIMILARITY,
+            ttl_seconds=COMMAND_CACHE_TTL_SECONDS,
+            max_entries=COMMAND_CACHE_MAX_ENTRIES,
+        )
         # self.tts_engine = pyttsx3.init()
         # for text-to-speech
         self.speech_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3').name
@@ -193,9 +242,13 @@ class VoiceAssistant(QMainWindow):
         logging.info("Voice Assistant initialized")
 
     def start_listening(self):
+        # A new command supersedes whatever the LLM is still working on
+        self.llm.cancel()
         self.progress_bar.setValue(0)
         self.timer.start(40)
         self.voice_thread.start()
+        # Open the LLM connection while the user is still speaking
+        threading.Thread(target=self.llm.warm_up, daemon=True).start()
         self.current_status = self.STATUS_LISTENING
         self.status_label.setText(self.current_status)
         self.terminal_print("Listening for command...")
@@ -227,54 +280,55 @@ class VoiceAssistant(QMainWindow):
         self.terminal.append("$ ")
         self.terminal.moveCursor(QTextCursor.End)
 
-    def validate_script(self, script_content):
-        # Step 1: Check against whitelist
-        for line in script_content.split('\n'):
-            command = line.strip().split()[0] if line.strip() else ''
-            if command and command not in self.allowed_commands:
-                self.terminal_print(f"Validation failed: '{command}' is not in the whitelist of allowed commands.")
-                return False
+    def validate_script(self, script_content, pending=None):
+        """Report a script's validation result on the terminal
 
-        # Step 2: Use shellcheck for static analysis
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as temp_file:
-            temp_file.write(script_content)
-            temp_file_path = temp_file.name
+        Args:
+            script_content: Script to validate
+            pending: Future from an early check_script submission, if any
 
-        try:
-            result = subprocess.run(['shellcheck', '-s', 'bash', temp_file_path], capture_output=True, text=True)
-            if result.returncode != 0:
-                self.terminal_print("ShellCheck found issues in the script:")
-                self.terminal_print(result.stdout)
-                return False
-            else:
-                self.terminal_print("ShellCheck validation passed.")
-                return True
-        finally:
-            os.unlink(temp_file_path)
+        Returns:
+            bool: Whether the script passed
+        """
+        if pending is not None:
+            is_valid, messages = pending.result()
+        else:
+            is_valid, messages = check_script(script_content, self.allowed_commands)
+        for message in messages:
+            self.terminal_print(message)
+        return is_valid
+
+    def confirm_cached_script(self, command, cached):
+        """Validate a script cached for a similar utterance again and ask before reusing it
+
+        Args:
+            command: Recognized utterance
+            cached: Entry returned by CommandCache.get with match 'semantic'
+
+        Returns:
+            bool: Whether the cached script may run for this utterance
+        """
+        self.terminal_print(f"Found a script cached for a similar request: {cached['query']}")
+        if not self.validate_script(cached['script']):
+            return False
+        answer = QMessageBox.question(
+            self, "Reuse cached script?",
+            f"'{command}' sounds like '{cached['query']}'.\n\n"
+            f"Run the script cached for it?\n\n{cached['script']}",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        return answer == QMessageBox.Yes
+
+    def stream_print(self, text):
+        """Append streamed text to the terminal without starting a new prompt"""
+        self.terminal.moveCursor(QTextCursor.End)
+        self.terminal.insertPlainText(text)
+        self.terminal.ensureCursorVisible()
+        QApplication.processEvents()
 
     def execute_in_sandbox(self, script_content):
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as temp_file:
-            temp_file.write(script_content)
-            temp_file_path = temp_file.name
-
-        try:
-            # Use firejail to create a sandboxed environment
-            result = subprocess.run([
-                'firejail',
-                '--noprofile',
-                '--quiet',
-                '--private',
-                '--noroot',
-                '--net=none',
-                '--nosound',
-                '--no3d',
-                'bash',
-                temp_file_path
-            ], capture_output=True, text=True)
-
-            return result.stdout if result.returncode == 0 else result.stderr
-        finally:
-            os.unlink(temp_file_path)
+        """Run a script under firejail; see sandbox.execute_in_sandbox"""
+        return execute_in_sandbox(script_content)
 
     # def interpret_output(self, original_query, command_output):
     #     model = genai.GenerativeModel('gemini-1.5-flash')
@@ -300,10 +354,38 @@ class VoiceAssistant(QMainWindow):
         # Ensure all threads are stopped before closing
         if hasattr(self, 'tts_thread') and self.tts_thread.isRunning():
             self.tts_thread.wait()
+        self.rag.stop_watching()
+        self.validation_executor.shutdown(wait=False)
+        shellcheck.shutdown()
+        self.command_cache.flush()
         event.accept()
 
 
+    def speculate_command(self, partial):
+        if self.processing:
+            return
+        logging.debug(f"Stable partial transcript: {partial}")
+        self.speculator.speculate(partial)
+
+
     def process_command(self, command):
+        # Waiting on the LLM pumps Qt events, which can deliver another
+        # command; run it after the current one instead of inside it
+        if self.processing:
+            logging.info(f"Queueing command until the current one finishes: {command}")
+            self.pending_command = command
+            return
+        self.processing = True
+        try:
+            self.run_command(command)
+        finally:
+            self.processing = False
+        pending, self.pending_command = self.pending_command, None
+        if pending is not None:
+            QTimer.singleShot(0, lambda: self.process_command(pending))
+
+
+    def run_command(self, command):
         logging.info(f"Processing command: {command}")
         self.current_status = self.STATUS_PROCESSING
         self.status_label.setText(self.current_status)
@@ -315,31 +397,94 @@ class VoiceAssistant(QMainWindow):
             self.current_status = self.STATUS_GENERATING
             self.status_label.setText(self.current_status)
 
-            context = self.rag.get_relevant_context(command)
-            # self.terminal_print(f"Context: {context}")
-            # Generate bash script using the LLM service
-            bash_script, description = self.llm.generate_bash_script(command, context)
-
-            logging.debug(f"Generated bash script: {bash_script}")
-            logging.debug(f"Description: {description}")
-            
-            self.terminal_print(f"Description: {description}")
-            self.terminal_print("Validating script...")
-            
-            # Validate the script
-            if self.validate_script(bash_script):
+            # Reuse a script that was already generated and validated
+            cached = self.command_cache.get(command)
+            if cached is not None and cached['match'] == 'semantic' and not self.confirm_cached_script(command, cached):
+                cached = None
+            if cached is not None:
+                self.speculator.cancel()
+                bash_script, description = cached['script'], cached['description']
+                self.terminal_print(f"Using cached script for: {cached['query']}")
+                self.terminal_print(f"Description: {description}")
+                is_valid = True
+            else:
+                streamed = {}
+                # Reuse retrieval/generation started on a stable partial transcript
+                speculative = self.speculator.resolve(command)
+                if speculative is not None:
+                    context, context_stats = speculative.context, speculative.context_stats
+                else:
+                    context, context_stats = self.rag.get_context_with_stats(command)
+                # self.terminal_print(f"Context: {context}")
+
+                if speculative is not None and speculative.bash_script is not None:
+                    bash_script, description = speculative.bash_script, speculative.description
+                    self.terminal_print("Using script generated from the partial transcript")
+                else:
+                    # Generate bash script using the LLM service, validating it
+                    # while the description is still streaming
+                    def on_script(script):
+                        streamed['validation'] = (
+                            script, self.validation_executor.submit(check_script, script, self.allowed_commands)
+                        )
+
+                    generate_start = time.perf_counter()
+                    bash_script, description = self.llm.generate_bash_script(command, context, on_script=on_script)
+                    self.generation_latency.record(
+                        context_stats.context_tokens,
+                        context_stats.tokens_saved,
+                        time.perf_counter() - generate_start
+                    )
+                logging.debug(f"Speculation stats: {self.speculator.stats()}")
+
+                logging.debug(f"Generated bash script: {bash_script}")
+                logging.debug(f"Description: {description}")
+
+                # Validate the script, off the GUI thread and while the description is shown
+                early_script, pending = streamed.get('validation', (None, None))
+                if early_script != bash_script:
+                    pending = self.validation_executor.submit(check_script, bash_script, self.allowed_commands)
+
+                self.terminal_print(f"Description: {description}")
+                self.terminal_print("Validating script...")
+                is_valid = self.validate_script(bash_script, pending)
+                logging.debug(f"ShellCheck stats: {shellcheck.stats()}")
+                if is_valid:
+                    self.command_cache.put(command, bash_script, description)
+
+            logging.debug(f"Command cache stats: {self.command_cache.stats()}")
+
+            if is_valid:
                 # Execute in sandbox
                 self.current_status = self.STATUS_EXECUTING
                 self.status_label.setText(self.current_status)
                 self.terminal_print("Executing command in sandbox...")
-                command_output = self.execute_in_sandbox(bash_script)
-                self.terminal_print(f"Raw output: {command_output}")
+                command_output, output_stats, returncode = self.execute_in_sandbox(bash_script)
+                if output_stats.compacted:
+                    self.terminal_print(
+                        f"Output (compacted from {output_stats.original_lines} lines, "
+                        f"{output_stats.original_tokens} tokens): {command_output}"
+                    )
+                else:
+                    self.terminal_print(f"Raw output: {command_output}")
+                logging.debug(
+                    f"Command output: {output_stats.original_tokens} tokens, "
+                    f"{output_stats.compacted_tokens} after compaction ({output_stats})"
+                )
                 
                 # Interpret output
                 self.current_status = self.STATUS_INTERPRETING
                 self.status_label.setText(self.current_status)
-                interpreted_response = self.llm.interpret_output(command, command_output)
-                self.terminal_print(f"Interpreted response: {interpreted_response}")
+                # Known fixed-format outputs are summarized without an LLM call; errors go to the LLM
+                summary = summarize_output(bash_script, command_output, returncode)
+                if summary is not None:
+                    interpreted_response = summary.text
+                    self.terminal_print(f"Interpreted response: {interpreted_response}")
+                else:
+                    self.stream_print("Interpreted response: ")
+                    interpreted_response = self.llm.interpret_output(command, command_output, on_text=self.stream_print)
+                    self.terminal_print("")
+                logging.debug(f"Local summarizer stats: {savings(f'llm.{self.llm.name}.interpret_seconds')}")
                 
                 # Speak response
                 self.current_status = self.STATUS_SPEAKING
@@ -353,6 +498,10 @@ class VoiceAssistant(QMainWindow):
                 self.terminal_print(error_message)
                 self.speak_text(error_message)
 
+        except CancelledError:
+            logging.info(f"Command cancelled: {command}")
+            self.terminal_print("Command cancelled.")
+
         except Exception as e:
             self.current_status = self.STATUS_ERROR
             self.status_label.setText(self.current_status)
@@ -361,7 +510,11 @@ class VoiceAssistant(QMainWindow):
             self.speak_text(error_message)
             logging.error(error_message)
 
-        
+        logging.debug(f"LLM request latency: {self.llm.latency_stats()}")
+        logging.debug(f"LLM response parsing: {self.llm.parse_stats()}")
+        logging.debug(f"LLM call outcomes: {self.llm.call_stats()}")
+        logging.debug(f"Provider health: {resilience_stats()}")
+        logging.debug(f"Model routing: {model_router.stats()}")
         self.current_status = self.STATUS_IDLE
         self.status_label.setText(self.current_status)
 
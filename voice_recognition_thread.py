@@ -8,13 +8,15 @@ import sounddevice as sd
 from scipy.io import wavfile
 from vosk import Model, KaldiRecognizer
 from audio_processing import process_audio
-from config import VOSK_MODEL_PATH
+from config import VOSK_MODEL_PATH, ASR_BLOCK_SECONDS, SPECULATION_STABLE_BLOCKS
 
 
 
 class VoiceRecognitionThread(QThread):
     status_update = pyqtSignal(str)
     command_received = pyqtSignal(str)
+    # Emitted once a partial transcript has not changed for SPECULATION_STABLE_BLOCKS blocks
+    partial_stable = pyqtSignal(str)
 
     def __init__(self):
         super().__init__()
@@ -33,41 +35,44 @@ class VoiceRecognitionThread(QThread):
         logging.info("Listening for audio input")
 
         try:
-            # Record audio
+            # Record audio in blocks so Vosk partial results are available while the user speaks
             duration = 4  # seconds
             fs = 16000  # Sample rate (Vosk models typically expect 16kHz)
-            recording = sd.rec(int(duration * fs), samplerate=fs, channels=1)
-            sd.wait()
-            recording = recording.flatten()
+            block_size = int(ASR_BLOCK_SECONDS * fs)
+            segments = []
+            last_partial, stable_blocks, speculated = '', 0, ''
 
-            # Apply audio processing
-            # processed_audio = process_audio(recording, fs)
-            processed_audio = recording
-            # Convert float audio to int16
-            audio_int16 = (processed_audio * 32767).astype(np.int16)
-            
-            # Perform recognition with Vosk
-            if self.rec.AcceptWaveform(audio_int16.tobytes()):
-                result = json.loads(self.rec.Result())
-                command = result['text']
-                if command:
-                    logging.info(f"Recognized command using Vosk: {command}")
-                    self.command_received.emit(command)
-                else:
-                    self.status_update.emit("No speech detected")
-                    logging.warning("No speech detected")
+            with sd.InputStream(samplerate=fs, channels=1, blocksize=block_size) as stream:
+                for _ in range(int(duration * fs) // block_size):
+                    block, _overflowed = stream.read(block_size)
+                    # Apply audio processing
+                    # processed_audio = process_audio(block.flatten(), fs)
+                    processed_audio = block.flatten()
+                    # Convert float audio to int16
+                    audio_int16 = (processed_audio * 32767).astype(np.int16)
+
+                    if self.rec.AcceptWaveform(audio_int16.tobytes()):
+                        # Vosk detected the end of an utterance segment
+                        segments.append(json.loads(self.rec.Result())['text'])
+                        last_partial, stable_blocks = '', 0
+                        continue
+
+                    partial = json.loads(self.rec.PartialResult())['partial']
+                    stable_blocks = stable_blocks + 1 if partial and partial == last_partial else 0
+                    last_partial = partial
+                    if stable_blocks >= SPECULATION_STABLE_BLOCKS and partial != speculated:
+                        speculated = partial
+                        self.partial_stable.emit(' '.join(segments + [partial]).strip())
+
+            # Flush whatever Vosk still holds; this also resets the recognizer
+            segments.append(json.loads(self.rec.FinalResult())['text'])
+            command = ' '.join(segment for segment in segments if segment)
+            if command:
+                logging.info(f"Recognized command using Vosk: {command}")
+                self.command_received.emit(command)
             else:
-                # self.status_update.emit("Could not understand audio")
-                # logging.error("Vosk could not understand audio")
-                partial = json.loads(self.rec.PartialResult())
-                #print(f"Vosk partial result: {partial}")
-                command = partial["partial"]
-                if command:
-                    logging.info(f"Recognized command using Vosk: {command}")
-                    self.command_received.emit(command)
-                else:
-                    self.status_update.emit("No speech detected")
-                    logging.warning("No speech detected")
+                self.status_update.emit("No speech detected")
+                logging.warning("No speech detected")
 
         except Exception as e:
             error_message = f"Error in voice recognition: {str(e)}"